@@ -1,22 +1,41 @@
+import io
 import os
 import json
+import time
+import base64
+import zipfile
 import logging
-import tempfile
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from datetime import datetime, timezone
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 from flask_cors import CORS
-from receipt_parser import parse_walmart_receipt
-from werkzeug.utils import secure_filename
-from pypdf import PdfReader
-from models import db, Distribution, DistributionUser
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+import receipt_parser
+from pdf_extract import read_upload, extract_text, iter_pages
+from parse_cache import ParseCache, pdf_key, text_key
+from response_cache import ResponseCache
+from batch import BATCH_MAX_ITEMS, iter_completed, zip_pdf_members
+from jobs import JobQueue, FINISHED_STATUSES
+from sqlalchemy import and_, or_, event
+from sqlalchemy.orm import load_only, selectinload
+from models import db, Distribution, DistributionUser, DistributionItem, DistributionItemShare
+from distribution_store import prepare_distribution, save_distributions
+from shares import allocate_shares, to_cents
+import export
+import rollups
+import balances
+import search
+import sqlite_profile
+from instrumentation import configure_logging, log_payload_sample, stage, start_timer, current_timer, finish_request
+import metrics
+from migrations import BOOT_BACKFILL_SECONDS, pending_backfills, run_backfills, run_migrations
 from nanoid import generate
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Set up logging from LOG_LEVEL / LOG_FORMAT
+configure_logging()
 
 # Create Flask app
 app = Flask(__name__, 
@@ -26,7 +45,10 @@ app = Flask(__name__,
 app.secret_key = os.environ.get("SESSION_SECRET", "default-secret-key")
 
 # Configure database
-if os.environ.get('VERCEL'):
+if os.environ.get('RECEIPTS_DATABASE_URI'):
+    # Explicit override, e.g. for benchmarks against a scratch database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ['RECEIPTS_DATABASE_URI']
+elif os.environ.get('VERCEL'):
     # Use SQLite file in /tmp for Vercel
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:////tmp/receipts.db"
 else:
@@ -34,40 +56,211 @@ else:
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///receipts.db"
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_profile.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 
 # Initialize database with app
 db.init_app(app)
 
-# Ensure tables exist on every request (for serverless)
-@app.before_request
-def before_request():
+# Bring the schema up to date once at process (or serverless cold) start,
+# so requests never pay for schema checks
+with app.app_context():
+    sqlite_profile.install(db.engine)
     try:
-        with app.app_context():
-            db.create_all()
+        schema_version = run_migrations(db.engine)
+        logging.info("Database schema at version %s", schema_version)
+        # Convert existing rows for a bounded time only, so a large backfill
+        # never holds up startup past the worker timeout
+        pending = run_backfills(db.engine, seconds=BOOT_BACKFILL_SECONDS)
+        if pending:
+            logging.warning("%d migration backfills still pending; they resume on the next start "
+                            "or run `flask backfill`", pending)
     except Exception as e:
-        logging.error(f"Database initialization error: {str(e)}")
-        return jsonify({"error": "Database initialization failed"}), 500
+        logging.error("Database initialization error: %s", e)
+        raise
 
 # Enable CORS
 CORS(app)
 
-# Create upload directory
-if os.environ.get('VERCEL'):
-    # Use /tmp for Vercel
-    UPLOAD_FOLDER = '/tmp/uploads'
-else:
-    # Use local directory for development
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tmp', 'uploads')
+# Cache of parsed receipts keyed by content hash
+parse_cache = ParseCache(lambda: db.engine)
+
+# Rendered /share pages and /api/distribution bodies keyed by distribution ID
+response_cache = ResponseCache()
+
+def _collect_edited_distributions(session, flush_context):
+    """Remember which saved distributions a flush changed."""
+    edited = session.info.setdefault('edited_distributions', set())
+    for obj in [*session.new, *session.dirty, *session.deleted]:
+        if isinstance(obj, DistributionItemShare):
+            obj = obj.item
+        if isinstance(obj, (DistributionUser, DistributionItem)):
+            obj = obj.distribution
+        if isinstance(obj, Distribution) and obj.distribution_id:
+            edited.add(obj.distribution_id)
+
+def _invalidate_edited_distributions(session):
+    """Drop cached responses of distributions changed by the committed transaction."""
+    for distribution_id in session.info.pop('edited_distributions', ()):
+        response_cache.invalidate(distribution_id)
+
+event.listen(db.session, 'after_flush', _collect_edited_distributions)
+event.listen(db.session, 'after_commit', _invalidate_edited_distributions)
+event.listen(db.session, 'after_rollback', lambda session: session.info.pop('edited_distributions', None))
+
+def parse_receipt_cached(receipt_text, extra_keys=()):
+    """
+    Parse receipt text, serving repeat receipts from the parse cache.
+    
+    Results of a fallback for a failed Gemini call are not cached, so the
+    next upload of the receipt tries Gemini again.
+    """
+    key = text_key(receipt_text, receipt_parser.PARSER_VERSION)
+    parsed_data = parse_cache.get(key)
+    if parsed_data is None:
+        with stage('parse'):
+            parsed_data, cacheable = receipt_parser.parse_receipt_cacheable(receipt_text)
+        metrics.RECEIPT_ITEMS.observe(len(parsed_data.get('items', [])))
+        if cacheable:
+            parse_cache.put([key, *extra_keys], parsed_data)
+    elif extra_keys:
+        parse_cache.put(list(extra_keys), parsed_data)
+    return parsed_data
+
+def parse_pdf_cached(pdf_bytes):
+    """Extract and parse a PDF; identical files skip pypdf via the parse cache."""
+    upload_key = pdf_key(pdf_bytes, receipt_parser.PARSER_VERSION)
+    parsed_data = parse_cache.get(upload_key)
+    if parsed_data is None:
+        with stage('extract'):
+            text, page_count = extract_text(pdf_bytes)
+        metrics.PDF_PAGES.observe(page_count)
+        logging.debug("Extracted %d characters of text from %d pages", len(text), page_count)
+        parsed_data = parse_receipt_cached(text, extra_keys=[upload_key])
+    else:
+        logging.debug("Serving parsed PDF from cache")
+    return parsed_data
+
+def parse_pdf_job(pdf_bytes):
+    """Produce the same response body as a synchronous upload."""
+    parsed_data = parse_pdf_cached(pdf_bytes)
+    parsed_data['receipt_id'] = generate(size=10)
+    return parsed_data
+
+def stream_pdf_items(pdf_bytes):
+    """
+    Extract and parse a PDF page by page, as events for a streaming upload.
+    
+    Each page is parsed as soon as it is extracted, so the first items
+    arrive after one page whatever the page count, and pages after the one
+    holding the order total are never extracted. Identical uploads are served
+    from the parse cache; streamed results are not cached, since streaming
+    never uses Gemini.
+    
+    Returns:
+        iterator: ('item', item) pairs in receipt order, then ('done', summary)
+    
+    Raises:
+        Exception: If the PDF cannot be opened
+    """
+    parsed_data = parse_cache.get(pdf_key(pdf_bytes, receipt_parser.PARSER_VERSION))
+    if parsed_data is not None:
+        logging.debug("Streaming parsed PDF from cache")
+        return iter([*(('item', item) for item in parsed_data['items']),
+                     ('done', {'items': len(parsed_data['items']), 'cached': True})])
+    page_count, pages = iter_pages(pdf_bytes)
+    
+    def events():
+        parser = None
+        pages_read = 0
+        for page_text in pages:
+            pages_read += 1
+            if parser is None:
+                parser = receipt_parser.incremental_parser(page_text)
+            # Pages are joined the way extract_text joins them
+            for item in parser.feed(page_text + "\n"):
+                yield 'item', item
+            if parser.total_seen:
+                break
+        if parser is None:
+            parser = receipt_parser.incremental_parser('')
+        for item in parser.close():
+            yield 'item', item
+        metrics.PDF_PAGES.observe(page_count)
+        metrics.RECEIPT_ITEMS.observe(len(parser.items))
+        logging.debug("Streamed %d items from %d of %d pages", len(parser.items), pages_read, page_count)
+        yield 'done', {'items': len(parser.items), 'pages_read': pages_read, 'page_count': page_count,
+                       'cached': False}
+    
+    return events()
+
+def stream_response(events, stream_format, receipt_id):
+    """Send (event, data) pairs as NDJSON lines or server-sent events; the done event gets the receipt_id."""
+    def body():
+        try:
+            for event, data in events:
+                if event == 'done':
+                    data = {**data, 'receipt_id': receipt_id}
+                if stream_format == 'sse':
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                else:
+                    yield json.dumps({'event': event, 'data': data}) + '\n'
+        except Exception as e:
+            logging.error("Error streaming PDF: %s", e)
+            data = {'error': f'Failed to process PDF: {str(e)}'}
+            if stream_format == 'sse':
+                yield f"event: error\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield json.dumps({'event': 'error', 'data': data}) + '\n'
+    
+    response = Response(stream_with_context(body()), mimetype=STREAM_MIMETYPES[stream_format])
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Background queue for asynchronous uploads
+job_queue = JobQueue(app, handler=parse_pdf_job)
+
+@app.before_request
+def start_request_timer():
+    metrics.registry.start_flusher()
+    start_timer()
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-logging.info(f"Upload folder set to: {UPLOAD_FOLDER}")
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+@app.after_request
+def add_server_timing(response):
+    timer = current_timer()
+    if timer is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(timer.total_ms() / 1000)
+    return finish_request(request, response)
+
+# Uploads are processed in memory
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 
+# Number of past distributions listed on the analytics page
+ANALYTICS_HISTORY_LIMIT = int(os.environ.get("ANALYTICS_HISTORY_LIMIT", "50"))
+
+# Page sizes for /api/distributions
+DISTRIBUTIONS_PAGE_SIZE = int(os.environ.get("DISTRIBUTIONS_PAGE_SIZE", "50"))
+DISTRIBUTIONS_MAX_PAGE_SIZE = int(os.environ.get("DISTRIBUTIONS_MAX_PAGE_SIZE", "500"))
+
+# Page sizes for /api/search
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", "50"))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get("SEARCH_MAX_PAGE_SIZE", "200"))
+
+# Largest number of records accepted by /api/distributions/bulk, and how
+# many are written per transaction
+BULK_MAX_RECORDS = int(os.environ.get("BULK_MAX_RECORDS", "50000"))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "500"))
+
+# Longest a job's event stream is held open, in seconds. A stream occupies a
+# sync gunicorn worker (one by default) and the worker is killed after its
+# 30 second timeout, so slower jobs end the stream with a 'poll' event and
+# the client polls the job's status_url instead
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get("JOB_EVENTS_MAX_SECONDS", "20"))
+
+# Response types of /api/upload_pdf?stream=...
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf'}
 
@@ -80,7 +273,7 @@ def index():
     try:
         return render_template('index.html')
     except Exception as e:
-        logging.error(f"Error rendering index: {str(e)}")
+        logging.error("Error rendering index: %s", e)
         return jsonify({"error": "Failed to render page"}), 500
 
 @app.route('/api/parse', methods=['POST'])
@@ -95,30 +288,43 @@ def parse_receipt():
             return jsonify({'error': 'Receipt text is empty'}), 400
         
         # Parse the receipt text
-        parsed_data = parse_walmart_receipt(receipt_text)
+        parsed_data = parse_receipt_cached(receipt_text)
         
         # Add nanoid to the parsed data
         parsed_data['receipt_id'] = generate(size=10)
         
         # Return the parsed data
-        return jsonify(parsed_data)
+        with stage('serialize'):
+            return jsonify(parsed_data)
     
     except Exception as e:
-        logging.error(f"Error parsing receipt: {str(e)}")
+        logging.error("Error parsing receipt: %s", e)
         return jsonify({'error': f'Failed to parse receipt: {str(e)}'}), 500
 
 @app.route('/api/upload_pdf', methods=['POST'])
 def upload_pdf():
-    """API endpoint to upload and parse a PDF receipt."""
+    """
+    API endpoint to upload and parse a PDF receipt.
+    
+    Query parameters:
+        async: If 1, queue the PDF and return a job to poll
+        stream: ndjson or sse to stream items as each page is parsed, as
+                {"event": "item"|"done"|"error", "data": ...} lines or
+                server-sent events of those names
+    """
     logging.debug("Received upload_pdf request")
     try:
+        # Reading the form spools the upload
+        with stage('upload'):
+            files = request.files
+        
         # Check if file part exists
-        if 'file' not in request.files:
+        if 'file' not in files:
             logging.debug("No file part in the request")
             return jsonify({'error': 'No file part in the request'}), 400
         
-        file = request.files['file']
-        logging.debug(f"Received file: {file.filename}")
+        file = files['file']
+        logging.debug("Received file: %s", file.filename)
         
         # Check if file is empty
         if file.filename == '':
@@ -127,62 +333,180 @@ def upload_pdf():
         
         # Check if file is allowed
         if not allowed_file(file.filename):
-            logging.debug(f"Invalid file type: {file.filename}")
+            logging.debug("Invalid file type: %s", file.filename)
             return jsonify({'error': 'File type not allowed. Only PDF files are accepted.'}), 400
         
-        # Create upload directory if it doesn't exist
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        # Read the upload into memory; nothing is written to disk
+        with stage('upload'):
+            pdf_bytes = read_upload(file)
         
-        # Save the file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        logging.debug(f"Saving file to: {filepath}")
+        # In streaming mode, send items page by page as they are recognized
+        stream_format = request.args.get('stream')
+        if stream_format:
+            if stream_format not in STREAM_MIMETYPES:
+                return jsonify({'error': f"stream must be one of: {', '.join(STREAM_MIMETYPES)}"}), 400
+            try:
+                events = stream_pdf_items(pdf_bytes)
+            except Exception as e:
+                logging.error("Error extracting text from PDF: %s", e)
+                return jsonify({'error': f'Failed to extract text from PDF: {str(e)}'}), 500
+            return stream_response(events, stream_format, generate(size=10))
         
-        try:
-            file.save(filepath)
-        except Exception as e:
-            logging.error(f"Error saving file: {str(e)}")
-            return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
+        # In async mode, queue the PDF and let the client poll for the result
+        if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+            job_id = job_queue.enqueue(pdf_bytes)
+            logging.debug("Queued parse job: %s", job_id)
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/jobs/{job_id}',
+                'events_url': f'/api/jobs/{job_id}/events'
+            }), 202
         
-        # Extract text from PDF
-        text = ""
+        # Extract and parse, serving identical uploads from the cache
         try:
-            pdf = PdfReader(filepath)
-            logging.debug(f"PDF has {len(pdf.pages)} pages")
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-            logging.debug(f"Extracted {len(text)} characters of text")
+            parsed_data = parse_pdf_cached(pdf_bytes)
         except Exception as e:
-            logging.error(f"Error extracting text from PDF: {str(e)}")
+            logging.error("Error extracting text from PDF: %s", e)
             return jsonify({'error': f'Failed to extract text from PDF: {str(e)}'}), 500
         
-        # Parse the receipt text
-        logging.debug("Parsing receipt text with parser")
-        parsed_data = parse_walmart_receipt(text)
-        
         # Add nanoid to the parsed data
         parsed_data['receipt_id'] = generate(size=10)
-        logging.debug(f"Generated receipt ID: {parsed_data['receipt_id']}")
-        
-        # Remove the temp file
-        try:
-            os.remove(filepath)
-            logging.debug(f"Removed temp file: {filepath}")
-        except Exception as e:
-            logging.warning(f"Failed to remove temp file: {str(e)}")
+        logging.debug("Generated receipt ID: %s", parsed_data['receipt_id'])
         
         # Ensure we're returning valid JSON
-        response = jsonify(parsed_data)
+        with stage('serialize'):
+            response = jsonify(parsed_data)
         response.headers['Content-Type'] = 'application/json'
         logging.debug("Returning JSON response")
         return response
     
     except Exception as e:
-        logging.error(f"Error processing PDF: {str(e)}")
+        logging.error("Error processing PDF: %s", e)
         error_response = jsonify({'error': f'Failed to process PDF: {str(e)}'})
         error_response.headers['Content-Type'] = 'application/json'
         return error_response, 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """API endpoint to poll an asynchronous upload job."""
+    try:
+        job_queue.start()
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        logging.error("Error getting job: %s", e)
+        return jsonify({'error': f'Failed to get job: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-sent events stream of a job's status, ending with its result.
+    
+    Streams for at most JOB_EVENTS_MAX_SECONDS; a job still unfinished by
+    then ends the stream with a 'poll' event carrying the status_url to
+    poll, and clients should close the stream rather than reconnect.
+    """
+    job_queue.start()
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def stream(job):
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        status = None
+        while True:
+            if job['status'] != status:
+                status = job['status']
+                event = 'result' if status in FINISHED_STATUSES else 'status'
+                yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+            if status in FINISHED_STATUSES:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                poll = {'job_id': job_id, 'status': status, 'status_url': f'/api/jobs/{job_id}'}
+                yield f"event: poll\ndata: {json.dumps(poll)}\n\n"
+                return
+            # Woken early when a job finishes in this process
+            job_queue.wait(min(1.0, remaining))
+            job = job_queue.get(job_id)
+    
+    response = Response(stream_with_context(stream(job)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/parse_batch', methods=['POST'])
+def parse_batch():
+    """
+    API endpoint to parse many receipts at once.
+    
+    Accepts a zip of PDFs (as the 'file' form field or the raw request body) or
+    a JSON array of receipt texts (bare or as {"receipts": [...]}). Results are
+    streamed as NDJSON in completion order, one line per receipt, each with its
+    input index and a status of 'ok' or 'error'.
+    """
+    logging.debug("Received parse_batch request")
+    try:
+        if request.is_json:
+            payload = request.get_json(silent=True)
+            receipts = payload.get('receipts') if isinstance(payload, dict) else payload
+            if not isinstance(receipts, list) or not receipts:
+                return jsonify({'error': 'Expected a non-empty JSON array of receipt texts'}), 400
+            jobs = [(index, None, receipt) for index, receipt in enumerate(receipts)]
+        else:
+            upload = request.files.get('file')
+            zip_bytes = read_upload(upload) if upload else request.get_data()
+            if not zip_bytes:
+                return jsonify({'error': 'No zip file provided'}), 400
+            try:
+                archive, members = zip_pdf_members(zip_bytes)
+            except zipfile.BadZipFile:
+                return jsonify({'error': 'File is not a valid zip archive'}), 400
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if not members:
+                return jsonify({'error': 'No PDF files found in the zip archive'}), 400
+            # Members are read lazily, as workers free up
+            jobs = ((index, info.filename, archive.read(info)) for index, info in enumerate(members))
+            receipts = members
+        
+        if len(receipts) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Too many receipts in batch (max {BATCH_MAX_ITEMS})'}), 400
+    except Exception as e:
+        logging.error("Error reading batch: %s", e)
+        return jsonify({'error': f'Failed to read batch: {str(e)}'}), 500
+    
+    def process(job):
+        index, name, receipt = job
+        result = {'index': index}
+        if name is not None:
+            result['name'] = name
+        try:
+            with app.app_context():
+                if isinstance(receipt, bytes):
+                    parsed_data = parse_pdf_cached(receipt)
+                elif isinstance(receipt, str) and receipt.strip():
+                    parsed_data = parse_receipt_cached(receipt)
+                else:
+                    raise ValueError('Receipt text is empty or not a string')
+            result['status'] = 'ok'
+            result['receipt_id'] = generate(size=10)
+            result['items'] = parsed_data['items']
+        except Exception as e:
+            logging.warning("Failed to parse batch receipt %d: %s", index, e)
+            result['status'] = 'error'
+            result['error'] = str(e)
+        return result
+    
+    def stream():
+        for result in iter_completed(jobs, process):
+            yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
 @app.route('/api/save_distribution', methods=['POST'])
 def save_distribution():
     """API endpoint to save the cost distribution to the database."""
@@ -194,7 +518,7 @@ def save_distribution():
             return jsonify({'error': 'No distribution data provided'}), 400
         
         data = request.json
-        logging.debug(f"Received distribution data: {json.dumps(data)[:200]}...")
+        log_payload_sample("Received distribution data", data)
         
         # Check required fields
         if 'users' not in data or not data['users']:
@@ -212,73 +536,429 @@ def save_distribution():
         # Generate a unique distribution ID
         distribution_id = generate(size=10)
         
-        # Create distribution record
-        distribution = Distribution(
-            receipt_name=data.get('receipt_name', 'Walmart Receipt'),
-            total_amount=float(data['total']),
-            distribution_data=json.dumps(data),
-            distribution_id=distribution_id
-        )
-        
-        # Add to database
-        db.session.add(distribution)
-        db.session.flush()  # To get the ID
-        
-        # Create distribution user records
-        for user in data['users']:
-            # Find user's items and calculate total
-            user_items = []
-            user_total = 0
-            
-            for item in data['items']:
-                if user['id'] in item.get('users', []):
-                    # Calculate this user's share for the item
-                    user_count = len(item.get('users', []))
-                    if user_count > 0:
-                        share = item['price'] / user_count
-                        user_total += share
-                        user_items.append({
-                            'name': item['name'],
-                            'price': item['price'],
-                            'share': share
-                        })
+        try:
+            rows = prepare_distribution(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with stage('db'):
+            # Create the distribution with its users, items and item shares,
+            # and update the rollups, balances and search index with it
+            save_distributions(db.session, [(distribution_id, datetime.utcnow(), rows)])
             
-            # Create user distribution record
-            dist_user = DistributionUser(
-                distribution_id=distribution.id,
-                user_name=user['name'],
-                user_identifier=user['id'],
-                amount=user_total,
-                items_json=json.dumps(user_items)
-            )
-            db.session.add(dist_user)
-        
-        # Commit all changes
-        db.session.commit()
-        logging.debug(f"Distribution saved with ID: {distribution_id}")
+            # Commit all changes
+            db.session.commit()
+        logging.debug("Distribution saved with ID: %s", distribution_id)
+        
+        with stage('serialize'):
+            return jsonify({
+                'success': True,
+                'distribution_id': distribution_id,
+                'message': 'Distribution saved successfully'
+            })
+    
+    except Exception as e:
+        db.session.rollback()
+        logging.error("Error saving distribution: %s", e)
+        return jsonify({'error': f'Failed to save distribution: {str(e)}'}), 500
+
+@app.route('/api/preview_shares', methods=['POST'])
+def preview_shares():
+    """
+    API endpoint to compute what each user owes without saving anything.
+    
+    Takes the same users and items as save_distribution; items may carry
+    'weights' mapping user ids to relative weights for uneven splits.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('users'), list) \
+                or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'users and items lists are required'}), 400
+        
+        try:
+            share_cents, user_cents = allocate_shares(data['users'], data['items'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        user_items = [[] for _ in data['users']]
+        for item_index, user_index, cents in share_cents:
+            item = data['items'][item_index]
+            user_items[user_index].append({
+                'name': item.get('name'),
+                'price': item['price'],
+                'share': cents / 100
+            })
         
         return jsonify({
-            'success': True,
-            'distribution_id': distribution_id,
-            'message': 'Distribution saved successfully'
+            'users': [
+                {'id': user['id'], 'name': user.get('name'), 'amount': cents / 100, 'items': items}
+                for user, cents, items in zip(data['users'], user_cents, user_items)
+            ],
+            'assigned_total': sum(user_cents) / 100
         })
+    except Exception as e:
+        logging.error("Error previewing shares: %s", e)
+        return jsonify({'error': f'Failed to preview shares: {str(e)}'}), 500
+
+def encode_cursor(distribution):
+    """Opaque keyset cursor pointing just past this distribution."""
+    raw = f"{distribution.created_at.isoformat()}|{distribution.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor; raises ValueError if malformed."""
+    try:
+        created_at, distribution_pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(distribution_pk)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def read_bulk_records():
+    """
+    Read the records of a bulk import request.
+    
+    Returns:
+        list: (record, error) pairs; error is set for NDJSON lines that are not JSON
+    
+    Raises:
+        ValueError: If the body is neither a JSON array nor NDJSON, or too large
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = []
+        # Buffer the raw request stream; iterating it directly reads a byte at a time
+        for line in io.BufferedReader(request.stream, 1 << 16):
+            if not line.strip():
+                continue
+            if len(records) >= BULK_MAX_RECORDS:
+                raise ValueError(f'At most {BULK_MAX_RECORDS} records per request')
+            try:
+                records.append((json.loads(line), None))
+            except ValueError as e:
+                records.append((None, f'Invalid JSON: {str(e)}'))
+        return records
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array or NDJSON of distributions')
+    if len(data) > BULK_MAX_RECORDS:
+        raise ValueError(f'At most {BULK_MAX_RECORDS} records per request')
+    return [(record, None) for record in data]
+
+def parse_datetime(value, name):
+    """Parse an ISO 8601 date or datetime into naive UTC, the way created_at is stored."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid {name}: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def date_range_args():
+    """Return the since and until query parameters as naive UTC datetimes, or None."""
+    since = request.args.get('since')
+    until = request.args.get('until')
+    return (parse_datetime(since, 'since') if since else None,
+            parse_datetime(until, 'until') if until else None)
+
+def parse_created_at(record):
+    """Return the record's optional created_at as naive UTC, or now."""
+    value = record.get('created_at')
+    if value is None:
+        return datetime.utcnow()
+    if not isinstance(value, str):
+        raise ValueError('created_at must be an ISO 8601 string')
+    return parse_datetime(value, 'created_at')
+
+@app.route('/api/distributions/bulk', methods=['POST'])
+def bulk_import_distributions():
+    """
+    API endpoint to import many distributions at once, e.g. historical data.
+    
+    Accepts a JSON array of save_distribution payloads, or NDJSON with one
+    payload per line (Content-Type application/x-ndjson). A payload may also
+    carry created_at (ISO 8601). Every record is validated before anything
+    is written; valid records are then inserted BULK_CHUNK_SIZE per transaction.
     
+    Query parameters:
+        atomic: If 1, write nothing unless every record is valid
+    
+    Returns per-record results in input order: {'index', 'status': 'ok',
+    'distribution_id'}, {'index', 'status': 'error', 'error'} or, for valid
+    records of a rejected atomic import, {'index', 'status': 'skipped'}.
+    """
+    try:
+        try:
+            records = read_bulk_records()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except RequestEntityTooLarge:
+            return jsonify({'error': f"Request larger than {app.config['MAX_CONTENT_LENGTH']} bytes; "
+                                     "split the import into several requests"}), 413
+        
+        # Validate everything up front
+        results = []
+        prepared = []
+        for index, (record, error) in enumerate(records):
+            if error is None:
+                try:
+                    created_at = parse_created_at(record) if isinstance(record, dict) else None
+                    prepared.append((index, created_at, prepare_distribution(record)))
+                    results.append({'index': index, 'status': 'ok'})
+                    continue
+                except ValueError as e:
+                    error = str(e)
+            results.append({'index': index, 'status': 'error', 'error': error})
+        failed = len(records) - len(prepared)
+        
+        if failed and request.args.get('atomic') in ('1', 'true', 'yes'):
+            for index, _, _ in prepared:
+                results[index]['status'] = 'skipped'
+            return jsonify({'inserted': 0, 'failed': failed, 'results': results}), 400
+        
+        inserted = 0
+        for start in range(0, len(prepared), BULK_CHUNK_SIZE):
+            chunk = [(index, generate(size=10), created_at, rows)
+                     for index, created_at, rows in prepared[start:start + BULK_CHUNK_SIZE]]
+            try:
+                with stage('db'):
+                    save_distributions(db.session, [record[1:] for record in chunk])
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error("Error saving bulk import chunk: %s", e)
+                for index, _, _, _ in chunk:
+                    results[index] = {'index': index, 'status': 'error', 'error': f'Failed to save: {str(e)}'}
+                failed += len(chunk)
+                continue
+            for index, distribution_id, _, _ in chunk:
+                results[index]['distribution_id'] = distribution_id
+            inserted += len(chunk)
+        
+        logging.debug("Bulk import: %d inserted, %d failed", inserted, failed)
+        with stage('serialize'):
+            return jsonify({'inserted': inserted, 'failed': failed, 'results': results})
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error saving distribution: {str(e)}")
-        return jsonify({'error': f'Failed to save distribution: {str(e)}'}), 500
+        logging.error("Error importing distributions: %s", e)
+        return jsonify({'error': f'Failed to import distributions: {str(e)}'}), 500
 
 @app.route('/api/distributions', methods=['GET'])
 def get_distributions():
-    """API endpoint to get all saved distributions."""
+    """
+    API endpoint to list saved distributions, newest first.
+    
+    Query parameters:
+        limit: Page size (default DISTRIBUTIONS_PAGE_SIZE, max DISTRIBUTIONS_MAX_PAGE_SIZE)
+        cursor: The next_cursor of the previous page
+        fields: Comma-separated subset of Distribution.FIELDS to return
+        since, until: ISO dates/datetimes bounding created_at (until is exclusive)
+    """
+    try:
+        try:
+            limit = min(int(request.args.get('limit', DISTRIBUTIONS_PAGE_SIZE)), DISTRIBUTIONS_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+            fields = request.args.get('fields')
+            fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(Distribution.FIELDS)
+            unknown = set(fields) - set(Distribution.FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+            since, until = date_range_args()
+            cursor = request.args.get('cursor')
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Only load the columns the requested fields need; the JSON blob and
+        # the users are skipped entirely for list views that do not ask for them
+        columns = [Distribution.id, Distribution.created_at]
+        columns += [getattr(Distribution, f) for f in fields
+                    if f not in ('id', 'created_at', 'users')]
+        query = Distribution.query.options(load_only(*columns))
+        if 'users' in fields or 'distribution_data' in fields:
+            # Both are rebuilt from the user, item and item share rows
+            query = query.options(selectinload(Distribution.users), selectinload(Distribution.items))
+        
+        if since is not None:
+            query = query.filter(Distribution.created_at >= since)
+        if until is not None:
+            query = query.filter(Distribution.created_at < until)
+        if cursor is not None:
+            created_at, distribution_pk = cursor
+            query = query.filter(or_(
+                Distribution.created_at < created_at,
+                and_(Distribution.created_at == created_at, Distribution.id < distribution_pk)
+            ))
+        
+        # Fetch one extra row to know whether there is a next page
+        with stage('db'):
+            distributions = (query.order_by(Distribution.created_at.desc(), Distribution.id.desc())
+                             .limit(limit + 1)
+                             .all())
+        next_cursor = encode_cursor(distributions[limit - 1]) if len(distributions) > limit else None
+        
+        with stage('serialize'):
+            return jsonify({
+                'distributions': [d.to_dict(fields) for d in distributions[:limit]],
+                'next_cursor': next_cursor
+            })
+    except Exception as e:
+        logging.error("Error getting distributions: %s", e)
+        return jsonify({'error': f'Failed to get distributions: {str(e)}'}), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_distributions():
+    """
+    API endpoint to stream the full distribution history, oldest first.
+    
+    Query parameters:
+        format: ndjson (default) or csv
+        rows: shares (default, one row per user share of an item) or items
+        since, until: ISO dates/datetimes bounding created_at (until is exclusive)
+    
+    The body is gzip-encoded when the client accepts it.
+    """
     try:
-        distributions = Distribution.query.order_by(Distribution.created_at.desc()).all()
+        try:
+            export_format = request.args.get('format', 'ndjson')
+            if export_format not in export.FORMATS:
+                raise ValueError(f"format must be one of: {', '.join(export.FORMATS)}")
+            row_type = request.args.get('rows', 'shares')
+            if row_type not in export.ROW_TYPES:
+                raise ValueError(f"rows must be one of: {', '.join(export.ROW_TYPES)}")
+            since, until = date_range_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        compress = request.accept_encodings['gzip'] > 0
+        response = Response(export.iter_export(db.engine, row_type, export_format, since, until, compress),
+                            mimetype=export.MIMETYPES[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename=distributions-{row_type}.{export_format}'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+    except Exception as e:
+        logging.error("Error exporting distributions: %s", e)
+        return jsonify({'error': f'Failed to export distributions: {str(e)}'}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_items():
+    """
+    API endpoint to search purchased items by name, most recently saved first.
+    
+    Query parameters:
+        q: Words that must all appear in the item name; "quoted phrase" for a
+           phrase, a trailing * for a prefix (e.g. egg*)
+        since, until: ISO dates/datetimes bounding created_at (until is exclusive)
+        limit: Page size (default SEARCH_PAGE_SIZE, max SEARCH_MAX_PAGE_SIZE)
+        cursor: The next_cursor of the previous page
+        totals: If 1, also return totals over every match: item count, amount
+                spent and each user's share. Costs time in proportion to the
+                number of matches, unlike the page itself
+    """
+    try:
+        try:
+            query = request.args.get('q', '')
+            search.match_query(query)
+            limit = min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+            since, until = date_range_args()
+            cursor = request.args.get('cursor')
+            after = search.decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with stage('db'):
+            items, next_after = search.search_items(db.session, query, since, until, limit, after)
+            totals = None
+            if request.args.get('totals') in ('1', 'true', 'yes'):
+                totals = search.search_totals(db.session, query, since, until)
+        
+        with stage('serialize'):
+            response = {
+                'items': items,
+                'next_cursor': search.encode_cursor(next_after) if next_after is not None else None
+            }
+            if totals is not None:
+                response['totals'] = totals
+            return jsonify(response)
+    except Exception as e:
+        logging.error("Error searching items: %s", e)
+        return jsonify({'error': f'Failed to search items: {str(e)}'}), 500
+
+@app.route('/api/settle_up', methods=['GET'])
+def settle_up():
+    """
+    API endpoint to work out who should pay whom to settle every balance.
+    
+    Reads the running pair balances kept up to date by saves and
+    settlements, never the distribution history.
+    
+    Query parameters:
+        users: Optional comma-separated user names; only debts among them count
+    """
+    try:
+        users = request.args.get('users')
+        users = [name.strip() for name in users.split(',') if name.strip()] if users else None
+        with stage('db'):
+            net = balances.net_balances(db.session, users)
+        transfers = balances.simplify(net)
         return jsonify({
-            'distributions': [d.to_dict() for d in distributions]
+            'balances': [{'user_name': user_name, 'net': cents / 100}
+                         for user_name, cents in sorted(net.items(), key=lambda entry: (-entry[1], entry[0]))],
+            'transfers': [{'from': from_user, 'to': to_user, 'amount': cents / 100}
+                          for from_user, to_user, cents in transfers]
         })
     except Exception as e:
-        logging.error(f"Error getting distributions: {str(e)}")
-        return jsonify({'error': f'Failed to get distributions: {str(e)}'}), 500
+        logging.error("Error computing settle-up: %s", e)
+        return jsonify({'error': f'Failed to compute settle-up: {str(e)}'}), 500
+
+@app.route('/api/settle_up', methods=['POST'])
+def record_settlement():
+    """API endpoint to record a payment that settles debt: {"from", "to", "amount"}."""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object with from, to and amount'}), 400
+        from_user, to_user = data.get('from'), data.get('to')
+        if not isinstance(from_user, str) or not isinstance(to_user, str) or not from_user or not to_user:
+            return jsonify({'error': 'from and to must be user names'}), 400
+        if from_user == to_user:
+            return jsonify({'error': 'from and to must be different users'}), 400
+        try:
+            amount_cents = to_cents(data.get('amount'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if amount_cents <= 0:
+            return jsonify({'error': 'amount must be positive'}), 400
+        
+        with stage('db'):
+            settlement = balances.record_settlement(db.session, from_user, to_user, amount_cents)
+            db.session.commit()
+        return jsonify({'success': True, 'settlement': settlement.to_dict()})
+    except Exception as e:
+        db.session.rollback()
+        logging.error("Error recording settlement: %s", e)
+        return jsonify({'error': f'Failed to record settlement: {str(e)}'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose the metrics of every worker in the Prometheus text format."""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/parse_cache/stats', methods=['GET'])
+def parse_cache_stats():
+    """API endpoint to get parse cache hit/miss counters."""
+    return jsonify(parse_cache.get_stats())
+
+@app.route('/api/response_cache/stats', methods=['GET'])
+def response_cache_stats():
+    """API endpoint to get response cache hit/miss counters."""
+    return jsonify(response_cache.get_stats())
 
 @app.route('/favicon.ico')
 def favicon():
@@ -289,47 +969,16 @@ def favicon():
 @app.route('/analytics')
 def analytics():
     """Render the analytics page with previous purchase data."""
-    # Get all distributions ordered by date (newest first)
-    distributions = Distribution.query.order_by(Distribution.created_at.desc()).all()
-    
-    # Create user expenditure data for charts
-    user_data = {}
-    weekly_data = {}
-    monthly_data = {}
-    now = datetime.utcnow()
-    
-    # Get distributions from the last 30 days for weekly/monthly views
-    thirty_days_ago = now - timedelta(days=30)
-    recent_distributions = Distribution.query.filter(Distribution.created_at >= thirty_days_ago).all()
-    
-    # Process each distribution
-    for dist in recent_distributions:
-        # Extract month and week 
-        month = dist.created_at.strftime('%Y-%m')
-        week = dist.created_at.strftime('%Y-W%U')
-        
-        # Setup data structures if they don't exist yet
-        if month not in monthly_data:
-            monthly_data[month] = {}
-        if week not in weekly_data:
-            weekly_data[week] = {}
-            
-        # Process user data for this distribution
-        for user in dist.users:
-            # Add to user totals
-            if user.user_name not in user_data:
-                user_data[user.user_name] = 0
-            user_data[user.user_name] += user.amount
-            
-            # Add to monthly data
-            if user.user_name not in monthly_data[month]:
-                monthly_data[month][user.user_name] = 0
-            monthly_data[month][user.user_name] += user.amount
-            
-            # Add to weekly data
-            if user.user_name not in weekly_data[week]:
-                weekly_data[week][user.user_name] = 0
-            weekly_data[week][user.user_name] += user.amount
+    # Most recent distributions for the history list, with their users
+    distributions = (Distribution.query
+                     .options(selectinload(Distribution.users))
+                     .order_by(Distribution.created_at.desc())
+                     .limit(ANALYTICS_HISTORY_LIMIT)
+                     .all())
+    
+    # Per-user, weekly and monthly spending for the last 30 days,
+    # read from the rollups maintained by save_distribution
+    user_data, weekly_data, monthly_data = rollups.load_window(db.session, datetime.utcnow(), days=30)
     
     # Convert to sorted arrays for the charts
     user_totals = sorted([(name, amount) for name, amount in user_data.items()], 
@@ -351,23 +1000,105 @@ def analytics():
                            sorted_months=sorted_months,
                            all_users=all_users)
 
+def load_distribution(distribution_id):
+    """Fetch a saved distribution with everything to_dict needs, or abort with 404."""
+    with stage('db'):
+        return (Distribution.query
+                .options(selectinload(Distribution.users), selectinload(Distribution.items))
+                .filter_by(distribution_id=distribution_id)
+                .first_or_404())
+
+def cached_distribution_response(kind, distribution_id, render, mimetype):
+    """
+    Serve a distribution response from the response cache, rendering it on a miss.
+    
+    Clients and proxies may store the response but must revalidate it on
+    every use (no-cache), so an edited or deleted distribution is never
+    served from their caches; an unchanged one costs a 304.
+    
+    Args:
+        kind (str): Cache namespace, e.g. 'json' or 'html'
+        distribution_id (str): The distribution's nanoid
+        render (callable): Returns the body as bytes; may abort with 404
+        mimetype (str): The response mimetype
+    
+    Returns:
+        Response: 200 with a strong ETag, or 304 if If-None-Match matches it
+    """
+    entry = response_cache.get(kind, distribution_id)
+    if entry is None:
+        entry = response_cache.put(kind, distribution_id, render())
+    body, etag = entry
+    response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/share/<distribution_id>')
 def shared_distribution(distribution_id):
     """Render the main page with a pre-loaded distribution."""
-    # Get the distribution from the database
-    distribution = Distribution.query.filter_by(distribution_id=distribution_id).first_or_404()
-    return render_template('index.html', shared_distribution=distribution.to_dict())
+    def render():
+        distribution = load_distribution(distribution_id)
+        with stage('serialize'):
+            return render_template('index.html', shared_distribution=distribution.to_dict()).encode('utf-8')
+    return cached_distribution_response('html', distribution_id, render, 'text/html')
 
 @app.route('/api/distribution/<distribution_id>', methods=['GET'])
 def get_distribution(distribution_id):
     """API endpoint to get a specific distribution by ID."""
     try:
-        distribution = Distribution.query.filter_by(distribution_id=distribution_id).first_or_404()
-        return jsonify(distribution.to_dict())
+        def render():
+            distribution = load_distribution(distribution_id)
+            with stage('serialize'):
+                return jsonify(distribution.to_dict()).get_data()
+        return cached_distribution_response('json', distribution_id, render, 'application/json')
+    except HTTPException:
+        # The 404 of an unknown ID, as on /share
+        raise
     except Exception as e:
-        logging.error(f"Error getting distribution: {str(e)}")
+        logging.error("Error getting distribution: %s", e)
         return jsonify({'error': f'Failed to get distribution: {str(e)}'}), 500
 
+def _backfills_pending():
+    """True (and says so) while migration backfills still have rows to convert."""
+    with db.engine.begin() as connection:
+        pending = pending_backfills(connection)
+    if pending:
+        print(f"Migration backfills {pending} are still pending; run `flask backfill` first")
+    return bool(pending)
+
+@app.cli.command('backfill')
+def backfill_command():
+    """Run the pending migration backfills to completion."""
+    run_backfills(db.engine)
+    print("All migration backfills finished")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Regenerate the analytics rollup tables from saved distributions."""
+    if _backfills_pending():
+        return
+    rows = rollups.rebuild(db.session)
+    db.session.commit()
+    print(f"Rebuilt {rows} rollup rows")
+
+@app.cli.command('rebuild-balances')
+def rebuild_balances_command():
+    """Regenerate the pair balances from distributions with a payer and settlements."""
+    rows = balances.rebuild(db.session)
+    db.session.commit()
+    print(f"Rebuilt {rows} balance rows")
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Regenerate the item name search index from saved distributions."""
+    if _backfills_pending():
+        return
+    items = search.rebuild(db.session)
+    db.session.commit()
+    print(f"Indexed {items} items")
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,153 @@
+import heapq
+from collections import defaultdict
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import Balance, Distribution, DistributionUser, Settlement
+from shares import to_cents
+
+
+def _pair(debtor, creditor, cents):
+    """Key a debt by its ordered user pair: (user_a, user_b, what user_a owes user_b)."""
+    if debtor < creditor:
+        return debtor, creditor, cents
+    return creditor, debtor, -cents
+
+
+def _upsert(executor, pair_cents):
+    """Add amounts onto existing pair balances, creating missing ones."""
+    rows = [{'user_a': user_a, 'user_b': user_b, 'amount_cents': cents}
+            for (user_a, user_b), cents in pair_cents.items() if cents]
+    if not rows:
+        return
+    statement = sqlite_insert(Balance.__table__)
+    executor.execute(
+        statement.on_conflict_do_update(
+            index_elements=['user_a', 'user_b'],
+            set_={'amount_cents': Balance.__table__.c.amount_cents + statement.excluded.amount_cents}
+        ),
+        rows
+    )
+
+
+def _add_debts(pair_cents, payer, user_amounts):
+    """Add what every user but the payer owes the payer for one receipt."""
+    for user_name, amount in user_amounts:
+        if user_name == payer:
+            continue
+        user_a, user_b, cents = _pair(user_name, payer, to_cents(amount))
+        pair_cents[(user_a, user_b)] += cents
+
+
+def apply_distributions(executor, distributions):
+    """
+    Fold several saved distributions into the balances with one upsert.
+
+    Args:
+        executor: A session or connection; the caller owns the transaction
+        distributions: Iterable of (payer, user_amounts) pairs; those
+                       without a payer are skipped
+    """
+    pair_cents = defaultdict(int)
+    for payer, user_amounts in distributions:
+        if payer is not None:
+            _add_debts(pair_cents, payer, user_amounts)
+    _upsert(executor, pair_cents)
+
+
+def record_settlement(executor, from_user, to_user, amount_cents):
+    """
+    Record a payment from one user to another and apply it to their balance.
+
+    Returns:
+        Settlement: The new (flushed) row
+    """
+    settlement = Settlement(from_user=from_user, to_user=to_user, amount_cents=amount_cents)
+    executor.add(settlement)
+    executor.flush()
+    # Paying someone is the same as them now owing you the amount
+    user_a, user_b, cents = _pair(to_user, from_user, amount_cents)
+    _upsert(executor, {(user_a, user_b): cents})
+    return settlement
+
+
+def rebuild(executor, batch_size=1000):
+    """
+    Regenerate every balance from the distributions with a payer and the settlements.
+
+    Returns:
+        int: Number of balance rows written
+    """
+    executor.execute(delete(Balance.__table__))
+    pair_cents = defaultdict(int)
+    rows = executor.execute(
+        select(Distribution.paid_by, DistributionUser.user_name, DistributionUser.amount)
+        .join(DistributionUser, DistributionUser.distribution_id == Distribution.id)
+        .where(Distribution.paid_by.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for payer, user_name, amount in rows:
+        _add_debts(pair_cents, payer, [(user_name, amount)])
+    for from_user, to_user, amount_cents in executor.execute(
+            select(Settlement.from_user, Settlement.to_user, Settlement.amount_cents)):
+        user_a, user_b, cents = _pair(to_user, from_user, amount_cents)
+        pair_cents[(user_a, user_b)] += cents
+    _upsert(executor, pair_cents)
+    return sum(1 for cents in pair_cents.values() if cents)
+
+
+def net_balances(executor, users=None):
+    """
+    Read every user's net balance from the pair balances.
+
+    The number of rows read depends on the number of user pairs, not on
+    history size.
+
+    Args:
+        users: Optional collection of user names; only balances between two
+               of them are counted
+
+    Returns:
+        dict: user_name -> cents, positive if the user is owed money
+    """
+    table = Balance.__table__
+    query = select(table.c.user_a, table.c.user_b, table.c.amount_cents).where(table.c.amount_cents != 0)
+    if users is not None:
+        query = query.where(table.c.user_a.in_(users), table.c.user_b.in_(users))
+    net = defaultdict(int)
+    for user_a, user_b, cents in executor.execute(query):
+        net[user_a] -= cents
+        net[user_b] += cents
+    return {user_name: cents for user_name, cents in net.items() if cents}
+
+
+def simplify(net):
+    """
+    Turn net balances into a short list of transfers that settles them all.
+
+    Greedy over two heaps: the largest debtor repeatedly pays the largest
+    creditor as much as either can, so every transfer clears at least one
+    user and there are at most n - 1 transfers for n users (finding the
+    true minimum is NP-hard). O(n log n).
+
+    Args:
+        net (dict): user_name -> cents, positive if owed; must sum to zero
+
+    Returns:
+        list: (from_user, to_user, cents) transfers, largest first
+    """
+    # heapq is a min-heap, so amounts are negated; names break ties deterministically
+    creditors = [(-cents, user_name) for user_name, cents in net.items() if cents > 0]
+    debtors = [(cents, user_name) for user_name, cents in net.items() if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        cents = min(-credit, -debt)
+        transfers.append((debtor, creditor, cents))
+        if -credit > cents:
+            heapq.heappush(creditors, (credit + cents, creditor))
+        if -debt > cents:
+            heapq.heappush(debtors, (debt + cents, debtor))
+    return transfers
@@ -0,0 +1,68 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Receipts parsed concurrently per batch request
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "4"))
+# Largest number of receipts accepted in one batch
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+# Largest uncompressed size of a single PDF inside a batch zip
+BATCH_MAX_MEMBER_BYTES = int(os.environ.get("BATCH_MAX_MEMBER_BYTES", str(16 * 1024 * 1024)))
+
+
+def zip_pdf_members(zip_bytes):
+    """
+    List the PDF files inside an in-memory zip archive.
+
+    Args:
+        zip_bytes (bytes): The raw zip archive
+
+    Returns:
+        tuple: (archive, members) where members are the ZipInfo entries of
+               the PDFs, in archive order
+
+    Raises:
+        zipfile.BadZipFile: If the data is not a zip archive
+        ValueError: If a member is larger than BATCH_MAX_MEMBER_BYTES
+    """
+    archive = zipfile.ZipFile(io.BytesIO(zip_bytes))
+    members = []
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.lower().endswith('.pdf'):
+            continue
+        if os.path.basename(info.filename).startswith('._'):
+            continue  # macOS resource forks
+        if info.file_size > BATCH_MAX_MEMBER_BYTES:
+            raise ValueError(f"{info.filename} is larger than {BATCH_MAX_MEMBER_BYTES} bytes")
+        members.append(info)
+    return archive, members
+
+
+def iter_completed(jobs, worker, max_workers=BATCH_WORKERS):
+    """
+    Run worker over jobs on a bounded thread pool, yielding results as they finish.
+
+    At most 2 * max_workers jobs are in flight, so a lazy jobs iterable is
+    only materialized as fast as results are consumed.
+
+    Args:
+        jobs: Iterable of job arguments
+        worker: Callable taking one job; should not raise
+        max_workers (int): Pool size
+
+    Yields:
+        The worker's return values, in completion order
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch') as executor:
+        pending = set()
+        for job in jobs:
+            pending.add(executor.submit(worker, job))
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
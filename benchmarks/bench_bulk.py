@@ -0,0 +1,66 @@
+"""
+Import throughput of POST /api/distributions/bulk (JSON array and NDJSON)
+against one POST /api/save_distribution per distribution. Bulk imports are
+sent in requests of at most `per_request` records to stay under the upload
+size limit.
+
+Usage: python benchmarks/bench_bulk.py [distributions] [single_saves] [per_request]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix='bench_bulk_')
+os.environ.setdefault('RECEIPTS_DATABASE_URI', f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+
+from app import app  # noqa: E402
+from bench_storage import synthetic_payload  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+
+def per_minute(count, seconds):
+    return round(count / seconds * 60)
+
+
+def bulk_import(client, payloads, per_request, ndjson):
+    start = time.perf_counter()
+    for offset in range(0, len(payloads), per_request):
+        batch = payloads[offset:offset + per_request]
+        if ndjson:
+            response = client.post('/api/distributions/bulk', content_type='application/x-ndjson',
+                                   data="\n".join(json.dumps(payload) for payload in batch))
+        else:
+            response = client.post('/api/distributions/bulk', json=batch)
+        assert response.status_code == 200 and response.json['inserted'] == len(batch), response.json
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    single_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    per_request = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    rng = random.Random(0)
+    payloads = [synthetic_payload(rng) for _ in range(count)]
+    client = app.test_client()
+
+    start = time.perf_counter()
+    for payload in payloads[:single_count]:
+        assert client.post('/api/save_distribution', json=payload).status_code == 200
+    single_seconds = time.perf_counter() - start
+
+    json_seconds = bulk_import(client, payloads, per_request, ndjson=False)
+    ndjson_seconds = bulk_import(client, payloads, per_request, ndjson=True)
+
+    print(json.dumps({
+        'distributions': count,
+        'save_distribution_per_minute': per_minute(single_count, single_seconds),
+        'bulk_json_per_minute': per_minute(count, json_seconds),
+        'bulk_ndjson_per_minute': per_minute(count, ndjson_seconds),
+    }, indent=2))
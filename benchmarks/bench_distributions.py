@@ -0,0 +1,79 @@
+"""
+Per-request latency of GET /api/distributions, with and without the legacy
+per-request schema check (db.create_all() in a before_request hook).
+
+Usage: python benchmarks/bench_distributions.py [requests] [distributions]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix='bench_distributions_')
+os.environ.setdefault('RECEIPTS_DATABASE_URI', f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+
+from app import app  # noqa: E402
+from models import db  # noqa: E402
+from distribution_store import prepare_distribution, save_distributions  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+LEGACY_SCHEMA_CHECK = {'enabled': False}
+
+
+@app.before_request
+def legacy_schema_check():
+    """Reproduces the old hook so both modes run in the same process."""
+    if LEGACY_SCHEMA_CHECK['enabled']:
+        db.create_all()
+
+
+def seed(count):
+    with app.app_context():
+        for i in range(count):
+            data = {
+                'receipt_name': f'Receipt {i}',
+                'total': 10.0,
+                'users': [{'id': 'user1', 'name': 'Alice'}],
+                'items': [{'name': 'Milk', 'price': 10.0, 'users': ['user1']}],
+            }
+            save_distributions(db.session, [(f'b{i:09d}', datetime.utcnow(), prepare_distribution(data))])
+        db.session.commit()
+
+
+def measure(client, count):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get('/api/distributions')
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(timings[len(timings) // 2], 3),
+        'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 3),
+    }
+
+
+if __name__ == '__main__':
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    distribution_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    seed(distribution_count)
+
+    client = app.test_client()
+    client.get('/api/distributions')  # warm up
+
+    LEGACY_SCHEMA_CHECK['enabled'] = True
+    before = measure(client, request_count)
+    LEGACY_SCHEMA_CHECK['enabled'] = False
+    after = measure(client, request_count)
+
+    print(json.dumps({'requests': request_count, 'distributions': distribution_count,
+                      'before_request_create_all': before, 'startup_migration': after}, indent=2))
@@ -0,0 +1,111 @@
+"""
+Peak RSS and throughput of GET /api/export on a database of about `rows`
+item share rows, for NDJSON and CSV with and without gzip, against building
+the same rows as one list and serializing it with jsonify. Each measurement
+runs in a fresh process so peaks do not carry over.
+
+Usage: python benchmarks/bench_export.py [rows]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {
+    'ndjson': '/api/export?format=ndjson',
+    'ndjson_gzip': '/api/export?format=ndjson',
+    'csv': '/api/export?format=csv',
+    'csv_gzip': '/api/export?format=csv',
+}
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_app(db_path):
+    os.environ['RECEIPTS_DATABASE_URI'] = f'sqlite:///{db_path}'
+    from app import app
+    logging.disable(logging.CRITICAL)
+    return app
+
+
+def seed(db_path, target_rows, chunk=500):
+    """Insert synthetic distributions until there are `target_rows` shares."""
+    from bench_storage import synthetic_payload
+    from distribution_store import insert_distributions, prepare_distribution
+    from models import db
+    app = load_app(db_path)
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    rows = count = 0
+    with app.app_context():
+        while rows < target_rows:
+            records = []
+            for _ in range(chunk):
+                prepared = prepare_distribution(synthetic_payload(rng))
+                rows += len(prepared['shares'])
+                records.append((f'e{count:09d}', start + timedelta(minutes=count), prepared))
+                count += 1
+            insert_distributions(db.session, records)
+            db.session.commit()
+    return count, rows
+
+
+def measure(db_path, mode):
+    """Run one export (or the in-memory baseline) and report its cost."""
+    app = load_app(db_path)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'jsonify_list':
+        import export
+        from flask import jsonify
+        from models import db
+        with app.test_request_context():
+            with db.engine.connect() as connection:
+                fields = export.export_fields('shares')
+                rows = [dict(zip(fields, row)) for row in export.iter_rows(connection, 'shares')]
+            body_bytes = len(jsonify(rows).get_data())
+            row_count = len(rows)
+    else:
+        headers = {'Accept-Encoding': 'gzip'} if mode.endswith('_gzip') else {}
+        response = app.test_client().get(MODES[mode], headers=headers, buffered=False)
+        body_bytes = 0
+        newlines = 0
+        for chunk in response.response:
+            body_bytes += len(chunk)
+            newlines += chunk.count(b'\n')
+        response.close()
+        row_count = newlines - (mode == 'csv') if not mode.endswith('_gzip') else None
+    seconds = time.perf_counter() - start
+    return {'seconds': round(seconds, 2), 'body_mb': round(body_bytes / 1e6, 1), 'rows': row_count,
+            'peak_rss_growth_mb': round(peak_rss_mb() - baseline, 1)}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'measure':
+        print(json.dumps(measure(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    target_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench_export_'), 'bench.db')
+    distributions, rows = subprocess.run(
+        [sys.executable, '-c', f'import bench_export; print(*bench_export.seed({db_path!r}, {target_rows}))'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    ).stdout.split()[-2:]
+
+    result = {'distributions': int(distributions), 'share_rows': int(rows)}
+    for mode in [*MODES, 'jsonify_list']:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), 'measure', db_path, mode],
+                                capture_output=True, text=True, check=True).stdout
+        result[mode] = json.loads(output.strip().splitlines()[-1])
+    os.remove(db_path)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,75 @@
+"""
+Per-format cost of receipt format detection and parsing. For every
+registered format (plus receipts in no registered format), times
+detect_format and parse_receipt on receipts of growing length; detection
+only reads the first lines, so its time should stay flat as receipts grow.
+Also reports the dispatch overhead of parse_receipt over calling the
+format's parser directly.
+
+Usage: python benchmarks/bench_formats.py [iterations]
+"""
+import os
+import sys
+import json
+import random
+import logging
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from receipt_formats import detect_format, registered_formats  # noqa: E402
+from receipt_parser import parse_receipt, parse_walmart_receipt  # noqa: E402
+from generators import receipt_text  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+os.environ.pop('GEMINI_API_KEY', None)
+
+SIZES = (10, 1000, 10000)
+
+
+def unknown_receipt(line_count, seed=0):
+    """A plain "NAME  $price" receipt from a grocer with no registered format."""
+    rng = random.Random(seed)
+    lines = ['CORNER GROCER #114', '412 Main St', '04/12/2025 10:41']
+    lines += [f"ITEM {rng.randint(1000, 9999)} {rng.choice(['1GAL', '3LB', 'EA', '12CT'])}      "
+              f"${rng.uniform(0.5, 30):.2f}" for _ in range(max(line_count - 6, 1))]
+    lines += ['SUBTOTAL $99.99', 'TAX $0.00', 'TOTAL $99.99']
+    return "\n".join(lines)
+
+
+# Receipt builders and the parser a detected receipt is handed to, per format
+SAMPLES = {
+    'walmart': (receipt_text, parse_walmart_receipt),
+    'unknown': (unknown_receipt, parse_walmart_receipt),
+}
+
+
+def per_call_us(fn, iterations):
+    return round(min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations * 1e6, 2)
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    names = [receipt_format.name for receipt_format in registered_formats()] + ['unknown']
+    results = {}
+    for name in names:
+        if name not in SAMPLES:
+            results[name] = 'no sample generator'
+            continue
+        build, direct_parse = SAMPLES[name]
+        format_results = {}
+        for lines in SIZES:
+            text = build(lines)
+            detected = detect_format(text)
+            parse_iterations = max(iterations * 10 // lines, 3)
+            format_results[f'{lines}_lines'] = {
+                'detected': detected.name if detected else 'unknown',
+                'detect_us': per_call_us(lambda: detect_format(text), iterations),
+                'parse_receipt_us': per_call_us(lambda: parse_receipt(text), parse_iterations),
+                'direct_parse_us': per_call_us(lambda: direct_parse(text), parse_iterations),
+            }
+        results[name] = format_results
+
+    print(json.dumps({'iterations': iterations, 'formats': results}, indent=2))
+    sys.exit(1 if any(isinstance(result, dict) and any(size['detected'] != name for size in result.values())
+                      for name, result in results.items()) else 0)
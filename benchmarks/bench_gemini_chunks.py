@@ -0,0 +1,67 @@
+"""
+Prompt tokens and latency of parse_with_gemini against a local fake model
+whose latency grows with the prompt: the raw receipt in one call, the
+pre-filtered receipt, and the pre-filtered receipt split into concurrent
+chunks. The fake model answers with the regex parser's items, so every mode
+must return the same items as a single call on the raw text; chunk borders
+included.
+
+Usage: python benchmarks/bench_gemini_chunks.py [lines] [chunk_lines] [seconds_per_1k_tokens]
+"""
+import os
+import sys
+import json
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import receipt_parser  # noqa: E402
+from gemini_client import GeminiClient, estimate_tokens, set_gemini_client  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from receipt_parser import GEMINI_PROMPT, parse_with_gemini, parse_with_regex  # noqa: E402
+from bench_parser import synthetic_receipt  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+FAKE_KEY = 'fake-key'
+
+
+def answer(prompt):
+    """What a well-behaved model returns: the receipt's items, without tax."""
+    items = parse_with_regex(prompt[len(GEMINI_PROMPT):])['items']
+    return json.dumps({'items': [item for item in items if item['name'] != 'Tax']})
+
+
+def run(receipt, prefilter, chunk_lines, seconds_per_token):
+    receipt_parser.PREFILTER = prefilter
+    receipt_parser.CHUNK_LINES = chunk_lines
+    model = FakeGenerativeModel(answer, delay=0.05, delay_per_token=seconds_per_token)
+    set_gemini_client(FAKE_KEY, GeminiClient(FAKE_KEY, model=model, timeout=120))
+    start = time.perf_counter()
+    items = parse_with_gemini(receipt, FAKE_KEY)['items']
+    return items, {
+        'calls': model.calls,
+        'prompt_tokens': sum(estimate_tokens(prompt) for prompt in model.prompts),
+        'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+if __name__ == '__main__':
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chunk_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    seconds_per_token = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.00005
+
+    receipt = synthetic_receipt(line_count, seed=7)
+    expected, raw = run(receipt, prefilter=False, chunk_lines=0, seconds_per_token=seconds_per_token)
+    report = {'lines': line_count, 'items': len(expected), 'raw': raw}
+    mismatches = 0
+    for name, prefilter, chunks in (('prefiltered', True, 0), ('prefiltered_chunked', True, chunk_lines),
+                                    ('raw_chunked', False, chunk_lines)):
+        items, stats = run(receipt, prefilter, chunks, seconds_per_token)
+        stats['items_match'] = items == expected
+        mismatches += items != expected
+        report[name] = stats
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if mismatches else 0)
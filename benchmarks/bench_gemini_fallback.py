@@ -0,0 +1,59 @@
+"""
+Parse latency when Gemini is slow or failing, using a local fake model: plain
+deadline, hedged regex fallback, and the circuit breaker skipping Gemini.
+
+Usage: python benchmarks/bench_gemini_fallback.py [llm_delay_seconds] [deadline_seconds]
+"""
+import os
+import sys
+import json
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_client import CircuitBreaker, GeminiClient, set_gemini_client  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from receipt_parser import parse_walmart_receipt, parse_with_gemini  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+RECEIPT = "Great Value Milk Shopped Qty 1 $3.48\nFresh Banana, Each Shopped Qty 6 $1.50\nTax $0.20\nTotal $5.18"
+FAKE_KEY = 'fake-key'
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        result = type(e).__name__
+    return round((time.perf_counter() - start) * 1000, 1), result
+
+
+if __name__ == '__main__':
+    llm_delay = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    deadline = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+    report = {'llm_delay_s': llm_delay, 'deadline_s': deadline}
+
+    answer = json.dumps({'items': [{'name': 'Great Value Milk', 'price': 3.48}]})
+    fast = GeminiClient(FAKE_KEY, model=FakeGenerativeModel(lambda prompt: answer), timeout=deadline)
+    set_gemini_client(FAKE_KEY, fast)
+    report['healthy_ms'], _ = timed(parse_with_gemini, RECEIPT, FAKE_KEY)
+
+    slow_model = FakeGenerativeModel(lambda prompt: answer, delay=llm_delay)
+    set_gemini_client(FAKE_KEY, GeminiClient(FAKE_KEY, model=slow_model, timeout=deadline))
+    report['deadline_ms'], outcome = timed(parse_with_gemini, RECEIPT, FAKE_KEY)
+    report['deadline_outcome'] = outcome if isinstance(outcome, str) else 'ok'
+    report['hedged_ms'], hedged = timed(parse_with_gemini, RECEIPT, FAKE_KEY, hedged=True)
+    report['hedged_items'] = len(hedged['items']) if isinstance(hedged, dict) else hedged
+
+    failing = FakeGenerativeModel(error=RuntimeError('unavailable'))
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    set_gemini_client(FAKE_KEY, GeminiClient(FAKE_KEY, model=failing, timeout=deadline, breaker=breaker))
+    os.environ['GEMINI_API_KEY'] = FAKE_KEY
+    calls = [timed(parse_walmart_receipt, RECEIPT)[0] for _ in range(10)]
+    report['breaker'] = {'state': breaker.state, 'llm_calls_for_10_parses': failing.calls,
+                         'parse_ms': calls}
+
+    print(json.dumps(report, indent=2))
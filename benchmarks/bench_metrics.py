@@ -0,0 +1,58 @@
+"""
+Per-request cost of the metrics registry: recording a counter increment and
+a labelled latency observation (what every request pays), plus the time to
+render /metrics, merging snapshots from several simulated worker processes.
+
+Usage: python benchmarks/bench_metrics.py [iterations] [workers]
+"""
+import os
+import sys
+import json
+import shutil
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry  # noqa: E402
+
+ROUTES = ['/api/parse', '/api/upload_pdf', '/api/save_distribution', '/api/distributions', '/metrics']
+
+
+def populated_registry(multiproc_dir):
+    registry = Registry(multiproc_dir=multiproc_dir)
+    latency = registry.histogram('http_request_duration_seconds', 'latency', ['method', 'route', 'status'])
+    branches = registry.counter('receipt_parser_branch_total', 'branches', ['branch'])
+    for i, route in enumerate(ROUTES):
+        for status in ('200', '400', '500'):
+            latency.labels('GET', route, status).observe(0.001 * (i + 1))
+    for branch in ('gemini', 'regex', 'alt', 'no_api_key'):
+        branches.labels(branch).inc()
+    return registry, latency, branches
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    multiproc_dir = tempfile.mkdtemp(prefix='bench_metrics_')
+
+    registry, latency, branches = populated_registry(multiproc_dir)
+    inc_seconds = timeit.timeit(lambda: branches.labels('regex').inc(), number=iterations)
+    observe_seconds = timeit.timeit(lambda: latency.labels('GET', '/api/parse', 200).observe(0.012),
+                                    number=iterations)
+
+    # Other workers' snapshots, as their flush threads would leave them
+    for pid in range(workers - 1):
+        registry.flush()
+        os.replace(os.path.join(multiproc_dir, f'metrics_{registry.process_id()}.json'),
+                   os.path.join(multiproc_dir, f'metrics_{pid}.json'))
+    render_seconds = min(timeit.repeat(registry.render, number=20, repeat=3)) / 20
+    shutil.rmtree(multiproc_dir)
+
+    print(json.dumps({
+        'iterations': iterations,
+        'workers': workers,
+        'counter_inc_ns': round(inc_seconds / iterations * 1e9),
+        'histogram_labels_observe_ns': round(observe_seconds / iterations * 1e9),
+        'render_ms': round(render_seconds * 1000, 3),
+    }, indent=2))
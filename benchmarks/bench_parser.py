@@ -0,0 +1,167 @@
+"""
+Throughput of the compiled single-pass regex parser against the previous
+multi-pattern implementation, plus an output equivalence check over a
+reference corpus.
+
+Usage: python benchmarks/bench_parser.py [lines] [iterations]
+"""
+import os
+import re
+import sys
+import json
+import random
+import logging
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from receipt_parser import parse_with_regex  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+
+def legacy_parse(receipt_text):
+    """The regex path of parse_walmart_receipt before the single-pass rewrite."""
+    result = {"items": []}
+    lines = receipt_text.split('\n')
+    lines = [line.strip() for line in lines if line.strip()]
+    pattern1 = re.compile(r'^(.+?)\s+(?:Shopped|Unavailable)\s+Qty\s+\d+\s+\$([\d.]+)$')
+    pattern2 = re.compile(r'^(.+?)\s+Weight-adjusted\s+Qty\s+\d+\s+\$([\d.]+)$')
+    tax_pattern = re.compile(r'^Tax\s+\$([\d.]+)$')
+    pattern4 = re.compile(r'^(.+?)\s+\$([\d.]+)$')
+    for line in lines:
+        if 'Order#' in line or 'Subtotal' in line or 'Total' in line or 'Driver tip' in line:
+            continue
+        if 'delivery' in line.lower() or 'payment method' in line:
+            continue
+        tax_match = tax_pattern.match(line)
+        if tax_match:
+            tax_amount = float(tax_match.group(1).strip())
+            result["items"].append({"name": "Tax", "price": tax_amount})
+            logging.debug(f"Extracted tax: ${tax_amount}")
+            continue
+        match = pattern1.match(line) or pattern2.match(line) or pattern4.match(line)
+        if match:
+            item_name = match.group(1).strip()
+            if any(keyword in item_name.lower() for keyword in ['subtotal', 'total', 'delivery', 'tip']):
+                continue
+            try:
+                item_price = float(match.group(2).strip())
+                result["items"].append({"name": item_name, "price": item_price})
+                logging.debug(f"Extracted item: {item_name} - ${item_price}")
+            except ValueError:
+                logging.debug(f"Failed to convert price to float: {match.group(2)}")
+    if not result["items"]:
+        alt_pattern = re.compile(r'(.+?)\s+\$([\d.]+)\s*$')
+        for line in lines:
+            if 'Order#' in line or 'Subtotal' in line or 'Total' in line:
+                continue
+            match = alt_pattern.search(line)
+            if match:
+                item_name = match.group(1).strip()
+                if any(keyword in item_name.lower() for keyword in ['subtotal', 'total', 'delivery', 'tip']):
+                    continue
+                try:
+                    item_price = float(match.group(2).strip())
+                    result["items"].append({"name": item_name, "price": item_price})
+                    logging.debug(f"Extracted item (alt method): {item_name} - ${item_price}")
+                except ValueError:
+                    logging.debug(f"Failed to convert price to float: {match.group(2)}")
+    logging.debug(f"Parsed {len(result['items'])} items from receipt")
+    return result
+
+
+PRODUCTS = [
+    'Great Value Large White Eggs, 18 Count', 'Fresh Banana, Each', 'Chobani Non-Fat Greek  Yogurt 32 oz',
+    'Great Value Whole Vitamin D Milk, Gallon', 'Tyson Chicken Patties, 23 oz (Frozen)', 'Marketside Fresh Spinach',
+    'Organic Gala Apples, 3 lb Bag', 'Great Value Hamburger Buns, 8 Count', 'Tortilla Chips $ Saver Pack',
+]
+NOISE = [
+    'Apr 12, 2025 order', 'Order# 2000130-95954385', 'Subtotal $38.28', 'Free delivery from  store  $9.95$0',
+    'Driver tip $0.00', 'Total $39.05', 'Charge historyYour transaction activity for this order',
+    'Payment method', 'Ending in 10 184/15/25, 5:21 PM Order details - Walmart.com', '',
+    'https://www.walmart.com/orders/200013095954385 1/1', 'Delivery fee $3.00', 'Bag fee credit $-1.00',
+]
+
+
+def synthetic_receipt(line_count, seed=0):
+    """Build a Walmart-style receipt with roughly line_count lines."""
+    rng = random.Random(seed)
+    lines = []
+    while len(lines) < line_count:
+        roll = rng.random()
+        product = rng.choice(PRODUCTS)
+        price = f"{rng.uniform(0.5, 30):.2f}"
+        if roll < 0.35:
+            lines.append(f"{product} Shopped Qty {rng.randint(1, 4)} ${price}")
+        elif roll < 0.45:
+            lines.append(f"{product} Weight-adjusted Qty 1 ${price}")
+        elif roll < 0.5:
+            lines.append(f"{product} Unavailable Qty 2 ${price}")
+        elif roll < 0.6:
+            lines.append(f"{product} ${price}")
+        elif roll < 0.62:
+            lines.append(f"Tax ${price}")
+        else:
+            lines.append(rng.choice(NOISE))
+    return "\n".join(lines)
+
+
+def reference_corpus():
+    """Receipts that exercise both the strict and the fallback rules."""
+    corpus = [
+        synthetic_receipt(n, seed) for seed, n in enumerate([10, 50, 200, 1000])
+    ]
+    corpus += [
+        '',
+        'Fresh Banana, Each Unavailable Qty 4 $1.12\nTax $0.77\nTotal $39.05',
+        # Only lines the strict rules reject, so the fallback rules apply
+        'Free delivery from store $9.95\nDelivery window $2.00\nPayment method $10.00\nTotal $12',
+        'Milk Shopped Qty 1 $1.2.3\nBread delivery Shopped Qty 1 $2.50\n  Eggs   $3.00  ',
+        'Weight-adjusted Qty 1 $3.00\nX Weight-adjusted Qty 1 Shopped Qty 1 $2.00\nTax Shopped Qty 1 $2',
+        'Tip jar $1.00\nsubtotal-ish thing $2\nTax\t$0.50\nBananas\t$0.25\r\nfoo bar $ 3',
+    ]
+    rng = random.Random(42)
+    tokens = ['Milk', 'Tax', 'Qty', '2', 'Shopped', 'Weight-adjusted', '$1.00', '$4', 'delivery',
+              'Driver tip', 'payment method', 'TIP', 'Total', '$.5', '$1..', ' ', '\t']
+    for _ in range(300):
+        corpus.append("\n".join(" ".join(rng.choice(tokens) for _ in range(rng.randint(1, 6)))
+                                for _ in range(rng.randint(1, 8))))
+    return corpus
+
+
+def check_equivalence():
+    mismatches = 0
+    for receipt in reference_corpus():
+        try:
+            expected = legacy_parse(receipt)
+        except ValueError:
+            expected = ValueError
+        try:
+            actual = parse_with_regex(receipt)
+        except ValueError:
+            actual = ValueError
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH for {receipt!r}:\n  legacy={expected}\n  new={actual}")
+    return mismatches
+
+
+if __name__ == '__main__':
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    mismatches = check_equivalence()
+    receipt = synthetic_receipt(line_count)
+    legacy_seconds = min(timeit.repeat(lambda: legacy_parse(receipt), number=iterations, repeat=3))
+    new_seconds = min(timeit.repeat(lambda: parse_with_regex(receipt), number=iterations, repeat=3))
+
+    print(json.dumps({
+        'lines': line_count,
+        'iterations': iterations,
+        'corpus_mismatches': mismatches,
+        'legacy_receipts_per_sec': round(iterations / legacy_seconds, 1),
+        'single_pass_receipts_per_sec': round(iterations / new_seconds, 1),
+        'speedup': round(legacy_seconds / new_seconds, 2),
+    }, indent=2))
+    sys.exit(1 if mismatches else 0)
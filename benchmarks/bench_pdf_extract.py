@@ -0,0 +1,75 @@
+"""
+Serial page extraction against the process pool of pdf_extract.extract_text,
+over generated receipt PDFs of growing page count, to place
+PDF_PARALLEL_MIN_PAGES. The pool's overhead (sending the PDF to the workers,
+each worker parsing it again, collecting the results) is measured as the pool
+time minus the serial time with the pool pinned to the CPUs available; the
+estimate for `workers` cores is that overhead plus the serial time divided
+among the workers. The threshold should be the smallest page count whose
+estimate beats serial extraction.
+
+Usage: python benchmarks/bench_pdf_extract.py [workers] [max_pages]
+"""
+import os
+import sys
+import json
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+os.environ['PDF_EXTRACT_WORKERS'] = str(WORKERS)
+os.environ['PDF_PARALLEL_MIN_PAGES'] = '1'
+
+import pdf_extract  # noqa: E402
+from generators import receipt_pdf  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+PAGE_COUNTS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64)
+
+
+def best_ms(func, repeat=15):
+    """Fastest of several runs; the least disturbed by other load on the machine."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def serial(pdf_bytes):
+    return "".join(page.extract_text() + "\n" for page in pdf_extract._pdf_reader(pdf_bytes).pages)
+
+
+if __name__ == '__main__':
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    pdf_extract.extract_text(receipt_pdf(WORKERS))  # Start the pool's workers
+
+    results = []
+    break_even = None
+    for pages in (count for count in PAGE_COUNTS if count <= max_pages):
+        pdf_bytes = receipt_pdf(pages)
+        if pdf_extract.extract_text(pdf_bytes)[0] != serial(pdf_bytes):
+            sys.exit(f"Pool and serial text differ for {pages} pages")
+        serial_ms = best_ms(lambda: serial(pdf_bytes))
+        pool_ms = best_ms(lambda: pdf_extract.extract_text(pdf_bytes))
+        # With fewer CPUs than workers the pool runs the same work serially
+        parallel_cpus = min(cpus, WORKERS)
+        overhead_ms = pool_ms - serial_ms / parallel_cpus
+        estimate_ms = overhead_ms + serial_ms / min(WORKERS, pages)
+        if break_even is None and estimate_ms < serial_ms:
+            break_even = pages
+        results.append({'pages': pages, 'serial_ms': round(serial_ms, 1), 'pool_ms': round(pool_ms, 1),
+                        'pool_overhead_ms': round(overhead_ms, 1),
+                        f'estimate_{WORKERS}_cores_ms': round(estimate_ms, 1)})
+
+    print(json.dumps({
+        'workers': WORKERS,
+        'cpus': cpus,
+        'break_even_pages': break_even,
+        'results': results,
+    }, indent=2))
@@ -0,0 +1,144 @@
+"""
+Latency of GET /api/search on a database of about `items` indexed items:
+the first page, a later page and the first page with totals (which
+aggregate every match per user), for word, prefix and phrase queries with
+and without date filters,
+against finding the same items with a LIKE scan of distribution_item.
+Also checks that search totals agree with the LIKE scan, that paging
+returns every match exactly once and that items saved through
+/api/save_distribution are searchable right away.
+
+Usage: python benchmarks/bench_search.py [items]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix='bench_search_')
+os.environ.setdefault('RECEIPTS_DATABASE_URI', f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+
+from sqlalchemy import func, select  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Distribution, DistributionItem  # noqa: E402
+from generators import distribution_payload, seed_database  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+# Items per seeded distribution average (5 + 12) / 2
+ITEMS_PER_DISTRIBUTION = 8.5
+RARE_ITEM = 'McCormick Saffron Threads, 0.06 oz'
+RARE_SAVES = 30
+
+
+def median_ms(func, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def like_count(pattern, since=None, until=None):
+    """Matching items the way one would without the index."""
+    query = select(func.count()).select_from(DistributionItem).where(DistributionItem.name.like(pattern))
+    if since is not None:
+        query = query.join(Distribution, Distribution.id == DistributionItem.distribution_id).where(
+            Distribution.created_at >= since, Distribution.created_at < (until or datetime.max))
+    return db.session.execute(query).scalar()
+
+
+def all_pages(client, params):
+    """Every item of a search, one page at a time."""
+    items = []
+    cursor = None
+    while True:
+        page = client.get('/api/search', query_string=dict(params, limit=200, cursor=cursor or ''))
+        items += page.json['items']
+        cursor = page.json['next_cursor']
+        if cursor is None:
+            return items
+
+
+if __name__ == '__main__':
+    target_items = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    count = int(target_items / ITEMS_PER_DISTRIBUTION)
+    client = app.test_client()
+    failures = 0
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed_database(db.engine, count, days=3 * 365)
+        seed_seconds = time.perf_counter() - start
+        indexed = db.session.execute(select(func.count()).select_from(DistributionItem)).scalar()
+
+    # A rare item saved through the API must be found without a rebuild
+    rng = random.Random(1)
+    for _ in range(RARE_SAVES):
+        payload = distribution_payload(rng, max_items=12)
+        payload['items'][0]['name'] = RARE_ITEM
+        client.post('/api/save_distribution', json=payload)
+
+    now = datetime.utcnow()
+    last_month = (now - timedelta(days=30)).date().isoformat()
+    old_month_start = (now - timedelta(days=2 * 365)).date().isoformat()
+    old_month_end = (now - timedelta(days=2 * 365 - 30)).date().isoformat()
+    queries = {
+        'word': {'q': 'eggs'},
+        'prefix': {'q': 'chick*'},
+        'phrase': {'q': '"white eggs"'},
+        'word_last_month': {'q': 'eggs', 'since': last_month},
+        'word_old_month': {'q': 'eggs', 'since': old_month_start, 'until': old_month_end},
+        'rare_word': {'q': 'saffron'},
+    }
+    results = {}
+    with app.app_context():
+        for name, params in queries.items():
+            totals_params = dict(params, totals=1)
+            first = client.get('/api/search', query_string=totals_params).json
+            next_params = dict(params, cursor=first['next_cursor']) if first['next_cursor'] else params
+            results[name] = {
+                'matches': first['totals']['items'],
+                'first_page_ms': median_ms(lambda: client.get('/api/search', query_string=params)),
+                'next_page_ms': median_ms(lambda: client.get('/api/search', query_string=next_params)),
+                'with_totals_ms': median_ms(lambda: client.get('/api/search', query_string=totals_params), 5),
+            }
+
+        like_ms = median_ms(lambda: like_count('%eggs%'), 3)
+        expected = {
+            'word': like_count('%eggs%'),
+            'prefix': like_count('%chick%'),
+            'phrase': like_count('%white eggs%'),
+            'word_last_month': like_count('%eggs%', datetime.fromisoformat(last_month)),
+            'word_old_month': like_count('%eggs%', datetime.fromisoformat(old_month_start),
+                                         datetime.fromisoformat(old_month_end)),
+            'rare_word': RARE_SAVES,
+        }
+    for name, matches in expected.items():
+        if results[name]['matches'] != matches:
+            failures += 1
+            print(f"MISMATCH for {name}: search found {results[name]['matches']}, LIKE found {matches}")
+
+    for name in ('word_last_month', 'word_old_month', 'rare_word'):
+        paged = all_pages(client, queries[name])
+        if len(paged) != results[name]['matches']:
+            failures += 1
+            print(f"PAGING for {name}: {len(paged)} items over all pages, {results[name]['matches']} matches")
+
+    print(json.dumps({
+        'distributions': count + RARE_SAVES,
+        'indexed_items': indexed,
+        'seed_seconds': round(seed_seconds, 1),
+        'like_scan_ms': like_ms,
+        'queries': results,
+        'failures': failures,
+    }, indent=2))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,118 @@
+"""
+Latency of GET /api/settle_up on a group with years of history, against
+working out the same net balances by scanning every distribution, plus the
+cost save_distribution pays to keep the pair balances current. Checks that
+the incrementally maintained balances equal a rebuild from history and that
+the suggested transfers settle every net balance.
+
+Usage: python benchmarks/bench_settle_up.py [distributions] [members]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+import statistics
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix='bench_settle_up_')
+os.environ.setdefault('RECEIPTS_DATABASE_URI', f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+
+from sqlalchemy import select  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Distribution, DistributionUser  # noqa: E402
+from shares import to_cents  # noqa: E402
+from generators import distribution_payload, member_names, seed_database  # noqa: E402
+import balances  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def nets_from_history():
+    """Net balances the slow way: every share of every receipt with a payer."""
+    net = defaultdict(int)
+    rows = db.session.execute(
+        select(Distribution.paid_by, DistributionUser.user_name, DistributionUser.amount)
+        .join(DistributionUser, DistributionUser.distribution_id == Distribution.id)
+        .where(Distribution.paid_by.isnot(None))
+    )
+    for payer, user_name, amount in rows:
+        if user_name != payer:
+            cents = to_cents(amount)
+            net[user_name] -= cents
+            net[payer] += cents
+    return {user_name: cents for user_name, cents in net.items() if cents}
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    member_count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    members = member_names(member_count)
+    client = app.test_client()
+    failures = 0
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed_database(db.engine, count, days=3 * 365, members=members)
+        seed_seconds = time.perf_counter() - start
+
+        settle_up_ms = median_ms(lambda: client.get('/api/settle_up'), 20)
+        response = client.get('/api/settle_up').json
+        net = balances.net_balances(db.session)
+        scan_ms = median_ms(nets_from_history, 3)
+        if nets_from_history() != net:
+            failures += 1
+            print('MISMATCH: pair balances differ from the history scan')
+
+        # The transfers must leave everyone at zero, in at most n - 1 steps
+        transfers = balances.simplify(net)
+        remaining = dict(net)
+        for from_user, to_user, cents in transfers:
+            remaining[from_user] += cents
+            remaining[to_user] -= cents
+        if any(remaining.values()) or len(transfers) > max(len(net) - 1, 0):
+            failures += 1
+            print(f'UNSETTLED: {remaining}')
+        if len(response['transfers']) != len(transfers):
+            failures += 1
+
+        rng = random.Random(1)
+        payloads = [distribution_payload(rng, max_items=12, members=members) for _ in range(50)]
+        save_ms = median_ms(lambda: client.post('/api/save_distribution', json=payloads.pop()), 50)
+
+        # A rebuild from history must land on the incrementally kept balances
+        before = balances.net_balances(db.session)
+        start = time.perf_counter()
+        balances.rebuild(db.session)
+        db.session.commit()
+        rebuild_ms = round((time.perf_counter() - start) * 1000, 1)
+        if balances.net_balances(db.session) != before:
+            failures += 1
+            print('MISMATCH: rebuild differs from the incremental balances')
+
+    print(json.dumps({
+        'distributions': count,
+        'members': member_count,
+        'seed_seconds': round(seed_seconds, 1),
+        'settle_up_ms': settle_up_ms,
+        'history_scan_ms': scan_ms,
+        'save_distribution_ms': save_ms,
+        'rebuild_ms': rebuild_ms,
+        'users_with_balance': len(net),
+        'transfers': len(transfers),
+        'failures': failures,
+    }, indent=2))
+    sys.exit(1 if failures else 0)
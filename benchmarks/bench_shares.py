@@ -0,0 +1,77 @@
+"""
+Share allocation time of the previous per-user loop in save_distribution
+against allocate_shares, for equal and weighted splits, plus a check that
+every item's shares add up to its price.
+
+Usage: python benchmarks/bench_shares.py [users] [items] [iterations]
+"""
+import os
+import sys
+import json
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shares import allocate_shares, to_cents  # noqa: E402
+
+
+def legacy_shares(data):
+    """The share loop of save_distribution before the share engine."""
+    user_totals = []
+    for user in data['users']:
+        user_items = []
+        user_total = 0
+        for item in data['items']:
+            if user['id'] in item.get('users', []):
+                user_count = len(item.get('users', []))
+                if user_count > 0:
+                    share = item['price'] / user_count
+                    user_total += share
+                    user_items.append({'name': item['name'], 'price': item['price'], 'share': share})
+        user_totals.append(user_total)
+    return user_totals
+
+
+def synthetic_distribution(user_count, item_count, seed=0, weighted=0.0):
+    rng = random.Random(seed)
+    users = [{'id': f'user{i}', 'name': f'User {i}'} for i in range(user_count)]
+    items = []
+    for i in range(item_count):
+        assigned = [user['id'] for user in rng.sample(users, rng.randint(1, user_count))]
+        item = {'name': f'Item {i}', 'price': round(rng.uniform(0.01, 40), 2), 'users': assigned}
+        if rng.random() < weighted:
+            item['weights'] = {user_id: rng.choice([1, 2, 0.5, 3]) for user_id in assigned}
+        items.append(item)
+    return {'users': users, 'items': items}
+
+
+def check(data):
+    """Return the number of items whose shares do not add up to the price."""
+    share_cents, _ = allocate_shares(data['users'], data['items'])
+    per_item = {}
+    for item_index, _, cents in share_cents:
+        per_item[item_index] = per_item.get(item_index, 0) + cents
+    return sum(per_item[i] != to_cents(data['items'][i]['price']) for i in per_item)
+
+
+if __name__ == '__main__':
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    item_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    data = synthetic_distribution(user_count, item_count)
+    weighted = synthetic_distribution(user_count, item_count, seed=1, weighted=1.0)
+    bad_sums = check(data) + check(weighted)
+
+    result = {'users': user_count, 'items': item_count, 'iterations': iterations,
+              'items_not_summing_to_price': bad_sums}
+    for name, function, distribution in [
+        ('legacy_loop', legacy_shares, data),
+        ('allocate_shares_equal', lambda d: allocate_shares(d['users'], d['items']), data),
+        ('allocate_shares_weighted', lambda d: allocate_shares(d['users'], d['items']), weighted),
+    ]:
+        seconds = min(timeit.repeat(lambda: function(distribution), number=iterations, repeat=3))
+        result[f'{name}_ms'] = round(seconds / iterations * 1000, 3)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if bad_sums else 0)
@@ -0,0 +1,119 @@
+"""
+Concurrent read/write stress test of the SQLite engine profile. Several
+processes (standing in for gunicorn workers), each with several threads,
+mix POST /api/save_distribution with GET /analytics and GET /api/distributions
+against one database file, first with SQLITE_TUNING=0 (rollback journal,
+driver defaults) and then with the tuned profile (WAL, busy timeout, pragmas).
+Reports requests per second and the share of requests that failed with
+"database is locked".
+
+Usage: python benchmarks/bench_sqlite_concurrency.py [processes] [threads] [seconds] [write_ratio]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import tempfile
+import threading
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+READS = ['/analytics', '/api/distributions?limit=20']
+
+
+def load_app(db_path, tuned):
+    os.environ['RECEIPTS_DATABASE_URI'] = f'sqlite:///{db_path}'
+    os.environ['SQLITE_TUNING'] = '1' if tuned else '0'
+    logging.disable(logging.CRITICAL)
+    from app import app
+    return app
+
+
+def prepare(db_path, tuned, seed_count):
+    """Migrate and seed the database in a single process."""
+    from bench_storage import synthetic_payload
+    client = load_app(db_path, tuned).test_client()
+    rng = random.Random(0)
+    for _ in range(seed_count):
+        assert client.post('/api/save_distribution', json=synthetic_payload(rng)).status_code == 200
+
+
+def worker(db_path, tuned, threads, seconds, write_ratio, seed, results):
+    from bench_storage import synthetic_payload
+    app = load_app(db_path, tuned)
+    counts = {'reads': 0, 'writes': 0, 'locked': 0, 'other_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            if rng.random() < write_ratio:
+                kind, response = 'writes', client.post('/api/save_distribution', json=synthetic_payload(rng))
+            else:
+                kind, response = 'reads', client.get(rng.choice(READS))
+            with lock:
+                counts[kind] += 1
+                if response.status_code != 200:
+                    body = response.get_data(as_text=True)
+                    counts['locked' if 'database is locked' in body else 'other_errors'] += 1
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+def stress(tuned, processes, threads, seconds, write_ratio, seed_count=200):
+    workdir = tempfile.mkdtemp(prefix='bench_sqlite_')
+    db_path = os.path.join(workdir, 'bench.db')
+    context = multiprocessing.get_context('spawn')
+    setup = context.Process(target=prepare, args=(db_path, tuned, seed_count))
+    setup.start()
+    setup.join()
+
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(db_path, tuned, threads, seconds, write_ratio, i, results))
+               for i in range(processes)]
+    for process in workers:
+        process.start()
+    totals = {'reads': 0, 'writes': 0, 'locked': 0, 'other_errors': 0}
+    for _ in workers:
+        for key, value in results.get().items():
+            totals[key] += value
+    for process in workers:
+        process.join()
+    shutil.rmtree(workdir)
+
+    requests = totals['reads'] + totals['writes']
+    return {
+        **totals,
+        'requests_per_sec': round(requests / seconds, 1),
+        'writes_per_sec': round(totals['writes'] / seconds, 1),
+        'lock_error_rate': round(totals['locked'] / requests, 4) if requests else 0,
+    }
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 15
+    write_ratio = float(sys.argv[4]) if len(sys.argv) > 4 else 0.3
+
+    print(json.dumps({
+        'processes': processes,
+        'threads': threads,
+        'seconds': seconds,
+        'write_ratio': write_ratio,
+        'default': stress(False, processes, threads, seconds, write_ratio),
+        'tuned': stress(True, processes, threads, seconds, write_ratio),
+    }, indent=2))
@@ -0,0 +1,165 @@
+"""
+Database size and write time of the legacy JSON-blob layout (full payload in
+distribution_data plus items_json per user) against the normalized item and
+item share tables, on a synthetic dataset. Also migrates a copy of the legacy
+database, timing the schema migration and each backfill batch, and checks
+that to_dict output is unchanged by the migration.
+
+Usage: python benchmarks/bench_storage.py [receipts] [commit_every]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, text  # noqa: E402
+from sqlalchemy.orm import Session, selectinload  # noqa: E402
+from models import db, Distribution, DistributionUser  # noqa: E402
+from distribution_store import insert_distributions, prepare_distribution  # noqa: E402
+from migrations import run_backfills, run_migrations  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+NAMES = ['Alice', 'Bob', 'Carol', 'Dan', 'Erin', 'Frank']
+PRODUCTS = ['Great Value Large White Eggs, 18 Count', 'Fresh Banana, Each', 'Marketside Fresh Spinach',
+            'Great Value Whole Vitamin D Milk, Gallon', 'Tyson Chicken Patties, 23 oz (Frozen)', 'Tax']
+
+
+def synthetic_payload(rng):
+    """A save_distribution payload shaped like the frontend's."""
+    users = [{'id': f'user{i + 1}', 'name': name, 'active': True}
+             for i, name in enumerate(NAMES[:rng.randint(2, len(NAMES))])]
+    items = []
+    for i in range(rng.randint(5, 40)):
+        assigned = rng.sample(users, rng.randint(1, len(users)))
+        assigned.sort(key=users.index)
+        items.append({'id': i, 'name': rng.choice(PRODUCTS), 'price': round(rng.uniform(0.5, 30), 2),
+                      'users': [user['id'] for user in assigned]})
+    return {'items': items, 'users': users, 'total': round(sum(item['price'] for item in items), 2)}
+
+
+def legacy_save(session, data, distribution_id):
+    """save_distribution before items were normalized."""
+    distribution = Distribution(receipt_name=data.get('receipt_name', 'Walmart Receipt'),
+                                total_amount=float(data['total']), distribution_data=json.dumps(data),
+                                distribution_id=distribution_id)
+    for user in data['users']:
+        user_items = []
+        user_total = 0
+        for item in data['items']:
+            if user['id'] in item.get('users', []):
+                share = item['price'] / len(item['users'])
+                user_total += share
+                user_items.append({'name': item['name'], 'price': item['price'], 'share': share})
+        distribution.users.append(DistributionUser(user_name=user['name'], user_identifier=user['id'],
+                                                   amount=user_total, items_json=json.dumps(user_items)))
+    session.add(distribution)
+    session.flush()
+
+
+def normalized_save(session, data, distribution_id):
+    """The distribution tables' part of save_distribution today."""
+    insert_distributions(session, [(distribution_id, datetime.utcnow(), prepare_distribution(data))])
+
+
+def write(path, save, receipts, commit_every):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with Session(engine) as session:
+        for i in range(receipts):
+            save(session, synthetic_payload(rng), f'd{i:09d}')
+            if (i + 1) % commit_every == 0:
+                session.commit()
+        session.commit()
+    seconds = time.perf_counter() - start
+    engine.dispose()
+    return seconds
+
+
+def vacuumed_size(path):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.connect() as connection:
+        connection.execute(text('VACUUM'))
+    engine.dispose()
+    return os.path.getsize(path)
+
+
+def dump(path, sample):
+    """to_dict output of the first `sample` distributions, ids excluded."""
+    engine = create_engine(f'sqlite:///{path}')
+    with Session(engine) as session:
+        distributions = session.scalars(
+            select(Distribution).options(selectinload(Distribution.users), selectinload(Distribution.items))
+            .order_by(Distribution.id).limit(sample)
+        ).all()
+        result = []
+        for distribution in distributions:
+            data = distribution.to_dict(['distribution_id', 'total_amount', 'distribution_data', 'users'])
+            for user in data['users']:
+                del user['id']
+            result.append(json.dumps(data, sort_keys=True))
+    engine.dispose()
+    return result
+
+
+if __name__ == '__main__':
+    receipts = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    commit_every = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    workdir = tempfile.mkdtemp(prefix='bench_storage_')
+    legacy_path = os.path.join(workdir, 'legacy.db')
+    normalized_path = os.path.join(workdir, 'normalized.db')
+    migrated_path = os.path.join(workdir, 'migrated.db')
+
+    legacy_seconds = write(legacy_path, legacy_save, receipts, commit_every)
+    normalized_seconds = write(normalized_path, normalized_save, receipts, commit_every)
+    shutil.copy(legacy_path, migrated_path)
+
+    # Migrating blocks startup only for the schema changes; the rows are
+    # converted one committed batch at a time
+    engine = create_engine(f'sqlite:///{migrated_path}')
+    start = time.perf_counter()
+    run_migrations(engine)
+    schema_seconds = time.perf_counter() - start
+    batch_seconds = []
+    pending = True
+    while pending:
+        start = time.perf_counter()
+        pending = run_backfills(engine, seconds=0)
+        batch_seconds.append(time.perf_counter() - start)
+    engine.dispose()
+
+    # New saves allocate shares in whole cents, so only their payload must
+    # match; migrated rows must match in full
+    sample = min(receipts, 1000)
+    legacy_dump = dump(legacy_path, sample)
+    mismatches = sum(a != b for a, b in zip(legacy_dump, dump(migrated_path, sample)))
+    mismatches += sum(json.loads(a)['distribution_data'] != json.loads(b)['distribution_data']
+                      for a, b in zip(legacy_dump, dump(normalized_path, sample)))
+
+    print(json.dumps({
+        'receipts': receipts,
+        'commit_every': commit_every,
+        'legacy': {'write_seconds': round(legacy_seconds, 2),
+                   'receipts_per_sec': round(receipts / legacy_seconds, 1),
+                   'db_bytes': vacuumed_size(legacy_path)},
+        'normalized': {'write_seconds': round(normalized_seconds, 2),
+                       'receipts_per_sec': round(receipts / normalized_seconds, 1),
+                       'db_bytes': vacuumed_size(normalized_path)},
+        'migration': {'schema_seconds': round(schema_seconds, 3),
+                      'backfill_seconds': round(sum(batch_seconds), 2),
+                      'backfill_batches': len(batch_seconds),
+                      'max_batch_seconds': round(max(batch_seconds), 3),
+                      'db_bytes': vacuumed_size(migrated_path)},
+        'to_dict_mismatches': mismatches,
+    }, indent=2))
+    shutil.rmtree(workdir)
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,123 @@
+"""
+Time to first item and to the end of the response of POST /api/upload_pdf
+with ?stream=ndjson against the buffered upload, over generated PDFs of
+growing page count (plus ones with pages of transaction history after the
+total, which streaming never extracts). Also checks that the incremental
+parser, fed a receipt in random chunks, returns exactly what
+parse_with_regex returns for the reference corpus and the golden receipts.
+
+Usage: python benchmarks/bench_stream.py [max_pages] [trailing_pages]
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import random
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix='bench_stream_')
+os.environ.setdefault('RECEIPTS_DATABASE_URI', f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+# One process, so timings do not depend on the extraction pool
+os.environ.setdefault('PDF_EXTRACT_WORKERS', '0')
+
+from app import app  # noqa: E402
+from receipt_parser import IncrementalReceiptParser, parse_with_regex  # noqa: E402
+from generators import receipt_pdf  # noqa: E402
+from bench_parser import reference_corpus  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+os.environ.pop('GEMINI_API_KEY', None)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'golden')
+
+
+def streamed(text, rng):
+    parser = IncrementalReceiptParser()
+    items = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 200)
+        items += parser.feed(text[position:position + size])
+        position += size
+    items += parser.close()
+    return items
+
+
+def check_equivalence():
+    rng = random.Random(0)
+    corpus = reference_corpus()
+    for path in sorted(glob.glob(os.path.join(GOLDEN_DIR, '*', '*.txt'))):
+        with open(path) as f:
+            corpus.append(f.read())
+    mismatches = 0
+    for receipt in corpus:
+        try:
+            expected = parse_with_regex(receipt)['items']
+        except ValueError:
+            expected = ValueError
+        try:
+            actual = streamed(receipt, rng)
+        except ValueError:
+            actual = ValueError
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH for {receipt!r}:\n  parse_with_regex={expected}\n  streamed={actual}")
+    return mismatches
+
+
+def upload(client, pdf_bytes, stream):
+    """Return (ms to the first item, ms to the end, item count) of one upload."""
+    query = '?stream=ndjson' if stream else ''
+    start = time.perf_counter()
+    response = client.post(f'/api/upload_pdf{query}', buffered=False,
+                           data={'file': (io.BytesIO(pdf_bytes), 'receipt.pdf')})
+    first_item_ms = None
+    items = 0
+    for chunk in response.response:
+        if first_item_ms is None:
+            first_item_ms = (time.perf_counter() - start) * 1000
+        if stream:
+            items += chunk.count(b'"event": "item"')
+        else:
+            items = len(json.loads(chunk)['items'])
+    total_ms = (time.perf_counter() - start) * 1000
+    response.close()
+    return first_item_ms, total_ms, items
+
+
+def fastest(client, pdfs, stream):
+    """Fastest upload of several same-sized PDFs; distinct files so the parse cache never hits."""
+    return min((upload(client, pdf_bytes, stream) for pdf_bytes in pdfs), key=lambda result: result[1])
+
+
+if __name__ == '__main__':
+    max_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    trailing_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    mismatches = check_equivalence()
+    client = app.test_client()
+
+    results = []
+    page_counts = [pages for pages in (1, 4, 16, 64, 256) if pages <= max_pages]
+    for pages, trailing in [(pages, 0) for pages in page_counts] + [(page_counts[-1], trailing_pages)]:
+        pdfs = [receipt_pdf(pages, seed=seed, trailing_pages=trailing) for seed in range(6)]
+        buffered_first, buffered_total, buffered_items = fastest(client, pdfs[:3], stream=False)
+        stream_first, stream_total, stream_items = fastest(client, pdfs[3:], stream=True)
+        if stream_items != buffered_items:
+            mismatches += 1
+        results.append({
+            'pages': pages,
+            'trailing_pages': trailing,
+            'items': stream_items,
+            'buffered_first_item_ms': round(buffered_first, 1),
+            'buffered_total_ms': round(buffered_total, 1),
+            'stream_first_item_ms': round(stream_first, 1),
+            'stream_total_ms': round(stream_total, 1),
+        })
+
+    print(json.dumps({'mismatches': mismatches, 'uploads': results}, indent=2))
+    sys.exit(1 if mismatches else 0)
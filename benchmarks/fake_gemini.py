@@ -0,0 +1,43 @@
+"""
+Local stand-in for the Gemini model, for benchmarks and tests that exercise
+the Gemini path of the parser without an API key or network access.
+"""
+import time
+from types import SimpleNamespace
+from gemini_client import estimate_tokens
+
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel.
+
+    Responses carry usage_metadata like the real ones, with estimated token
+    counts, and delay_per_token makes latency grow with the prompt.
+
+    Args:
+        responder: Callable taking the prompt and returning the response text
+        delay (float): Seconds to sleep before answering
+        error (Exception): Raised instead of answering, if given
+        delay_per_token (float): Additional seconds per prompt token
+    """
+
+    def __init__(self, responder=None, delay=0.0, error=None, delay_per_token=0.0):
+        self.responder = responder or (lambda prompt: '{"items": []}')
+        self.delay = delay
+        self.error = error
+        self.delay_per_token = delay_per_token
+        self.calls = 0
+        self.prompts = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        self.prompts.append(prompt)
+        prompt_tokens = estimate_tokens(prompt)
+        delay = self.delay + self.delay_per_token * prompt_tokens
+        if delay:
+            time.sleep(delay)
+        if self.error is not None:
+            raise self.error
+        text = self.responder(prompt)
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+            prompt_token_count=prompt_tokens, candidates_token_count=estimate_tokens(text)))
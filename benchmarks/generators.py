@@ -0,0 +1,202 @@
+"""
+Synthetic inputs for the benchmark suite: Walmart-style receipt text, multi-page
+receipt PDFs (written directly, no PDF library needed) and a seeder that fills
+a SQLite database with distributions and their rollups. Everything is derived
+from a seed, so runs are reproducible and need no network or sample files.
+
+Usage: python benchmarks/generators.py receipt|pdf|seed [size] [path]
+"""
+import os
+import sys
+import random
+import logging
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NAMES = ['Alice', 'Bob', 'Carol', 'Dan', 'Erin', 'Frank']
+PRODUCTS = [
+    'Great Value Large White Eggs, 18 Count', 'Fresh Banana, Each', 'Chobani Non-Fat Greek  Yogurt 32 oz',
+    'Great Value Whole Vitamin D Milk, Gallon', 'Tyson Chicken Patties, 23 oz (Frozen)', 'Marketside Fresh Spinach',
+    'Organic Gala Apples, 3 lb Bag', 'Great Value Hamburger Buns, 8 Count', 'Tortilla Chips $ Saver Pack',
+]
+HEADER = ['Apr 12, 2025 order', 'Order# 2000130-95954385', 'Shopped items']
+FOOTER = ['Subtotal $38.28', 'Free delivery from  store  $9.95$0', 'Driver tip $0.00', 'Total $39.05',
+          'Charge historyYour transaction activity for this order', 'Payment method', 'Ending in 1018']
+
+
+def receipt_lines(line_count, seed=0):
+    """
+    Lines of a Walmart order receipt: a header, item lines in the shapes the
+    parser handles (shopped, weight-adjusted, unavailable), tax and a footer.
+
+    Args:
+        line_count (int): Total number of lines, at least 10
+        seed (int): Random seed
+
+    Returns:
+        list: The receipt's lines
+    """
+    rng = random.Random(seed)
+    item_count = max(line_count - len(HEADER) - len(FOOTER) - 1, 1)
+    items = []
+    for _ in range(item_count):
+        product = rng.choice(PRODUCTS)
+        price = f"{rng.uniform(0.5, 30):.2f}"
+        roll = rng.random()
+        if roll < 0.8:
+            items.append(f"{product} Shopped Qty {rng.randint(1, 4)} ${price}")
+        elif roll < 0.95:
+            items.append(f"{product} Weight-adjusted Qty 1 ${price}")
+        else:
+            items.append(f"{product} Unavailable Qty 1 ${price}")
+    return HEADER + items + [f"Tax ${rng.uniform(0.1, 5):.2f}"] + FOOTER
+
+
+def receipt_text(line_count, seed=0):
+    """A receipt of line_count lines as pypdf would extract it."""
+    return "\n".join(receipt_lines(line_count, seed))
+
+
+def _pdf_string(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').encode('latin-1', 'replace')
+
+
+def receipt_pdf(page_count, lines_per_page=40, seed=0, trailing_pages=0):
+    """
+    A multi-page receipt PDF with lines_per_page lines of text per page.
+
+    The file is a minimal PDF 1.4 document using the standard Helvetica
+    font, which pypdf extracts line by line like a printed order page.
+    trailing_pages adds pages of transaction history after the order
+    summary, which no item is ever found on.
+
+    Returns:
+        bytes: The PDF contents
+    """
+    lines = receipt_lines(page_count * lines_per_page, seed)
+    pages = [lines[i:i + lines_per_page] for i in range(0, page_count * lines_per_page, lines_per_page)]
+    pages += [[f'Charge {i + 1} of order 2000130-95954385, card ending in 1018'] * lines_per_page
+              for i in range(trailing_pages)]
+
+    # Objects 1-3 are the catalog, page tree and font; then a page and its
+    # content stream per page
+    objects = [b'', b'', b'<< /Type /Font /Subtype /Type1 /Name /F1 /BaseFont /Helvetica >>']
+    page_refs = []
+    for page_lines in pages:
+        content = b'BT /F1 10 Tf 12 TL 36 800 Td ' + b' '.join(
+            b'(' + _pdf_string(line) + b') Tj T*' for line in page_lines) + b' ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        page_refs.append(b'%d 0 R' % len(objects))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(page_refs), len(page_refs))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def member_names(count):
+    """`count` distinct user names: NAMES, then numbered ones."""
+    return (NAMES + [f'Member {i + 1}' for i in range(len(NAMES), count)])[:count]
+
+
+def distribution_payload(rng, min_items=5, max_items=40, members=None):
+    """
+    A save_distribution payload shaped like the frontend's.
+
+    With `members`, each receipt is split between up to six of them, one of
+    whom paid; otherwise the first two to six NAMES share it and nobody is
+    recorded as the payer.
+    """
+    if members:
+        names = rng.sample(members, rng.randint(2, min(len(members), len(NAMES))))
+    else:
+        names = NAMES[:rng.randint(2, len(NAMES))]
+    users = [{'id': f'user{i + 1}', 'name': name, 'active': True} for i, name in enumerate(names)]
+    items = []
+    for i in range(rng.randint(min_items, max_items)):
+        assigned = rng.sample(users, rng.randint(1, len(users)))
+        assigned.sort(key=users.index)
+        items.append({'id': i, 'name': rng.choice(PRODUCTS), 'price': round(rng.uniform(0.5, 30), 2),
+                      'users': [user['id'] for user in assigned]})
+    payload = {'receipt_name': 'Walmart Receipt', 'items': items, 'users': users,
+               'total': round(sum(item['price'] for item in items), 2)}
+    if members:
+        payload['paid_by'] = rng.choice(users)['id']
+    return payload
+
+
+def seed_database(engine, count, seed=0, days=90, batch_size=2000, max_items=12, members=None):
+    """
+    Insert `count` distributions spread over the last `days` days, with rollups,
+    search index entries and, when they have a payer, balances.
+
+    Uses the bulk import path (one executemany per table per batch), so a
+    million distributions take minutes rather than hours. The schema must
+    already exist, e.g. from run_migrations.
+
+    Args:
+        engine: SQLAlchemy engine of the database to fill
+        count (int): Number of distributions
+        seed (int): Random seed
+        days (int): Age of the oldest distribution
+        batch_size (int): Distributions per transaction
+        max_items (int): Upper bound of items per distribution
+        members (list): Optional user names of a group sharing every receipt,
+                        see distribution_payload
+
+    Returns:
+        int: Number of distributions inserted
+    """
+    from distribution_store import prepare_distribution, save_distributions
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    step = timedelta(days=days) / max(count, 1)
+    for start in range(0, count, batch_size):
+        records = []
+        for i in range(start, min(start + batch_size, count)):
+            created_at = now - timedelta(days=days) + step * i
+            records.append((f'seed{seed:02d}{i:010d}', created_at,
+                            prepare_distribution(distribution_payload(rng, max_items=max_items, members=members))))
+        with engine.begin() as connection:
+            save_distributions(connection, records)
+    return count
+
+
+if __name__ == '__main__':
+    kind = sys.argv[1] if len(sys.argv) > 1 else 'receipt'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else {'receipt': 100, 'pdf': 3, 'seed': 10000}.get(kind, 0)
+    path = sys.argv[3] if len(sys.argv) > 3 else None
+
+    if kind == 'receipt':
+        text = receipt_text(size)
+        if path:
+            with open(path, 'w') as f:
+                f.write(text)
+        else:
+            print(text)
+    elif kind == 'pdf':
+        with open(path or 'synthetic_receipt.pdf', 'wb') as f:
+            f.write(receipt_pdf(size))
+    elif kind == 'seed':
+        from sqlalchemy import create_engine
+        from migrations import run_migrations
+
+        logging.disable(logging.CRITICAL)
+        engine = create_engine(f"sqlite:///{path or 'seeded.db'}")
+        run_migrations(engine)
+        seed_database(engine, size)
+        engine.dispose()
+    else:
+        sys.exit(f"Unknown generator {kind!r}; expected receipt, pdf or seed")
@@ -0,0 +1,183 @@
+"""
+Offline micro-benchmark suite. Times parse_walmart_receipt over synthetic
+receipts of 10 to 10k lines, PDF text extraction over generated multi-page
+PDFs, POST /api/save_distribution, GET /analytics and Distribution.to_dict
+against a scratch database seeded with `distributions` rows, and writes the
+results as JSON. With --compare, also prints each median's ratio to an
+earlier results file, so runs before and after a change can be compared.
+
+The Gemini API key is ignored, so parsing always takes the regex path and
+nothing leaves the machine.
+
+Usage: python benchmarks/suite.py [--distributions N] [--quick] [--output results.json] [--compare baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix='bench_suite_')
+os.environ.setdefault('RECEIPTS_DATABASE_URI', f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import Session, selectinload  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Distribution  # noqa: E402
+from receipt_parser import parse_walmart_receipt  # noqa: E402
+from pdf_extract import extract_text  # noqa: E402
+from generators import receipt_text, receipt_pdf, distribution_payload, seed_database  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+# app loads .env; keep parsing on the local regex path
+os.environ.pop('GEMINI_API_KEY', None)
+
+RECEIPT_LINES = (10, 100, 1000, 10000)
+PDF_PAGES = (1, 4, 16)
+
+
+def measure(fn, iterations, warmup=1):
+    """
+    Call fn repeatedly and summarize the per-call wall time.
+
+    Returns:
+        dict: Iteration count, min/median/p95/mean in milliseconds and calls per second
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    mean = statistics.fmean(samples)
+    return {
+        'iterations': iterations,
+        'min_ms': round(samples[0], 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 4),
+        'mean_ms': round(mean, 4),
+        'per_sec': round(1000 / mean, 1) if mean else None,
+    }
+
+
+def bench_parse(scale):
+    results = {}
+    for lines in RECEIPT_LINES:
+        text = receipt_text(lines)
+        results[f'parse_walmart_receipt/{lines}_lines'] = measure(
+            lambda: parse_walmart_receipt(text), max(int(20000 * scale / lines), 5))
+    return results
+
+
+def bench_pdf(scale):
+    results = {}
+    for pages in PDF_PAGES:
+        pdf_bytes = receipt_pdf(pages)
+        results[f'pdf_extract/{pages}_pages'] = {
+            'pdf_bytes': len(pdf_bytes),
+            **measure(lambda: extract_text(pdf_bytes), max(int(100 * scale / pages), 3)),
+        }
+    return results
+
+
+def bench_save(client, scale):
+    rng = random.Random(1)
+    payloads = iter([distribution_payload(rng) for _ in range(int(500 * scale) + 1)])
+
+    def save():
+        response = client.post('/api/save_distribution', json=next(payloads))
+        assert response.status_code == 200, response.json
+
+    return {'save_distribution': measure(save, int(500 * scale))}
+
+
+def bench_analytics(client, scale):
+    def analytics():
+        response = client.get('/analytics')
+        assert response.status_code == 200
+
+    return {'analytics': measure(analytics, max(int(50 * scale), 3))}
+
+
+def bench_to_dict(scale):
+    with Session(db.engine) as session:
+        distributions = session.scalars(
+            select(Distribution).options(selectinload(Distribution.users), selectinload(Distribution.items))
+            .order_by(Distribution.created_at.desc()).limit(100)
+        ).all()
+        return {'to_dict/100_distributions': measure(
+            lambda: [distribution.to_dict() for distribution in distributions], max(int(200 * scale), 5))}
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import sqlite3
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version,
+        'distributions': args.distributions,
+        'scale': 0.1 if args.quick else 1.0,
+    }
+
+
+def compare(results, baseline_path):
+    """Print current/baseline median ratios; above 1 means slower than the baseline."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and previous.get('median_ms'):
+            ratio = result['median_ms'] / previous['median_ms']
+            print(f"{name:40} {previous['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  x{ratio:.2f}",
+                  file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline micro-benchmark suite')
+    parser.add_argument('--distributions', type=int, default=100000,
+                        help='distributions to seed before the database benchmarks (up to 1M)')
+    parser.add_argument('--quick', action='store_true', help='a tenth of the iterations, for smoke runs')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='earlier results file to compare medians against')
+    args = parser.parse_args()
+    scale = 0.1 if args.quick else 1.0
+
+    client = app.test_client()
+    results = {}
+    results.update(bench_parse(scale))
+    results.update(bench_pdf(scale))
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed_database(db.engine, args.distributions)
+        seed_seconds = time.perf_counter() - start
+        results.update(bench_save(client, scale))
+        results.update(bench_analytics(client, scale))
+        results.update(bench_to_dict(scale))
+
+    report = {'environment': {**environment(args), 'seed_seconds': round(seed_seconds, 1)}, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare)
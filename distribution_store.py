@@ -0,0 +1,226 @@
+import json
+from sqlalchemy import insert
+from shares import allocate_shares
+from metrics import DB_ROWS_WRITTEN
+from models import Distribution, DistributionUser, DistributionItem, DistributionItemShare
+import rollups
+import balances
+import search
+
+_MISSING = object()
+
+
+def _split_item(item, assigned_ids):
+    """
+    Split a submitted item into its column values and leftover JSON.
+
+    Keys that the columns and share rows reproduce exactly are dropped from
+    the leftover JSON, so in the common case nothing but name and price is
+    stored.
+
+    Args:
+        item (dict): The submitted item
+        assigned_ids (list): Identifiers of the users holding a share, in user order
+
+    Returns:
+        tuple: (name, price, extra_json)
+    """
+    extra = {key: value for key, value in item.items() if key not in ('name', 'price', 'users')}
+    name = item.get('name', _MISSING)
+    if not isinstance(name, str):
+        if name is not _MISSING:
+            extra['name'] = name
+        name = None
+    price = item.get('price', _MISSING)
+    if isinstance(price, bool) or not isinstance(price, (int, float)):
+        if price is not _MISSING:
+            extra['price'] = price
+        price = None
+    elif isinstance(price, int):
+        # The price column reads back as a float; keep the submitted integer
+        extra['price'] = price
+    # to_dict rebuilds "users" from the share rows; keep the original only
+    # when that would not reproduce it (unknown ids, other order, non-strings)
+    if 'users' in item and (not assigned_ids or item['users'] != assigned_ids
+                            or not all(isinstance(i, str) for i in assigned_ids)):
+        extra['users'] = item['users']
+    return name, price, (json.dumps(extra) if extra else None)
+
+
+def normalize_distribution(data, shares=None):
+    """
+    Turn a save_distribution payload into normalized rows.
+
+    Args:
+        data (dict): The payload, with 'users', 'items' and 'total'
+        shares (list): (item_index, user_index, share) tuples to store as-is;
+                       by default they are allocated in whole cents
+
+    Returns:
+        dict: 'distribution_data' (JSON of the payload minus the items),
+              'users' as (name, identifier, amount) tuples, 'items' as
+              (position, name, price, extra_json) tuples and 'shares' as
+              (item_index, user_index, share) tuples
+
+    Raises:
+        ValueError: If the shares cannot be allocated
+    """
+    users = data['users']
+    if shares is None:
+        share_cents, user_cents = allocate_shares(users, data['items'])
+        shares = [(item_index, user_index, cents / 100) for item_index, user_index, cents in share_cents]
+        user_totals = [cents / 100 for cents in user_cents]
+    else:
+        user_totals = [0] * len(users)
+        for _, user_index, share in shares:
+            user_totals[user_index] += share
+
+    assigned_ids = [[] for _ in data['items']]
+    for item_index, user_index, _ in shares:
+        assigned_ids[item_index].append(users[user_index]['id'])
+    items = [(position, *_split_item(item, assigned_ids[position]))
+             for position, item in enumerate(data['items'])]
+
+    return {
+        'distribution_data': json.dumps({key: value for key, value in data.items() if key != 'items'}),
+        'users': [(user['name'], user['id'], total) for user, total in zip(users, user_totals)],
+        'items': items,
+        'shares': shares,
+    }
+
+
+def prepare_distribution(data):
+    """
+    Validate a save_distribution payload and turn it into rows for insert_distributions.
+
+    Returns:
+        dict: normalize_distribution's rows plus 'receipt_name', 'total_amount'
+              and 'paid_by' (the paying user's name, from the optional
+              paid_by user id, or None)
+
+    Raises:
+        ValueError: With a message suitable for the client
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Distribution must be a JSON object')
+    if not data.get('users'):
+        raise ValueError('No users found in distribution data')
+    if not data.get('items'):
+        raise ValueError('No items found in distribution data')
+    if 'total' not in data:
+        raise ValueError('No total amount found in distribution data')
+    if not isinstance(data['users'], list) or not isinstance(data['items'], list):
+        raise ValueError('users and items must be lists')
+    try:
+        total_amount = float(data['total'])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid total amount: {data['total']!r}")
+    for index, user in enumerate(data['users']):
+        if isinstance(user, dict) and not isinstance(user.get('name'), str):
+            raise ValueError(f"User {index}: name must be a string")
+
+    paid_by = None
+    if data.get('paid_by') is not None:
+        # Frontend user ids may be numbers or strings
+        paid_by = next((user['name'] for user in data['users']
+                        if isinstance(user, dict) and str(user.get('id')) == str(data['paid_by'])), None)
+        if paid_by is None:
+            raise ValueError(f"paid_by {data['paid_by']!r} is not one of the users")
+
+    rows = normalize_distribution(data)
+    rows['receipt_name'] = data.get('receipt_name', 'Walmart Receipt')
+    rows['total_amount'] = total_amount
+    rows['paid_by'] = paid_by
+    return rows
+
+
+def insert_distributions(executor, records):
+    """
+    Insert prepared distributions with their users, items and item shares.
+
+    Uses one core INSERT per table for the whole batch (executemany for
+    every table) rather than one ORM object per row.
+
+    Args:
+        executor: A session or connection; the caller owns the transaction
+        records: List of (distribution_id, created_at, rows) where rows
+                 come from prepare_distribution
+
+    Returns:
+        list: (distribution_pk, user_amounts) per record, in order, where
+              user_amounts are (user_name, amount) pairs for the rollups
+    """
+    distributions = Distribution.__table__
+    users = DistributionUser.__table__
+    items = DistributionItem.__table__
+    distribution_pks = executor.execute(
+        insert(distributions).returning(distributions.c.id, sort_by_parameter_order=True),
+        [{'distribution_id': distribution_id, 'created_at': created_at,
+          'receipt_name': rows['receipt_name'], 'total_amount': rows['total_amount'],
+          'distribution_data': rows['distribution_data'], 'paid_by': rows.get('paid_by')}
+         for distribution_id, created_at, rows in records]
+    ).scalars().all()
+    user_pks = iter(executor.execute(
+        insert(users).returning(users.c.id, sort_by_parameter_order=True),
+        [{'distribution_id': distribution_pk, 'user_name': name, 'user_identifier': identifier,
+          'amount': amount, 'items_json': ''}
+         for distribution_pk, (_, _, rows) in zip(distribution_pks, records)
+         for name, identifier, amount in rows['users']]
+    ).scalars().all())
+    item_pks = iter(executor.execute(
+        insert(items).returning(items.c.id, sort_by_parameter_order=True),
+        [{'distribution_id': distribution_pk, 'position': position, 'name': name,
+          'price': price, 'extra_json': extra_json}
+         for distribution_pk, (_, _, rows) in zip(distribution_pks, records)
+         for position, name, price, extra_json in rows['items']]
+    ).scalars().all())
+
+    share_rows = []
+    for _, _, rows in records:
+        record_user_pks = [next(user_pks) for _ in rows['users']]
+        record_item_pks = [next(item_pks) for _ in rows['items']]
+        share_rows += [
+            {'item_id': record_item_pks[item_index], 'distribution_user_id': record_user_pks[user_index],
+             'share': share}
+            for item_index, user_index, share in rows['shares']
+        ]
+    if share_rows:
+        executor.execute(insert(DistributionItemShare.__table__), share_rows)
+
+    DB_ROWS_WRITTEN.labels('distribution').inc(len(distribution_pks))
+    DB_ROWS_WRITTEN.labels('distribution_user').inc(sum(len(rows['users']) for _, _, rows in records))
+    DB_ROWS_WRITTEN.labels('distribution_item').inc(sum(len(rows['items']) for _, _, rows in records))
+    DB_ROWS_WRITTEN.labels('distribution_item_share').inc(len(share_rows))
+
+    return [
+        (distribution_pk, [(name, amount) for name, _, amount in rows['users']])
+        for distribution_pk, (_, _, rows) in zip(distribution_pks, records)
+    ]
+
+
+def save_distributions(executor, records):
+    """
+    Insert prepared distributions and bring everything derived from them up to date.
+
+    The one write path for new distributions: after insert_distributions it
+    folds their amounts into the analytics rollups and, for those with a
+    payer, the pair balances, and adds their items to the search index, so
+    none of them can fall out of step with the distribution tables.
+
+    Args:
+        executor: A session or connection; the caller owns the transaction
+        records: List of (distribution_id, created_at, rows) where rows
+                 come from prepare_distribution
+
+    Returns:
+        list: (distribution_pk, user_amounts) per record, as insert_distributions
+    """
+    saved = insert_distributions(executor, records)
+    rollups.apply_distributions(executor, [
+        (created_at, user_amounts) for (_, created_at, _), (_, user_amounts) in zip(records, saved)
+    ])
+    balances.apply_distributions(executor, [
+        (rows['paid_by'], user_amounts) for (_, _, rows), (_, user_amounts) in zip(records, saved)
+    ])
+    search.index_distributions(executor, [distribution_pk for distribution_pk, _ in saved])
+    return saved
@@ -0,0 +1,134 @@
+import io
+import os
+import csv
+import json
+import zlib
+from collections import defaultdict
+from sqlalchemy import select
+from models import Distribution, DistributionUser, DistributionItem, DistributionItemShare
+
+# Distributions read from the database cursor at a time; bounds the export's memory
+BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+# Encoded text buffered before a chunk is sent
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = ('ndjson', 'csv')
+ROW_TYPES = ('shares', 'items')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Fields taken from the distribution row, then from the item (and share) rows
+DISTRIBUTION_FIELDS = {
+    'shares': ['distribution_id', 'created_at', 'receipt_name'],
+    'items': ['distribution_id', 'created_at', 'receipt_name', 'total_amount'],
+}
+DETAIL_FIELDS = {
+    'shares': ['item_position', 'item_name', 'item_price', 'user_id', 'user_name', 'share'],
+    'items': ['item_position', 'item_name', 'item_price'],
+}
+
+
+def export_fields(row_type):
+    """Column names of an export, in order."""
+    return DISTRIBUTION_FIELDS[row_type] + DETAIL_FIELDS[row_type]
+
+
+def _distributions_query(since, until):
+    table = Distribution.__table__
+    query = select(table.c.id, table.c.distribution_id, table.c.created_at, table.c.receipt_name,
+                   table.c.total_amount)
+    if since is not None:
+        query = query.where(table.c.created_at >= since)
+    if until is not None:
+        query = query.where(table.c.created_at < until)
+    return query.order_by(table.c.created_at, table.c.id)
+
+
+def _details_query(row_type, distribution_pks):
+    """Item (or item share) rows of a batch of distributions, in receipt order."""
+    items = DistributionItem.__table__
+    columns = [items.c.distribution_id, items.c.position, items.c.name, items.c.price]
+    joined = items
+    order = [items.c.distribution_id, items.c.id]
+    if row_type == 'shares':
+        shares = DistributionItemShare.__table__
+        users = DistributionUser.__table__
+        columns += [users.c.user_identifier, users.c.user_name, shares.c.share]
+        joined = (items.join(shares, shares.c.item_id == items.c.id)
+                  .join(users, users.c.id == shares.c.distribution_user_id))
+        order.append(shares.c.id)
+    return (select(*columns).select_from(joined)
+            .where(items.c.distribution_id.in_(distribution_pks))
+            .order_by(*order))
+
+
+def _serialize(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def iter_rows(connection, row_type, since=None, until=None, batch_size=BATCH_SIZE):
+    """
+    Yield export rows as tuples of export_fields(row_type), oldest distribution first.
+
+    Distributions are read through a server-side cursor `batch_size` at a
+    time, and each batch's items (and shares) are fetched with one indexed
+    query, so memory is bounded by the batch rather than the history.
+    """
+    distribution_fields = DISTRIBUTION_FIELDS[row_type]
+    result = connection.execution_options(yield_per=batch_size).execute(_distributions_query(since, until))
+    for batch in result.partitions():
+        details = defaultdict(list)
+        for row in connection.execute(_details_query(row_type, [row.id for row in batch])):
+            details[row[0]].append(tuple(map(_serialize, row[1:])))
+        for distribution in batch:
+            head = tuple(_serialize(getattr(distribution, field)) for field in distribution_fields)
+            for detail in details.get(distribution.id, ()):
+                yield head + detail
+
+
+def iter_export(engine, row_type, export_format, since=None, until=None, compress=False,
+                batch_size=BATCH_SIZE):
+    """
+    Stream an export of the distribution history as NDJSON or CSV.
+
+    Args:
+        engine: The SQLAlchemy engine to read from
+        row_type (str): 'shares' for one row per user share of an item,
+                        'items' for one row per item
+        export_format (str): 'ndjson' or 'csv'
+        since (datetime): Optional inclusive lower bound on created_at
+        until (datetime): Optional exclusive upper bound on created_at
+        compress (bool): Emit a gzip stream instead of plain text
+
+    Yields:
+        bytes: Chunks of the encoded export
+    """
+    fields = export_fields(row_type)
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n') if export_format == 'csv' else None
+    if writer:
+        writer.writerow(fields)
+
+    def flush():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    # The connection is held until the generator is exhausted or closed
+    with engine.connect() as connection:
+        for row in iter_rows(connection, row_type, since, until, batch_size):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(fields, row))))
+                buffer.write('\n')
+            if buffer.tell() >= CHUNK_SIZE:
+                chunk = flush()
+                if chunk:
+                    yield chunk
+    chunk = flush()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from metrics import GEMINI_CALL_SECONDS, GEMINI_TOKENS
+
+# Model used for receipt parsing
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-pro")
+# Deadline for a single Gemini call, in seconds
+TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "20"))
+# Run the regex parser alongside Gemini and use it if Gemini misses the deadline
+HEDGED = os.environ.get("GEMINI_HEDGED", "").lower() in ("1", "true", "yes")
+# Consecutive failures before Gemini is skipped, and for how long
+BREAKER_FAILURES = int(os.environ.get("GEMINI_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.environ.get("GEMINI_BREAKER_RESET_SECONDS", "60"))
+# Concurrent Gemini calls per process
+MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+# Set to 0 to send the whole receipt text, noise lines included
+PREFILTER = os.environ.get("GEMINI_PREFILTER", "1") != "0"
+# Receipts with more lines than this (after the pre-filter) are split into
+# chunks parsed concurrently (0 disables chunking), and chunks share this
+# many lines with the next one so an item wrapped across the border is seen whole
+CHUNK_LINES = int(os.environ.get("GEMINI_CHUNK_LINES", "150"))
+CHUNK_OVERLAP = int(os.environ.get("GEMINI_CHUNK_OVERLAP", "1"))
+
+
+class CircuitOpenError(Exception):
+    """Raised when Gemini is skipped because the circuit breaker is open."""
+
+
+class GeminiTimeoutError(Exception):
+    """Raised when a Gemini call misses its deadline."""
+
+
+class CircuitBreaker:
+    """
+    Skips calls after repeated failures.
+
+    Closed: calls go through. After failure_threshold consecutive failures the
+    breaker opens and rejects calls for reset_timeout seconds; then it lets a
+    single trial call through (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+def estimate_tokens(text):
+    """Rough token count of a text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class GeminiClient:
+    """
+    Process-wide Gemini client with a per-call deadline and a circuit breaker.
+
+    The underlying model is built once, on first use, and calls run on a small
+    thread pool so the caller can stop waiting when the deadline passes.
+    """
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL, timeout=TIMEOUT_SECONDS, breaker=None,
+                 model=None, max_workers=MAX_CONCURRENCY):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._model = model
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gemini')
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _call(self, prompt):
+        start = time.perf_counter()
+        response = self.model.generate_content(prompt, request_options={'timeout': self.timeout})
+        seconds = time.perf_counter() - start
+        text = response.text
+        # Reported by the API; estimated if the response has no usage data
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt)
+        response_tokens = getattr(usage, 'candidates_token_count', None) or estimate_tokens(text)
+        GEMINI_CALL_SECONDS.observe(seconds)
+        GEMINI_TOKENS.labels('prompt').inc(prompt_tokens)
+        GEMINI_TOKENS.labels('response').inc(response_tokens)
+        logging.info("Gemini call: %d prompt tokens, %d response tokens, %.0f ms",
+                     prompt_tokens, response_tokens, seconds * 1000)
+        return text
+
+    def submit(self, prompt):
+        """
+        Start a Gemini call in the background.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        return self._executor.submit(self._call, prompt)
+
+    def result(self, future, timeout=None):
+        """
+        Wait for a call started with submit() and record its outcome.
+
+        Raises:
+            GeminiTimeoutError: If the call misses the deadline
+        """
+        try:
+            text = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.breaker.record_failure()
+            raise GeminiTimeoutError(f"Gemini call exceeded {self.timeout}s deadline")
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return text
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_gemini_client(api_key):
+    """Return the shared client for this API key, creating it on first use."""
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                logging.debug("Creating Gemini client for model %s", GEMINI_MODEL)
+                client = _clients[api_key] = GeminiClient(api_key)
+    return client
+
+
+def set_gemini_client(api_key, client):
+    """Install a client for this API key, e.g. one wrapping a stand-in model."""
+    with _clients_lock:
+        _clients[api_key] = client
@@ -0,0 +1,40 @@
+import os
+
+# Loaded automatically by gunicorn from the working directory; command-line
+# flags (e.g. --bind, --reload in the development workflow) still take precedence.
+
+# Worker processes; one, gunicorn's own default, unless WEB_CONCURRENCY says otherwise
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+# Set to 1 to import the app (and the parsing stack) once in the master so
+# forked workers share the warmed modules copy-on-write. Incompatible with --reload.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+
+def on_starting(server):
+    """With preload, also import the stacks that app.py loads lazily."""
+    if not preload_app:
+        return
+    for module in ('pypdf', 'google.generativeai'):
+        try:
+            __import__(module)
+        except ImportError as e:
+            server.log.warning("Could not preload %s: %s", module, e)
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master; SQLite handles must not cross a fork."""
+    if not preload_app:
+        return
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """
+    Start the parse job workers with the app, so jobs left queued by a restart
+    are picked up without waiting for an upload or a status poll.
+    """
+    from app import job_queue
+    job_queue.start()
@@ -0,0 +1,151 @@
+import os
+import json
+import random
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Log level and format of the root logger, e.g. LOG_LEVEL=DEBUG
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "%(levelname)s:%(name)s:%(message)s")
+# Fraction of requests whose payloads are dumped at DEBUG level
+DEBUG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("DEBUG_PAYLOAD_SAMPLE_RATE", "0.01"))
+# Characters of a sampled payload written to the log
+DEBUG_PAYLOAD_MAX_CHARS = int(os.environ.get("DEBUG_PAYLOAD_MAX_CHARS", "200"))
+# Set to 0 to stop sending stage timings to clients in the Server-Timing header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") != "0"
+# Set to 1 to also log every request's stage timings as one JSON line
+TIMING_LOG = os.environ.get("TIMING_LOG", "0") == "1"
+
+timing_logger = logging.getLogger('timing')
+
+_current_timer = ContextVar('request_timer', default=None)
+
+
+def configure_logging():
+    """Configure the root logger from LOG_LEVEL and LOG_FORMAT."""
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+
+
+def log_payload_sample(message, payload):
+    """
+    Log the start of a JSON payload at DEBUG level for a sample of calls.
+
+    The payload is only serialized when DEBUG is enabled and the call is
+    sampled, so unsampled calls cost one level check.
+    """
+    if not logging.getLogger().isEnabledFor(logging.DEBUG) or random.random() >= DEBUG_PAYLOAD_SAMPLE_RATE:
+        return
+    logging.debug("%s: %s", message, json.dumps(payload)[:DEBUG_PAYLOAD_MAX_CHARS])
+
+
+class Stage:
+    """One timed stage of a request; desc can be set while it runs."""
+
+    __slots__ = ('name', 'desc', 'duration_ms')
+
+    def __init__(self, name, desc=None):
+        self.name = name
+        self.desc = desc
+        self.duration_ms = None
+
+
+class RequestTimer:
+    """Stage timings of the request running in the current context."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self._open = []
+
+    def add(self, finished):
+        """Record a finished stage; repeats of a stage add up into one entry."""
+        for existing in self.stages:
+            if existing.name == finished.name:
+                existing.duration_ms += finished.duration_ms
+                existing.desc = existing.desc or finished.desc
+                return
+        self.stages.append(finished)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Format the stages and the total as a Server-Timing header value."""
+        entries = []
+        for stage in self.stages:
+            entry = f"{stage.name};dur={stage.duration_ms:.1f}"
+            if stage.desc:
+                entry += f';desc="{stage.desc}"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_ms(), 1),
+            'stages': [{'name': stage.name, 'desc': stage.desc, 'ms': round(stage.duration_ms, 1)}
+                       for stage in self.stages],
+        }
+
+
+def start_timer():
+    """Start timing a new request in the current context."""
+    timer = RequestTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    """Return the current request's timer, or None outside a timed request."""
+    return _current_timer.get()
+
+
+@contextmanager
+def stage(name, desc=None):
+    """
+    Time a block as one stage of the current request.
+
+    Outside a timed request (e.g. in background job threads) the block
+    runs untimed. Stages may nest; a stage entered twice is reported once
+    with the summed duration.
+
+    Yields:
+        Stage: Set its desc to label the path taken, e.g. 'regex'
+    """
+    timer = _current_timer.get()
+    current = Stage(name, desc)
+    if timer is None:
+        yield current
+        return
+    timer._open.append(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        timer._open.pop()
+        timer.add(current)
+
+
+def describe_stage(desc):
+    """Label the innermost running stage of the current request."""
+    timer = _current_timer.get()
+    if timer is not None and timer._open:
+        timer._open[-1].desc = desc
+
+
+def finish_request(request, response):
+    """Attach the current request's timings to the response and optionally log them."""
+    timer = _current_timer.get()
+    if timer is None:
+        return response
+    _current_timer.set(None)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = timer.server_timing()
+    if TIMING_LOG and timing_logger.isEnabledFor(logging.INFO):
+        timing_logger.info("%s", json.dumps({
+            'method': request.method, 'path': request.path, 'status': response.status_code, **timer.as_dict()
+        }))
+    return response
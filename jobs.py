@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, or_, and_
+from nanoid import generate
+from models import db, ParseJob
+
+# Background worker threads per process
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# How often idle workers look for jobs enqueued by other processes
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+# Running jobs older than this are assumed orphaned by a dead worker and retried
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "600"))
+# Finished jobs are deleted after this long
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+FINISHED_STATUSES = ('done', 'error')
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of PDF parse jobs with an in-process worker pool.
+
+    Jobs are claimed with a single conditional UPDATE, so several processes
+    (e.g. gunicorn workers) can share one table without double-processing.
+
+    Args:
+        app: The Flask app, for the database and an app context in workers
+        handler: Callable taking PDF bytes and returning the parsed receipt dict
+    """
+
+    def __init__(self, app, handler, workers=JOB_WORKERS):
+        self.app = app
+        self.handler = handler
+        self.workers = workers
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._finished = threading.Condition()
+
+    def _engine(self):
+        return db.engine
+
+    def start(self):
+        """Start the worker threads if they are not running in this process."""
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'parse-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, pdf_bytes):
+        """
+        Queue a PDF for parsing.
+
+        Returns:
+            str: The job id to poll
+        """
+        job_id = generate(size=10)
+        with self._engine().begin() as connection:
+            connection.execute(ParseJob.__table__.insert().values(
+                job_id=job_id, status='queued', payload=pdf_bytes, created_at=datetime.utcnow()
+            ))
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        table = ParseJob.__table__
+        with self._engine().connect() as connection:
+            row = connection.execute(
+                select(table.c.job_id, table.c.status, table.c.result_json, table.c.error,
+                       table.c.created_at, table.c.started_at, table.c.finished_at)
+                .where(table.c.job_id == job_id)
+            ).first()
+        if row is None:
+            return None
+        job = ParseJob(job_id=row.job_id, status=row.status, result_json=row.result_json, error=row.error,
+                       created_at=row.created_at, started_at=row.started_at, finished_at=row.finished_at)
+        return job.to_dict()
+
+    def wait(self, timeout):
+        """Block until any job finishes in this process, or the timeout passes."""
+        with self._finished:
+            self._finished.wait(timeout)
+
+    def _claim(self, connection):
+        table = ParseJob.__table__
+        now = datetime.utcnow()
+        claimable = or_(
+            table.c.status == 'queued',
+            and_(table.c.status == 'running', table.c.started_at < now - timedelta(seconds=JOB_STALE_SECONDS))
+        )
+        next_id = select(table.c.id).where(claimable).order_by(table.c.id).limit(1).scalar_subquery()
+        return connection.execute(
+            update(table)
+            .where(table.c.id == next_id, claimable)
+            .values(status='running', started_at=now)
+            .returning(table.c.id, table.c.payload)
+        ).first()
+
+    def _finish(self, job_pk, **values):
+        table = ParseJob.__table__
+        with self._engine().begin() as connection:
+            connection.execute(update(table).where(table.c.id == job_pk)
+                               .values(payload=None, finished_at=datetime.utcnow(), **values))
+            connection.execute(delete(table).where(
+                table.c.status.in_(FINISHED_STATUSES),
+                table.c.finished_at < datetime.utcnow() - timedelta(seconds=JOB_RETENTION_SECONDS)
+            ))
+        with self._finished:
+            self._finished.notify_all()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    with self._engine().begin() as connection:
+                        job = self._claim(connection)
+                except Exception as e:
+                    logging.error("Error claiming parse job: %s", e)
+                    job = None
+
+                if job is None:
+                    self._wakeup.wait(JOB_POLL_SECONDS)
+                    self._wakeup.clear()
+                    continue
+
+                try:
+                    result = self.handler(job.payload)
+                    self._finish(job.id, status='done', result_json=json.dumps(result))
+                except Exception as e:
+                    logging.error("Error processing parse job %d: %s", job.id, e)
+                    try:
+                        self._finish(job.id, status='error', error=str(e))
+                    except Exception as finish_error:
+                        logging.error("Error recording parse job failure: %s", finish_error)
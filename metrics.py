@@ -0,0 +1,436 @@
+import os
+import glob
+import json
+import math
+import time
+import uuid
+import atexit
+import bisect
+import fcntl
+import logging
+import tempfile
+import threading
+
+# Directory shared by all worker processes (e.g. gunicorn workers) of one
+# deployment; each process snapshots its values there and /metrics merges them.
+# Unset, every process only reports its own values.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+# How often a process writes its snapshot to MULTIPROC_DIR
+FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+
+# Totals of exited processes, merged out of their snapshots
+ARCHIVE_FILE = 'archive.json'
+# Held shared while merging snapshots for /metrics, exclusively while archiving
+ARCHIVE_LOCK_FILE = 'archive.lock'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Metric:
+    """Base class: a named family of samples keyed by label values."""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = registry._lock
+        registry.register(self)
+
+    def labels(self, *labelvalues):
+        """Return the child for these label values, creating it on first use."""
+        key = tuple(str(value) for value in labelvalues)
+        child = self._values.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._values.setdefault(key, self._new_child())
+        return child
+
+    def snapshot(self):
+        with self._lock:
+            return {key: child.snapshot() for key, child in self._values.items()}
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Counter(_Metric):
+    """Monotonic count; merged across processes by summing."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down; merged across processes by summing, so
+    use it for quantities that add up over workers (e.g. rows written).
+    """
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild(self._lock)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, lock, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        return {'counts': list(self.counts), 'sum': self.sum}
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets; merged by summing."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(registry, name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self._lock, self.upper_bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def _merge(kind, total, value):
+    if total is None:
+        return value
+    if kind == 'histogram':
+        return {'counts': [a + b for a, b in zip(total['counts'], value['counts'])],
+                'sum': total['sum'] + value['sum']}
+    return total + value
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    """
+    In-process metrics registry with optional multiprocess aggregation.
+
+    Recording a sample takes a dict lookup and a lock, a few hundred
+    nanoseconds. With a multiprocess directory, a daemon thread in each
+    process writes a JSON snapshot of its samples every flush_seconds, and
+    once more at exit, and render() merges the snapshots of every process
+    with its own live values. Snapshots are named by a per-process id rather
+    than the pid alone, so a recycled pid never overwrites an exited
+    process's totals. Each process holds an flock on its own lock file while
+    it lives; the flush threads fold the snapshots of exited processes into
+    one archive and delete them, so counters never go backwards and the
+    files do not pile up as workers are replaced.
+    """
+
+    def __init__(self, multiproc_dir=MULTIPROC_DIR, flush_seconds=FLUSH_SECONDS):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.multiproc_dir = multiproc_dir
+        self.flush_seconds = flush_seconds
+        self._flusher_pid = None
+        self._process_pid = None
+        self._process_id = None
+        self._process_lock_fd = None
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(self, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return Gauge(self, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, documentation, labelnames, buckets)
+
+    def snapshot(self):
+        """Return {metric name: {label values: value}} for this process."""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def _path(self, name):
+        return os.path.join(self.multiproc_dir, name)
+
+    def process_id(self):
+        """
+        Return this process's snapshot id, creating it (and taking its lock)
+        on first use in each process, so also after a fork.
+        """
+        if self._process_pid != os.getpid():
+            if self._process_lock_fd is not None:
+                os.close(self._process_lock_fd)  # The parent's lock, inherited by the fork
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            process_id = f'{os.getpid()}_{uuid.uuid4().hex[:12]}'
+            # Archiving must not find the lock file before it is locked
+            with open(self._path(ARCHIVE_LOCK_FILE), 'a') as archive_lock:
+                fcntl.flock(archive_lock, fcntl.LOCK_SH)
+                self._process_lock_fd = os.open(self._path(f'metrics_{process_id}.lock'),
+                                                os.O_CREAT | os.O_RDWR, 0o644)
+                fcntl.flock(self._process_lock_fd, fcntl.LOCK_EX)
+            self._process_id = process_id
+            self._process_pid = os.getpid()
+        return self._process_id
+
+    def _write_json(self, name, data):
+        fd, temporary = tempfile.mkstemp(dir=self.multiproc_dir, prefix='.metrics_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, self._path(name))
+
+    def _read_samples(self, path):
+        """Return {metric name: {label values: value}} from a snapshot, or None if unreadable."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning("Skipping unreadable metrics snapshot %s: %s", path, e)
+            return None
+        return {name: {tuple(key): value for key, value in samples} for name, samples in data.items()}
+
+    def _merge_into(self, merged, source):
+        for name, samples in source.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            target = merged.setdefault(name, {})
+            for key, value in samples.items():
+                target[key] = _merge(metric.kind, target.get(key), value)
+
+    def flush(self):
+        """Write this process's snapshot to the multiprocess directory."""
+        if not self.multiproc_dir:
+            return
+        data = {name: [[list(key), value] for key, value in samples.items()]
+                for name, samples in self.snapshot().items()}
+        self._write_json(f'metrics_{self.process_id()}.json', data)
+
+    def _final_flush(self):
+        if self._flusher_pid == os.getpid():
+            try:
+                self.flush()
+            except OSError as e:
+                logging.warning("Metrics flush at exit failed: %s", e)
+
+    def archive_exited(self):
+        """
+        Fold the snapshots of exited processes into the archive and delete them.
+
+        A process has exited when its lock file can be locked. The archive
+        records the ids it has absorbed until their snapshots are gone, so a
+        crash between writing it and deleting them never counts one twice.
+
+        Returns:
+            int: Number of snapshots archived
+        """
+        if not self.multiproc_dir:
+            return 0
+        own = self.process_id() if self._process_pid == os.getpid() else None
+        with open(self._path(ARCHIVE_LOCK_FILE), 'a') as archive_lock:
+            fcntl.flock(archive_lock, fcntl.LOCK_EX)
+            exited = []
+            paths = glob.glob(self._path('metrics_*.json')) + glob.glob(self._path('metrics_*.lock'))
+            process_ids = {os.path.basename(path)[len('metrics_'):].rsplit('.', 1)[0] for path in paths}
+            for process_id in sorted(process_ids - {own}):
+                try:
+                    fd = os.open(self._path(f'metrics_{process_id}.lock'), os.O_RDWR)
+                except FileNotFoundError:
+                    exited.append(process_id)
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Still running
+                finally:
+                    os.close(fd)
+                exited.append(process_id)
+            if not exited:
+                return 0
+
+            archive_path = self._path(ARCHIVE_FILE)
+            archive = {'absorbed': [], 'samples': {}}
+            if os.path.exists(archive_path):
+                with open(archive_path) as f:
+                    archive = json.load(f)
+            absorbed = {process_id for process_id in archive['absorbed']
+                        if os.path.exists(self._path(f'metrics_{process_id}.json'))}
+            merged = {name: {tuple(key): value for key, value in samples}
+                      for name, samples in archive['samples'].items()}
+            for process_id in exited:
+                if process_id in absorbed:
+                    continue
+                path = self._path(f'metrics_{process_id}.json')
+                samples = self._read_samples(path) if os.path.exists(path) else None
+                if samples is not None:
+                    self._merge_into(merged, samples)
+                absorbed.add(process_id)
+            self._write_json(ARCHIVE_FILE, {
+                'absorbed': sorted(absorbed),
+                'samples': {name: [[list(key), value] for key, value in samples.items()]
+                            for name, samples in merged.items()},
+            })
+            for process_id in exited:
+                for suffix in ('.json', '.lock'):
+                    try:
+                        os.remove(self._path(f'metrics_{process_id}{suffix}'))
+                    except FileNotFoundError:
+                        pass
+        return len(exited)
+
+    def start_flusher(self):
+        """Start the snapshot thread in this process, once per process (so also after a fork)."""
+        if not self.multiproc_dir or self._flusher_pid == os.getpid():
+            return
+        if self._flusher_pid is None:
+            # Inherited by forks; only flushes in a process whose thread started
+            atexit.register(self._final_flush)
+        self._flusher_pid = os.getpid()
+        self.process_id()
+
+        def run():
+            while True:
+                time.sleep(self.flush_seconds)
+                try:
+                    self.flush()
+                    self.archive_exited()
+                except (OSError, ValueError) as e:
+                    logging.warning("Metrics flush failed: %s", e)
+
+        threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+    def collect(self):
+        """Merge the samples of every process, this one's live."""
+        merged = {name: {} for name in self._metrics}
+        self._merge_into(merged, self.snapshot())
+        if not self.multiproc_dir or not os.path.isdir(self.multiproc_dir):
+            return merged
+        own = self._path(f'metrics_{self._process_id}.json') if self._process_pid == os.getpid() else None
+        # Shared with other readers; keeps archiving from moving a snapshot
+        # into the archive between reading one and the other
+        with open(self._path(ARCHIVE_LOCK_FILE), 'a') as archive_lock:
+            fcntl.flock(archive_lock, fcntl.LOCK_SH)
+            archive_path = self._path(ARCHIVE_FILE)
+            if os.path.exists(archive_path):
+                try:
+                    with open(archive_path) as f:
+                        archive = json.load(f)
+                    absorbed = set(archive['absorbed'])
+                    self._merge_into(merged, {name: {tuple(key): value for key, value in samples}
+                                              for name, samples in archive['samples'].items()})
+                except (OSError, ValueError, KeyError) as e:
+                    logging.warning("Skipping unreadable metrics archive %s: %s", archive_path, e)
+                    absorbed = set()
+            else:
+                absorbed = set()
+            for path in glob.glob(self._path('metrics_*.json')):
+                if path == own or os.path.basename(path)[len('metrics_'):-len('.json')] in absorbed:
+                    continue
+                samples = self._read_samples(path)
+                if samples is not None:
+                    self._merge_into(merged, samples)
+        return merged
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self._metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(samples.items()):
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(metric.labelnames, key)} {_format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip((*metric.upper_bounds, math.inf), value['counts']):
+                    cumulative += count
+                    labels = _format_labels(metric.labelnames, key, [('le', _format_number(bound))])
+                    lines.append(f'{name}_bucket{labels} {cumulative}')
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f'{name}_sum{labels} {_format_number(value["sum"])}')
+                lines.append(f'{name}_count{labels} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, by route', ['method', 'route', 'status'])
+PARSER_BRANCHES = registry.counter(
+    'receipt_parser_branch_total', 'Receipt parses by the branch of parse_walmart_receipt taken', ['branch'])
+RECEIPT_FORMATS = registry.counter(
+    'receipt_format_total', 'Parsed receipts by detected retailer format', ['format'])
+GEMINI_CALL_SECONDS = registry.histogram(
+    'gemini_call_duration_seconds', 'Latency of each Gemini call that returned',
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0))
+GEMINI_TOKENS = registry.counter(
+    'gemini_tokens_total', 'Tokens sent to and received from Gemini', ['kind'])
+PDF_PAGES = registry.histogram(
+    'pdf_page_count', 'Pages per extracted PDF', buckets=(1, 2, 3, 4, 6, 8, 12, 20, 50))
+RECEIPT_ITEMS = registry.histogram(
+    'receipt_item_count', 'Items per parsed receipt', buckets=(0, 1, 5, 10, 20, 40, 80, 150, 300))
+DB_ROWS_WRITTEN = registry.gauge(
+    'db_rows_written', 'Rows inserted for saved distributions, by table', ['table'])
@@ -0,0 +1,594 @@
+import os
+import json
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, Text, UniqueConstraint, bindparam, \
+    func, insert, inspect, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+# How long a booting process waits for another one to finish migrating, in seconds
+LOCK_TIMEOUT = float(os.environ.get("MIGRATION_LOCK_TIMEOUT", "600"))
+# Seconds of data backfill a process runs at startup before it serves
+# requests; the rest resumes on the next start or with `flask backfill`.
+# Kept well under gunicorn's 30 second worker timeout
+BOOT_BACKFILL_SECONDS = float(os.environ.get("MIGRATION_BOOT_SECONDS", "10"))
+# Distributions converted per backfill transaction
+BACKFILL_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "1000"))
+
+# Migrations must keep doing what they did when they were written, so they
+# use these frozen table definitions and the frozen helpers below rather
+# than models.py and the application modules
+_metadata = MetaData()
+_distribution = Table(
+    'distribution', _metadata,
+    Column('id', Integer, primary_key=True), Column('created_at', DateTime), Column('distribution_data', Text)
+)
+_distribution_user = Table(
+    'distribution_user', _metadata,
+    Column('id', Integer, primary_key=True), Column('distribution_id', Integer),
+    Column('user_name', String), Column('amount', Float), Column('items_json', Text)
+)
+_distribution_item = Table(
+    'distribution_item', _metadata,
+    Column('id', Integer, primary_key=True), Column('distribution_id', Integer), Column('position', Integer),
+    Column('name', String), Column('price', Float), Column('extra_json', Text)
+)
+_distribution_item_share = Table(
+    'distribution_item_share', _metadata,
+    Column('id', Integer, primary_key=True), Column('item_id', Integer),
+    Column('distribution_user_id', Integer), Column('share', Float)
+)
+_spending_rollup = Table(
+    'spending_rollup', _metadata,
+    Column('id', Integer, primary_key=True), Column('period_type', String), Column('period', String),
+    Column('user_name', String), Column('amount', Float), Column('distribution_count', Integer),
+    UniqueConstraint('period_type', 'period', 'user_name')
+)
+
+_MISSING = object()
+
+
+def _create_core_tables(connection):
+    """Create the distribution and distribution_user tables if missing."""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS distribution ("
+        "id INTEGER NOT NULL, "
+        "distribution_id VARCHAR(10) NOT NULL, "
+        "created_at DATETIME, "
+        "receipt_name VARCHAR(255), "
+        "total_amount FLOAT NOT NULL, "
+        "distribution_data TEXT NOT NULL, "
+        "PRIMARY KEY (id), "
+        "UNIQUE (distribution_id))"
+    ))
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS distribution_user ("
+        "id INTEGER NOT NULL, "
+        "distribution_id INTEGER NOT NULL, "
+        "user_name VARCHAR(255) NOT NULL, "
+        "user_identifier VARCHAR(50) NOT NULL, "
+        "amount FLOAT NOT NULL, "
+        "items_json TEXT NOT NULL, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY(distribution_id) REFERENCES distribution (id))"
+    ))
+
+
+def _create_parse_cache(connection):
+    """Create the persistent parse cache table."""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS parse_cache ("
+        "cache_key VARCHAR(80) NOT NULL, "
+        "result_json TEXT NOT NULL, "
+        "created_at DATETIME NOT NULL, "
+        "PRIMARY KEY (cache_key))"
+    ))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_parse_cache_created_at ON parse_cache (created_at)"))
+
+
+def _create_parse_jobs(connection):
+    """Create the asynchronous parse job table."""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS parse_job ("
+        "id INTEGER NOT NULL, "
+        "job_id VARCHAR(10) NOT NULL, "
+        "status VARCHAR(16) NOT NULL, "
+        "payload BLOB, "
+        "result_json TEXT, "
+        "error TEXT, "
+        "created_at DATETIME NOT NULL, "
+        "started_at DATETIME, "
+        "finished_at DATETIME, "
+        "PRIMARY KEY (id), "
+        "UNIQUE (job_id))"
+    ))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_parse_job_status ON parse_job (status)"))
+
+
+def _create_spending_rollups(connection):
+    """Create the analytics rollup table; existing distributions are backfilled."""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS spending_rollup ("
+        "id INTEGER NOT NULL, "
+        "period_type VARCHAR(5) NOT NULL, "
+        "period VARCHAR(10) NOT NULL, "
+        "user_name VARCHAR(255) NOT NULL, "
+        "amount FLOAT NOT NULL, "
+        "distribution_count INTEGER NOT NULL, "
+        "PRIMARY KEY (id), "
+        "CONSTRAINT uq_spending_rollup_period_user UNIQUE (period_type, period, user_name))"
+    ))
+
+
+def _rollup_period_keys(created_at):
+    """
+    The (period_type, period) buckets of a timestamp for migration 4's backfill.
+
+    Day rows only: backfills run after every migration, so week and month
+    rows written here would outlive migration 9, which drops them.
+    """
+    return (('day', created_at.strftime('%Y-%m-%d')),)
+
+
+def _backfill_spending_rollups(connection, first_pk, last_pk):
+    """Add the distributions with ids first_pk..last_pk to the rollups."""
+    totals = defaultdict(lambda: [0.0, set()])
+    for distribution_pk, created_at, user_name, amount in connection.execute(
+        select(_distribution.c.id, _distribution.c.created_at, _distribution_user.c.user_name,
+               _distribution_user.c.amount)
+        .join(_distribution_user, _distribution_user.c.distribution_id == _distribution.c.id)
+        .where(_distribution.c.id.between(first_pk, last_pk))
+    ):
+        for period_type, period in _rollup_period_keys(created_at):
+            bucket = totals[(period_type, period, user_name)]
+            bucket[0] += amount
+            bucket[1].add(distribution_pk)
+    if not totals:
+        return
+    statement = sqlite_insert(_spending_rollup)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=['period_type', 'period', 'user_name'],
+            set_={
+                'amount': _spending_rollup.c.amount + statement.excluded.amount,
+                'distribution_count': _spending_rollup.c.distribution_count + statement.excluded.distribution_count,
+            }
+        ),
+        [{'period_type': period_type, 'period': period, 'user_name': user_name,
+          'amount': amount, 'distribution_count': len(distribution_pks)}
+         for (period_type, period, user_name), (amount, distribution_pks) in totals.items()]
+    )
+
+
+def _legacy_shares(data):
+    """Item shares as save_distribution computed them before cent allocation."""
+    shares = []
+    for user_index, user in enumerate(data['users']):
+        for item_index, item in enumerate(data['items']):
+            if user['id'] in item.get('users', []):
+                shares.append((item_index, user_index, item['price'] / len(item['users'])))
+    shares.sort(key=lambda share: share[:2])
+    return shares
+
+
+def _legacy_item_columns(item, assigned_ids):
+    """
+    An item's (name, price, extra_json) for migration 5.
+
+    Deliberately a frozen copy of distribution_store._split_item rather than
+    a call to it: the migration must keep writing these rows even if the
+    store's layout changes later.
+    """
+    extra = {key: value for key, value in item.items() if key not in ('name', 'price', 'users')}
+    name = item.get('name', _MISSING)
+    if not isinstance(name, str):
+        if name is not _MISSING:
+            extra['name'] = name
+        name = None
+    price = item.get('price', _MISSING)
+    if isinstance(price, bool) or not isinstance(price, (int, float)):
+        if price is not _MISSING:
+            extra['price'] = price
+        price = None
+    elif isinstance(price, int):
+        extra['price'] = price
+    if 'users' in item and (not assigned_ids or item['users'] != assigned_ids
+                            or not all(isinstance(i, str) for i in assigned_ids)):
+        extra['users'] = item['users']
+    return name, price, (json.dumps(extra) if extra else None)
+
+
+def _legacy_rows(data):
+    """
+    The normalized rows of a legacy payload, as migration 5 first wrote them.
+
+    Returns:
+        dict: 'distribution_data', 'users' as (name, identifier) tuples,
+              'items' as (position, name, price, extra_json) tuples and
+              'shares' as (item_index, user_index, share) tuples
+    """
+    users = data['users']
+    shares = _legacy_shares(data)
+    assigned_ids = [[] for _ in data['items']]
+    for item_index, user_index, _ in shares:
+        assigned_ids[item_index].append(users[user_index]['id'])
+    return {
+        'distribution_data': json.dumps({key: value for key, value in data.items() if key != 'items'}),
+        'users': [(user['name'], user['id']) for user in users],
+        'items': [(position, *_legacy_item_columns(item, assigned_ids[position]))
+                  for position, item in enumerate(data['items'])],
+        'shares': shares,
+    }
+
+
+def _create_item_tables(connection):
+    """Create the item and item share tables; existing items are moved out of the JSON blobs by a backfill."""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS distribution_item ("
+        "id INTEGER NOT NULL, "
+        "distribution_id INTEGER NOT NULL, "
+        "position INTEGER NOT NULL, "
+        "name VARCHAR(255), "
+        "price FLOAT, "
+        "extra_json TEXT, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY(distribution_id) REFERENCES distribution (id))"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_distribution_item_distribution_id ON distribution_item (distribution_id)"
+    ))
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS distribution_item_share ("
+        "id INTEGER NOT NULL, "
+        "item_id INTEGER NOT NULL, "
+        "distribution_user_id INTEGER NOT NULL, "
+        "share FLOAT NOT NULL, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY(item_id) REFERENCES distribution_item (id), "
+        "FOREIGN KEY(distribution_user_id) REFERENCES distribution_user (id))"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_distribution_item_share_item_id ON distribution_item_share (item_id)"
+    ))
+
+
+def _backfill_normalized_items(connection, first_pk, last_pk):
+    """
+    Move the items and shares of distributions first_pk..last_pk out of the JSON blobs.
+
+    Shares are recomputed from the stored payload exactly as save_distribution
+    computed them at the time, then distribution_data loses its items and
+    items_json is cleared. Rows already converted are skipped.
+    """
+    distributions, users = _distribution, _distribution_user
+    user_pks = defaultdict(list)
+    for user_pk, distribution_pk in connection.execute(
+        select(users.c.id, users.c.distribution_id)
+        .where(users.c.distribution_id.between(first_pk, last_pk))
+        .order_by(users.c.id)
+    ):
+        user_pks[distribution_pk].append(user_pk)
+
+    converted_rows = []
+    for distribution_pk, distribution_data in connection.execute(
+        select(distributions.c.id, distributions.c.distribution_data)
+        .where(distributions.c.id.between(first_pk, last_pk))
+        .order_by(distributions.c.id)
+    ):
+        data = json.loads(distribution_data)
+        if 'items' not in data:
+            continue  # Already normalized
+        try:
+            rows = _legacy_rows(data)
+            if len(rows['users']) != len(user_pks[distribution_pk]):
+                raise ValueError('user rows do not match the payload')
+        except Exception as e:
+            # to_dict still serves rows left in the legacy layout
+            logging.warning("Distribution %d kept in the legacy layout: %s", distribution_pk, e)
+            continue
+        converted_rows.append((distribution_pk, rows))
+    if not converted_rows:
+        return
+
+    item_rows = [
+        {'distribution_id': distribution_pk, 'position': position, 'name': name,
+         'price': price, 'extra_json': extra_json}
+        for distribution_pk, rows in converted_rows
+        for position, name, price, extra_json in rows['items']
+    ]
+    item_pks = iter(connection.execute(
+        insert(_distribution_item).returning(_distribution_item.c.id, sort_by_parameter_order=True), item_rows
+    ).scalars().all()) if item_rows else iter(())
+    share_rows = []
+    for distribution_pk, rows in converted_rows:
+        distribution_item_pks = [next(item_pks) for _ in rows['items']]
+        share_rows += [
+            {'item_id': distribution_item_pks[item_index],
+             'distribution_user_id': user_pks[distribution_pk][user_index], 'share': share}
+            for item_index, user_index, share in rows['shares']
+        ]
+    if share_rows:
+        connection.execute(insert(_distribution_item_share), share_rows)
+
+    connection.execute(
+        update(distributions).where(distributions.c.id == bindparam('pk'))
+        .values(distribution_data=bindparam('data')),
+        [{'pk': distribution_pk, 'data': rows['distribution_data']} for distribution_pk, rows in converted_rows]
+    )
+    connection.execute(
+        update(users).where(users.c.id == bindparam('pk')).values(items_json=''),
+        [{'pk': user_pk} for distribution_pk, _ in converted_rows for user_pk in user_pks[distribution_pk]]
+    )
+
+
+def _add_query_indexes(connection):
+    """Index distribution.created_at and distribution_user.distribution_id."""
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_distribution_created_at ON distribution (created_at)"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_distribution_user_distribution_id ON distribution_user (distribution_id)"
+    ))
+
+
+def _add_balances(connection):
+    """
+    Record who paid each distribution and create the balance and settlement tables.
+
+    No existing distribution has a payer, so the balances start empty.
+    """
+    if 'paid_by' not in {column['name'] for column in inspect(connection).get_columns('distribution')}:
+        connection.execute(text("ALTER TABLE distribution ADD COLUMN paid_by VARCHAR(255)"))
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS balance ("
+        "id INTEGER NOT NULL, "
+        "user_a VARCHAR(255) NOT NULL, "
+        "user_b VARCHAR(255) NOT NULL, "
+        "amount_cents INTEGER NOT NULL, "
+        "PRIMARY KEY (id), "
+        "CONSTRAINT uq_balance_pair UNIQUE (user_a, user_b))"
+    ))
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS settlement ("
+        "id INTEGER NOT NULL, "
+        "from_user VARCHAR(255) NOT NULL, "
+        "to_user VARCHAR(255) NOT NULL, "
+        "amount_cents INTEGER NOT NULL, "
+        "created_at DATETIME NOT NULL, "
+        "PRIMARY KEY (id))"
+    ))
+
+
+def _create_item_search(connection):
+    """Create the full-text index over item names; existing items are indexed by a backfill."""
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5("
+        "name, period, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+
+
+def _backfill_item_search(connection, first_pk, last_pk):
+    """Index the items of distributions first_pk..last_pk."""
+    connection.execute(
+        text("INSERT INTO item_search (rowid, name, period) "
+             "SELECT distribution_item.id, distribution_item.name, "
+             "'y' || strftime('%Y', distribution.created_at) || ' m' || strftime('%Y%m', distribution.created_at) "
+             "FROM distribution_item JOIN distribution ON distribution.id = distribution_item.distribution_id "
+             "WHERE distribution_item.distribution_id BETWEEN :first_pk AND :last_pk"),
+        {'first_pk': first_pk, 'last_pk': last_pk}
+    )
+
+
+def _drop_week_month_rollups(connection):
+    """Delete the week and month rollups; /analytics sums its weeks and months from day rows."""
+    # An index range of the period_type, period, user_name unique index
+    connection.execute(text("DELETE FROM spending_rollup WHERE period_type IN ('week', 'month')"))
+
+
+# Ordered list of (version, name, function). Each function receives an open
+# connection inside a transaction and must be safe to run against a database
+# created before the migration table existed. Functions change the schema
+# only; converting existing rows belongs in BACKFILLS.
+MIGRATIONS = [
+    (1, 'create_distribution_tables', _create_core_tables),
+    (2, 'create_parse_cache', _create_parse_cache),
+    (3, 'create_parse_jobs', _create_parse_jobs),
+    (4, 'create_spending_rollups', _create_spending_rollups),
+    (5, 'normalize_distribution_items', _create_item_tables),
+    (6, 'add_query_indexes', _add_query_indexes),
+    (7, 'add_balances', _add_balances),
+    (8, 'create_item_search', _create_item_search),
+    (9, 'drop_week_month_rollups', _drop_week_month_rollups),
+]
+
+# Data conversions of a migration, by version: function(connection, first_pk,
+# last_pk) converting the distributions with ids in that range. A backfill
+# covers the distributions that existed when its migration was applied
+# (newer ones are written in the new layout) and runs in batches of
+# BACKFILL_BATCH_SIZE, each committed together with its progress, so it can
+# stop and resume anywhere. Backfills run in version order.
+BACKFILLS = {
+    4: _backfill_spending_rollups,
+    5: _backfill_normalized_items,
+    8: _backfill_item_search,
+}
+
+
+def _ensure_version_table(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+    # Progress of each backfill: distributions up to last_pk are converted,
+    # and the backfill stops at end_pk
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_backfills ("
+        "version INTEGER PRIMARY KEY, "
+        "last_pk INTEGER NOT NULL, "
+        "end_pk INTEGER NOT NULL, "
+        "finished_at DATETIME)"
+    ))
+
+
+def current_version(connection):
+    """Return the highest applied migration version, or 0 for a fresh database."""
+    _ensure_version_table(connection)
+    version = connection.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def pending_backfills(connection):
+    """Return the versions of the backfills that have not finished, in order."""
+    _ensure_version_table(connection)
+    return connection.execute(
+        text("SELECT version FROM schema_backfills WHERE finished_at IS NULL ORDER BY version")
+    ).scalars().all()
+
+
+def _begin_immediate(connection):
+    """
+    Start a transaction holding SQLite's write lock.
+
+    Waits for another process that is migrating the same database, well past
+    the driver's busy timeout, instead of failing with "database is locked".
+    """
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            return
+        except OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _locked(engine, work):
+    """
+    Run work(connection) in one BEGIN IMMEDIATE transaction and return its result.
+
+    The driver must not issue its own BEGIN, or DDL would run outside the
+    transaction; with AUTOCOMMIT every statement runs in ours.
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        _begin_immediate(connection)
+        try:
+            result = work(connection)
+            connection.exec_driver_sql("COMMIT")
+        except Exception:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+    return result
+
+
+def run_migrations(engine):
+    """
+    Bring the database schema up to date.
+
+    Runs once per process at startup. Reading the version and applying every
+    pending migration happen in one BEGIN IMMEDIATE transaction, so workers
+    booting at the same time apply each migration exactly once: the others
+    wait for the write lock, re-read the version and find nothing to do.
+    Migrations with a backfill only schedule it; see run_backfills.
+
+    Args:
+        engine: The SQLAlchemy engine to migrate
+
+    Returns:
+        int: The schema version after migrating
+    """
+    latest = MIGRATIONS[-1][0]
+    # Skip the write lock in the common case of an up-to-date database
+    with engine.begin() as connection:
+        version = current_version(connection)
+    if version >= latest:
+        return version
+
+    def migrate_all(connection):
+        version = current_version(connection)
+        for migration_version, name, migrate in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            logging.info("Applying migration %d: %s", migration_version, name)
+            migrate(connection)
+            if migration_version in BACKFILLS:
+                end_pk = connection.execute(select(func.max(_distribution.c.id))).scalar() or 0
+                connection.execute(
+                    text("INSERT INTO schema_backfills (version, last_pk, end_pk, finished_at) "
+                         "VALUES (:version, 0, :end_pk, :finished_at)"),
+                    {'version': migration_version, 'end_pk': end_pk,
+                     'finished_at': None if end_pk else datetime.utcnow()}
+                )
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) "
+                     "VALUES (:version, :name, :applied_at)"),
+                {'version': migration_version, 'name': name, 'applied_at': datetime.utcnow()}
+            )
+            version = migration_version
+        return version
+
+    return _locked(engine, migrate_all)
+
+
+def _backfill_batch(connection, batch_size):
+    """
+    Convert the next batch of the first unfinished backfill.
+
+    Returns:
+        bool: False once no backfill is left
+    """
+    row = connection.execute(text(
+        "SELECT version, last_pk, end_pk FROM schema_backfills WHERE finished_at IS NULL ORDER BY version LIMIT 1"
+    )).first()
+    if row is None:
+        return False
+    version, last_pk, end_pk = row
+    pks = connection.execute(
+        select(_distribution.c.id)
+        .where(_distribution.c.id > last_pk, _distribution.c.id <= end_pk)
+        .order_by(_distribution.c.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if pks:
+        BACKFILLS[version](connection, pks[0], pks[-1])
+        last_pk = pks[-1]
+    finished = len(pks) < batch_size or last_pk >= end_pk
+    connection.execute(
+        text("UPDATE schema_backfills SET last_pk = :last_pk, finished_at = :finished_at WHERE version = :version"),
+        {'version': version, 'last_pk': last_pk, 'finished_at': datetime.utcnow() if finished else None}
+    )
+    if finished:
+        logging.info("Finished backfill of migration %d", version)
+    return True
+
+
+def run_backfills(engine, seconds=None, batch_size=None):
+    """
+    Convert existing rows for the migrations that need it, batch by batch.
+
+    Each batch runs in its own BEGIN IMMEDIATE transaction with its progress,
+    so processes running backfills at the same time share the work, and an
+    interrupted backfill resumes after its last committed batch.
+
+    Args:
+        engine: The SQLAlchemy engine of a migrated database
+        seconds (float): Start no new batch after this long (at least one
+                         runs); None runs every backfill to completion
+        batch_size (int): Distributions per batch, default BACKFILL_BATCH_SIZE
+
+    Returns:
+        int: Number of backfills still pending
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    deadline = None if seconds is None else time.monotonic() + seconds
+    while _locked(engine, lambda connection: _backfill_batch(connection, batch_size)):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    else:
+        return 0
+    with engine.begin() as connection:
+        return len(pending_backfills(connection))
@@ -16,28 +16,66 @@ class Distribution(db.Model):
     """
     id = db.Column(db.Integer, primary_key=True)
     distribution_id = db.Column(db.String(10), unique=True, nullable=False)  # nanoid
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # newest-first listing and date ranges
     receipt_name = db.Column(db.String(255), nullable=True)
     total_amount = db.Column(db.Float, nullable=False)
-    distribution_data = db.Column(db.Text, nullable=False)  # JSON string of the full distribution data
+    distribution_data = db.Column(db.Text, nullable=False)  # JSON string of the distribution data, minus the items
+    paid_by = db.Column(db.String(255), nullable=True)  # user_name of the user who paid the receipt, if given
     
     # Relationship with DistributionUser
-    users = db.relationship('DistributionUser', backref='distribution', cascade="all, delete-orphan")
+    users = db.relationship('DistributionUser', backref='distribution', cascade="all, delete-orphan",
+                            order_by='DistributionUser.id')
+    
+    # Relationship with DistributionItem, in receipt order
+    items = db.relationship('DistributionItem', backref='distribution', cascade="all, delete-orphan",
+                            order_by='DistributionItem.position')
     
     def __repr__(self):
         return f"<Distribution {self.distribution_id}: ${self.total_amount}>"
     
-    def to_dict(self):
-        """Convert distribution to dictionary"""
-        return {
-            'id': self.id,
-            'distribution_id': self.distribution_id,
-            'created_at': self.created_at.isoformat(),
-            'receipt_name': self.receipt_name,
-            'total_amount': self.total_amount,
-            'distribution_data': json.loads(self.distribution_data),
-            'users': [user.to_dict() for user in self.users]
-        }
+    # Fields to_dict can produce, in output order
+    FIELDS = ('id', 'distribution_id', 'created_at', 'receipt_name', 'total_amount', 'distribution_data', 'users')
+    
+    def to_dict(self, fields=None):
+        """Convert distribution to dictionary, optionally only the given fields"""
+        if fields is None:
+            fields = self.FIELDS
+        data = {}
+        for field in self.FIELDS:
+            if field not in fields:
+                continue
+            if field == 'created_at':
+                data[field] = self.created_at.isoformat()
+            elif field == 'distribution_data':
+                data[field] = json.loads(self.distribution_data)
+                if 'items' not in data[field]:
+                    data[field]['items'] = [item.to_dict() for item in self.items]
+            elif field == 'users':
+                user_items = self._user_items()
+                data[field] = [user.to_dict(user_items.get(user.id, [])) for user in self.users]
+            else:
+                data[field] = getattr(self, field)
+        return data
+    
+    def _user_items(self):
+        """Map DistributionUser.id to that user's item shares, in receipt order"""
+        user_items = {}
+        for item in self.items:
+            if not item.shares:
+                continue
+            name, price = item.name, item.price
+            if item.extra_json:
+                # Names and prices the columns cannot hold exactly are kept here
+                extra = json.loads(item.extra_json)
+                name = extra.get('name', name)
+                price = extra.get('price', price)
+            for share in item.shares:
+                user_items.setdefault(share.distribution_user_id, []).append({
+                    'name': name,
+                    'price': price,
+                    'share': share.share
+                })
+        return user_items
 
 
 class DistributionUser(db.Model):
@@ -45,21 +83,178 @@ class DistributionUser(db.Model):
     Stores user information for a distribution
     """
     id = db.Column(db.Integer, primary_key=True)
-    distribution_id = db.Column(db.Integer, db.ForeignKey('distribution.id'), nullable=False)
+    distribution_id = db.Column(db.Integer, db.ForeignKey('distribution.id'), nullable=False, index=True)
     user_name = db.Column(db.String(255), nullable=False)
     user_identifier = db.Column(db.String(50), nullable=False)  # e.g., "user1", "user2", etc.
     amount = db.Column(db.Float, nullable=False)
-    items_json = db.Column(db.Text, nullable=False)  # JSON string of items assigned to this user
+    items_json = db.Column(db.Text, nullable=False, default='')  # Legacy JSON; shares now live in distribution_item_share
     
     def __repr__(self):
         return f"<DistributionUser {self.user_name}: ${self.amount}>"
     
-    def to_dict(self):
+    def to_dict(self, items=None):
         """Convert user distribution to dictionary"""
+        if self.items_json:
+            items = json.loads(self.items_json)  # Row saved before items were normalized
+        elif items is None:
+            items = self.distribution._user_items().get(self.id, [])
         return {
             'id': self.id,
             'user_name': self.user_name,
             'user_identifier': self.user_identifier,
             'amount': self.amount,
-            'items': json.loads(self.items_json)
-        }
\ No newline at end of file
+            'items': items
+        }
+
+
+class DistributionItem(db.Model):
+    """
+    Stores one receipt item of a distribution
+    """
+    __tablename__ = 'distribution_item'
+    id = db.Column(db.Integer, primary_key=True)
+    distribution_id = db.Column(db.Integer, db.ForeignKey('distribution.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)  # index in the submitted items list
+    name = db.Column(db.String(255), nullable=True)
+    price = db.Column(db.Float, nullable=True)
+    extra_json = db.Column(db.Text, nullable=True)  # JSON of any other submitted item keys, and integer prices
+    
+    # Relationship with DistributionItemShare, loaded together for all items of a distribution
+    shares = db.relationship('DistributionItemShare', backref='item', cascade="all, delete-orphan",
+                             order_by='DistributionItemShare.distribution_user_id', lazy='selectin')
+    
+    def __repr__(self):
+        return f"<DistributionItem {self.name}: ${self.price}>"
+    
+    def to_dict(self):
+        """Convert item to the dictionary it was submitted as"""
+        data = json.loads(self.extra_json) if self.extra_json else {}
+        if self.name is not None:
+            data['name'] = self.name
+        if self.price is not None and 'price' not in data:
+            data['price'] = self.price
+        if 'users' not in data and self.shares:
+            data['users'] = [share.user.user_identifier for share in self.shares]
+        return data
+
+
+class DistributionItemShare(db.Model):
+    """
+    Stores one user's share of one item
+    """
+    __tablename__ = 'distribution_item_share'
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('distribution_item.id'), nullable=False, index=True)
+    distribution_user_id = db.Column(db.Integer, db.ForeignKey('distribution_user.id'), nullable=False)
+    share = db.Column(db.Float, nullable=False)
+    
+    user = db.relationship('DistributionUser')
+    
+    def __repr__(self):
+        return f"<DistributionItemShare {self.item_id}/{self.distribution_user_id}: ${self.share}>"
+
+class ParseCacheEntry(db.Model):
+    """
+    Persistent tier of the parse cache, keyed by a content hash
+    """
+    __tablename__ = 'parse_cache'
+    cache_key = db.Column(db.String(80), primary_key=True)  # e.g. "pdf:<sha256>" or "text:<sha256>"
+    result_json = db.Column(db.Text, nullable=False)  # JSON string of the parsed receipt
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<ParseCacheEntry {self.cache_key}>"
+
+
+class ParseJob(db.Model):
+    """
+    Stores a PDF queued for asynchronous parsing
+    """
+    __tablename__ = 'parse_job'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(10), unique=True, nullable=False)  # nanoid
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)  # queued, running, done, error
+    payload = db.Column(db.LargeBinary, nullable=True)  # PDF bytes, cleared once processed
+    result_json = db.Column(db.Text, nullable=True)  # JSON string of the parsed receipt
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<ParseJob {self.job_id}: {self.status}>"
+    
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result': json.loads(self.result_json) if self.result_json else None,
+            'error': self.error
+        }
+
+
+class SpendingRollup(db.Model):
+    """
+    Per-user spending totals for one day, maintained on save
+    """
+    __tablename__ = 'spending_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    period_type = db.Column(db.String(5), nullable=False)  # "day"; weeks and months were dropped in migration 9
+    period = db.Column(db.String(10), nullable=False)  # e.g. "2025-04-12"
+    user_name = db.Column(db.String(255), nullable=False)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    distribution_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('period_type', 'period', 'user_name', name='uq_spending_rollup_period_user'),
+    )
+    
+    def __repr__(self):
+        return f"<SpendingRollup {self.period_type} {self.period} {self.user_name}: ${self.amount}>"
+
+
+class Balance(db.Model):
+    """
+    Running balance between two users, maintained on save and settlement
+    """
+    __tablename__ = 'balance'
+    id = db.Column(db.Integer, primary_key=True)
+    user_a = db.Column(db.String(255), nullable=False)  # user_a < user_b
+    user_b = db.Column(db.String(255), nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False, default=0)  # what user_a owes user_b; negative if user_b owes
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_a', 'user_b', name='uq_balance_pair'),
+    )
+    
+    def __repr__(self):
+        return f"<Balance {self.user_a} owes {self.user_b}: {self.amount_cents}c>"
+
+
+class Settlement(db.Model):
+    """
+    Stores a payment from one user to another that settles debt
+    """
+    __tablename__ = 'settlement'
+    id = db.Column(db.Integer, primary_key=True)
+    from_user = db.Column(db.String(255), nullable=False)
+    to_user = db.Column(db.String(255), nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<Settlement {self.from_user} -> {self.to_user}: {self.amount_cents}c>"
+    
+    def to_dict(self):
+        """Convert settlement to dictionary"""
+        return {
+            'id': self.id,
+            'from': self.from_user,
+            'to': self.to_user,
+            'amount': self.amount_cents / 100,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import ParseCacheEntry
+
+# Entries kept in the per-process LRU
+MEMORY_MAX_ENTRIES = int(os.environ.get("PARSE_CACHE_MEMORY_ENTRIES", "256"))
+# Persistent entries older than this are discarded
+TTL_SECONDS = int(os.environ.get("PARSE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Persistent table is trimmed to this many rows, oldest first
+MAX_ROWS = int(os.environ.get("PARSE_CACHE_MAX_ROWS", "10000"))
+
+
+def pdf_key(pdf_bytes, version):
+    """Cache key for the raw bytes of an uploaded PDF parsed by parser `version`."""
+    return f"pdf:v{version}:" + hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def normalize_receipt_text(receipt_text):
+    """Strip every line and drop blank ones, as the parser does."""
+    return "\n".join(line.strip() for line in receipt_text.split('\n') if line.strip())
+
+
+def text_key(receipt_text, version):
+    """Cache key for receipt text parsed by parser `version`, insensitive to whitespace-only differences."""
+    return f"text:v{version}:" + hashlib.sha256(normalize_receipt_text(receipt_text).encode('utf-8')).hexdigest()
+
+
+class ParseCache:
+    """
+    Two-tier cache of parsed receipts: a bounded in-process LRU in front of
+    the parse_cache table. Values are stored as JSON strings so every hit
+    returns a fresh dict the caller is free to mutate.
+    """
+
+    def __init__(self, engine_getter, memory_max_entries=MEMORY_MAX_ENTRIES,
+                 ttl_seconds=TTL_SECONDS, max_rows=MAX_ROWS):
+        self._engine_getter = engine_getter
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_max_entries = memory_max_entries
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_rows = max_rows
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, *keys):
+        """
+        Look up the first key that is cached.
+
+        Returns:
+            dict or None: A copy of the cached parse result
+        """
+        with self._lock:
+            for key in keys:
+                value = self._memory.get(key)
+                if value is not None:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return json.loads(value)
+
+        table = ParseCacheEntry.__table__
+        cutoff = datetime.utcnow() - self.ttl
+        try:
+            with self._engine_getter().connect() as connection:
+                row = connection.execute(
+                    select(table.c.cache_key, table.c.result_json)
+                    .where(table.c.cache_key.in_(keys), table.c.created_at >= cutoff)
+                    .limit(1)
+                ).first()
+        except Exception as e:
+            logging.warning("Parse cache lookup failed: %s", e)
+            row = None
+
+        if row is None:
+            self._count('misses')
+            return None
+
+        self._count('db_hits')
+        for key in keys:
+            self._remember(key, row.result_json)
+        return json.loads(row.result_json)
+
+    def put(self, keys, result):
+        """Store a parse result under every given key in both tiers."""
+        value = json.dumps(result)
+        for key in keys:
+            self._remember(key, value)
+
+        table = ParseCacheEntry.__table__
+        now = datetime.utcnow()
+        try:
+            with self._engine_getter().begin() as connection:
+                for key in keys:
+                    statement = sqlite_insert(table).values(cache_key=key, result_json=value, created_at=now)
+                    connection.execute(statement.on_conflict_do_update(
+                        index_elements=[table.c.cache_key],
+                        set_={'result_json': value, 'created_at': now}
+                    ))
+                self._evict(connection, now)
+            self._count('stores')
+        except Exception as e:
+            logging.warning("Parse cache store failed: %s", e)
+
+    def _evict(self, connection, now):
+        table = ParseCacheEntry.__table__
+        removed = connection.execute(delete(table).where(table.c.created_at < now - self.ttl)).rowcount
+
+        excess = connection.execute(select(func.count()).select_from(table)).scalar() - self.max_rows
+        if excess > 0:
+            oldest = select(table.c.cache_key).order_by(table.c.created_at).limit(excess)
+            removed += connection.execute(delete(table).where(table.c.cache_key.in_(oldest))).rowcount
+
+        if removed:
+            self._count('evictions', removed)
+
+    def clear_memory(self):
+        """Drop the in-process tier; the persistent tier is left intact."""
+        with self._lock:
+            self._memory.clear()
+
+    def get_stats(self):
+        """Return a snapshot of the hit/miss counters."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,109 @@
+import io
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Receipts with at least this many pages are extracted across the process pool
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "4"))
+# Worker processes for page extraction (0 disables the pool)
+EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = None
+
+
+def _get_executor():
+    """Return the shared process pool, creating it on first use."""
+    global _executor
+    if _executor is None and EXTRACT_WORKERS > 1:
+        try:
+            # Workers come from a fresh forkserver rather than forks of this
+            # process, which may hold threads, locks and database connections
+            _executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+        except (OSError, NotImplementedError, ValueError) as e:
+            # Some serverless runtimes do not allow spawning processes
+            logging.warning("Process pool unavailable, extracting serially: %s", e)
+            return None
+    return _executor
+
+
+def _pdf_reader(pdf_bytes):
+    """Open an in-memory PDF; pypdf is imported on first use to keep cold starts short."""
+    from pypdf import PdfReader
+    return PdfReader(io.BytesIO(pdf_bytes))
+
+
+def _extract_page_range(pdf_bytes, start, stop):
+    """Extract the text of pages [start, stop) from an in-memory PDF."""
+    reader = _pdf_reader(pdf_bytes)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def _page_ranges(page_count, chunks):
+    """Split page_count pages into at most `chunks` contiguous ranges."""
+    size, extra = divmod(page_count, chunks)
+    start = 0
+    for i in range(chunks):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            yield start, stop
+        start = stop
+
+
+def read_upload(file):
+    """
+    Read an uploaded file into memory without writing it to disk.
+
+    Args:
+        file: A werkzeug FileStorage from request.files
+
+    Returns:
+        bytes: The raw file contents
+    """
+    return file.read()
+
+
+def extract_text(pdf_bytes):
+    """
+    Extract the text of every page of a PDF held in memory.
+
+    Multi-page documents are split into contiguous page ranges that are
+    extracted in parallel on a process pool; small ones are extracted inline.
+
+    Args:
+        pdf_bytes (bytes): The raw PDF contents
+
+    Returns:
+        tuple: (text, page_count) where text has one trailing newline per page
+    """
+    reader = _pdf_reader(pdf_bytes)
+    page_count = len(reader.pages)
+    logging.debug("PDF has %d pages", page_count)
+
+    executor = _get_executor() if page_count >= PARALLEL_MIN_PAGES else None
+    if executor is None:
+        page_texts = [page.extract_text() for page in reader.pages]
+    else:
+        futures = [executor.submit(_extract_page_range, pdf_bytes, start, stop)
+                   for start, stop in _page_ranges(page_count, EXTRACT_WORKERS)]
+        page_texts = [text for future in futures for text in future.result()]
+
+    return "".join(text + "\n" for text in page_texts), page_count
+
+
+def iter_pages(pdf_bytes):
+    """
+    Extract the pages of a PDF held in memory one at a time, in order.
+
+    A page is only extracted when the generator reaches it, so a consumer
+    that stops early never pays for the remaining pages.
+
+    Args:
+        pdf_bytes (bytes): The raw PDF contents
+
+    Returns:
+        tuple: (page_count, generator of page texts)
+    """
+    reader = _pdf_reader(pdf_bytes)
+    return len(reader.pages), (page.extract_text() for page in reader.pages)
@@ -0,0 +1,104 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Rendered responses kept in the per-process LRU
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "512"))
+# Upper bound on the total size of the cached bodies
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Seconds an entry is served before it is rendered again; bounds how long an
+# edit made by another process goes unseen here
+TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "60"))
+
+
+def strong_etag(body):
+    """Strong ETag value (unquoted) for a response body."""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class ResponseCache:
+    """
+    Bounded in-process LRU of rendered responses for saved distributions,
+    keyed by (kind, distribution_id), e.g. ('json', 'Ab3dE6gH9k').
+
+    Saved distributions rarely change. An edit or delete committed in this
+    process drops the distribution's entries through invalidate(); one made
+    by another process (another gunicorn worker, a flask command) is picked
+    up once the entry is older than ttl_seconds. ETags are content hashes,
+    so clients revalidating then get the new body.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl_seconds=TTL_SECONDS,
+                 clock=time.monotonic):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._clock = clock
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0, 'expirations': 0}
+
+    def get(self, kind, distribution_id):
+        """
+        Returns:
+            tuple or None: (body bytes, etag) of the cached response
+        """
+        key = (kind, distribution_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() - entry[2] >= self.ttl_seconds:
+                del self._entries[key]
+                self._bytes -= len(entry[0])
+                self.stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[:2]
+
+    def put(self, kind, distribution_id, body):
+        """
+        Cache a rendered body and return it with its ETag.
+
+        Returns:
+            tuple: (body bytes, etag)
+        """
+        entry = (body, strong_etag(body))
+        if len(body) > self.max_bytes:
+            return entry
+        key = (kind, distribution_id)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (*entry, self._clock())
+            self._bytes += len(body)
+            self.stats['stores'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats['evictions'] += 1
+        return entry
+
+    def invalidate(self, distribution_id):
+        """Drop every cached response of a distribution."""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == distribution_id]:
+                body, _, _ = self._entries.pop(key)
+                self._bytes -= len(body)
+                self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Return a snapshot of the counters and the current size."""
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes}
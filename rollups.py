@@ -0,0 +1,126 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import chain
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import Distribution, DistributionUser, SpendingRollup
+
+# Only days are stored; load_window sums the weeks and months of its window
+# from them, since those rarely lie entirely inside it
+PERIOD_TYPES = ('day',)
+
+
+def period_keys(created_at):
+    """Return the (period_type, period) buckets a timestamp falls into."""
+    return (('day', created_at.strftime('%Y-%m-%d')),)
+
+
+def _upsert(executor, rows):
+    """Add amounts and counts onto existing rollup rows, creating missing ones."""
+    if not rows:
+        return
+    statement = sqlite_insert(SpendingRollup.__table__)
+    executor.execute(
+        statement.on_conflict_do_update(
+            index_elements=['period_type', 'period', 'user_name'],
+            set_={
+                'amount': SpendingRollup.__table__.c.amount + statement.excluded.amount,
+                'distribution_count': (SpendingRollup.__table__.c.distribution_count
+                                       + statement.excluded.distribution_count),
+            }
+        ),
+        rows
+    )
+
+
+def apply_distributions(executor, distributions):
+    """
+    Fold several saved distributions into the rollups with one upsert.
+
+    Args:
+        executor: A session or connection; the caller owns the transaction
+        distributions: Iterable of (created_at, user_amounts) pairs
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    for created_at, user_amounts in distributions:
+        distribution_totals = defaultdict(float)
+        for user_name, amount in user_amounts:
+            distribution_totals[user_name] += amount
+        for period_type, period in period_keys(created_at):
+            for user_name, amount in distribution_totals.items():
+                bucket = totals[(period_type, period, user_name)]
+                bucket[0] += amount
+                bucket[1] += 1
+    _upsert(executor, [
+        {'period_type': period_type, 'period': period, 'user_name': user_name,
+         'amount': amount, 'distribution_count': count}
+        for (period_type, period, user_name), (amount, count) in totals.items()
+    ])
+
+
+def rebuild(executor, batch_size=1000):
+    """
+    Regenerate every rollup row from the distribution tables.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    executor.execute(delete(SpendingRollup.__table__))
+    totals = defaultdict(lambda: [0.0, set()])
+    rows = executor.execute(
+        select(Distribution.id, Distribution.created_at, DistributionUser.user_name, DistributionUser.amount)
+        .join(DistributionUser, DistributionUser.distribution_id == Distribution.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for distribution_pk, created_at, user_name, amount in rows:
+        for period_type, period in period_keys(created_at):
+            bucket = totals[(period_type, period, user_name)]
+            bucket[0] += amount
+            bucket[1].add(distribution_pk)
+    _upsert(executor, [
+        {'period_type': period_type, 'period': period, 'user_name': user_name,
+         'amount': amount, 'distribution_count': len(distribution_pks)}
+        for (period_type, period, user_name), (amount, distribution_pks) in totals.items()
+    ])
+    return len(totals)
+
+
+def load_window(executor, now, days=30):
+    """
+    Read per-user spending for the last `days` days from the rollups.
+
+    Every series is built from the day rows inside the window (at most
+    days + 1), so weeks and months that only partly overlap it count just
+    their days in the window, as /analytics always did. The window starts
+    mid-day, so that first partial day is read from the distributions
+    themselves. Weeks are keyed '%Y-W%U' (starting on Sunday) and months
+    '%Y-%m'.
+
+    Returns:
+        tuple: (user_data, weekly_data, monthly_data) where user_data maps
+               user name to amount and the others map period to {user: amount}
+    """
+    start = now - timedelta(days=days)
+    next_day = datetime.combine(start.date(), time()) + timedelta(days=1)
+    partial_rows = executor.execute(
+        select(Distribution.created_at, DistributionUser.user_name, DistributionUser.amount)
+        .join(DistributionUser, DistributionUser.distribution_id == Distribution.id)
+        .where(Distribution.created_at >= start, Distribution.created_at < next_day)
+    ).all()
+    table = SpendingRollup.__table__
+    day_rows = executor.execute(
+        select(table.c.period, table.c.user_name, table.c.amount)
+        .where(table.c.period_type == 'day', table.c.period >= next_day.strftime('%Y-%m-%d'))
+    )
+    user_data = defaultdict(float)
+    weekly_data = defaultdict(lambda: defaultdict(float))
+    monthly_data = defaultdict(lambda: defaultdict(float))
+    for day, user_name, amount in chain(
+            partial_rows,
+            ((datetime.strptime(period, '%Y-%m-%d'), user_name, amount) for period, user_name, amount in day_rows)):
+        user_data[user_name] += amount
+        weekly_data[day.strftime('%Y-W%U')][user_name] += amount
+        monthly_data[day.strftime('%Y-%m')][user_name] += amount
+    return (dict(user_data),
+            {week: dict(amounts) for week, amounts in weekly_data.items()},
+            {month: dict(amounts) for month, amounts in monthly_data.items()})
@@ -0,0 +1,280 @@
+import re
+import base64
+from datetime import timedelta
+from sqlalchemy import Integer, bindparam, column, func, select, table, text
+from models import Distribution, DistributionUser, DistributionItem, DistributionItemShare
+
+# Contentless FTS5 index of item names, keyed by item id. Besides the name,
+# each item is indexed with the year and month it was saved in ("y2025
+# m202504"), so a date filter narrows the matches inside the index instead
+# of checking every match's distribution. Prefix indexes make 2 and 3
+# character prefix queries ("eg*") index lookups.
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5("
+    "name, period, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+# Rows of the index for the items of the selected distributions
+_INDEX_ROWS = (
+    "INSERT INTO item_search (rowid, name, period) "
+    "SELECT distribution_item.id, distribution_item.name, "
+    "'y' || strftime('%Y', distribution.created_at) || ' m' || strftime('%Y%m', distribution.created_at) "
+    "FROM distribution_item JOIN distribution ON distribution.id = distribution_item.distribution_id"
+)
+
+item_search = table('item_search', column('rowid', Integer))
+
+# A quoted phrase with an optional prefix star, or a bare word
+_TERM = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+
+def create_index(executor):
+    """Create the item search index if it does not exist yet."""
+    executor.execute(text(CREATE_INDEX))
+
+
+def index_distributions(executor, distribution_pks):
+    """
+    Add the items of newly inserted distributions to the search index.
+
+    Items must be added exactly once; the index is not maintained by
+    triggers, so deleting items means rebuilding it.
+
+    Args:
+        executor: A session or connection; the caller owns the transaction
+        distribution_pks: Primary keys of distributions whose items are not indexed yet
+    """
+    if not distribution_pks:
+        return
+    executor.execute(
+        text(_INDEX_ROWS + " WHERE distribution_item.distribution_id IN :pks")
+        .bindparams(bindparam('pks', expanding=True)),
+        {'pks': list(distribution_pks)}
+    )
+
+
+def rebuild(executor):
+    """
+    Regenerate the search index from every row of distribution_item.
+
+    Returns:
+        int: Number of items indexed
+    """
+    executor.execute(text("INSERT INTO item_search (item_search) VALUES ('delete-all')"))
+    return executor.execute(text(_INDEX_ROWS)).rowcount
+
+
+def match_query(query):
+    """
+    Turn a user's search text into an FTS5 MATCH expression on item names.
+
+    Words are matched as whole tokens and must all appear; "double quotes"
+    match a phrase and a trailing * makes a word or phrase a prefix, e.g.
+    `egg*` or `"white egg"*`. Everything else is quoted, so operators and
+    punctuation in item names never cause syntax errors.
+
+    Args:
+        query (str): The search text
+
+    Returns:
+        str: The MATCH expression
+
+    Raises:
+        ValueError: If the text has no search terms
+    """
+    terms = []
+    for phrase, phrase_prefix, word in _TERM.findall(query or ''):
+        if word:
+            phrase, phrase_prefix = word.rstrip('*'), '*' if word.endswith('*') else ''
+        phrase = phrase.replace('"', '').strip()
+        if phrase:
+            terms.append(f'"{phrase}"{phrase_prefix}')
+    if not terms:
+        raise ValueError('q must contain a search term')
+    return f"name : ({' '.join(terms)})"
+
+
+def period_tokens(first, last):
+    """
+    Return the index's period tokens covering every month from first to last.
+
+    Whole calendar years collapse into one year token, so a range needs at
+    most 22 month tokens plus one per year.
+
+    Args:
+        first, last (datetime): The earliest and latest instant to cover
+
+    Returns:
+        list: Tokens such as 'y2024' and 'm202501'
+    """
+    tokens = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        if month == 1 and (year < last.year or last.month == 12):
+            tokens.append(f'y{year}')
+            year += 1
+            continue
+        tokens.append(f'm{year}{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return tokens
+
+
+def encode_cursor(item_pk):
+    """Opaque keyset cursor pointing just past this item."""
+    return base64.urlsafe_b64encode(str(item_pk).encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the item id of a cursor; raises ValueError if malformed."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii'))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _matching(executor, query, since, until, with_distributions=False):
+    """
+    Shared FROM and WHERE of the search queries: matching items, joined to
+    their distributions when dates filter them or with_distributions is set.
+
+    Returns:
+        tuple: (source, conditions), or None if no item can match the dates
+    """
+    expression = match_query(query)
+    items = DistributionItem.__table__
+    distributions = Distribution.__table__
+    source = item_search.join(items, items.c.id == item_search.c.rowid)
+    conditions = []
+    if since is not None or until is not None:
+        # Clamp open or overly wide bounds to the saved history (both are
+        # single index lookups) and narrow the match to the months in range;
+        # the created_at conditions then trim the partial months at the ends
+        first, last = executor.execute(select(
+            select(func.min(distributions.c.created_at)).scalar_subquery(),
+            select(func.max(distributions.c.created_at)).scalar_subquery()
+        )).one()
+        if first is None:
+            return None
+        if since is not None:
+            first = max(first, since)
+            conditions.append(distributions.c.created_at >= since)
+        if until is not None:
+            last = min(last, until - timedelta(microseconds=1))
+            conditions.append(distributions.c.created_at < until)
+        if first > last:
+            return None
+        expression += f" AND period : ({' OR '.join(period_tokens(first, last))})"
+    if conditions or with_distributions:
+        source = source.join(distributions, distributions.c.id == items.c.distribution_id)
+    conditions.insert(0, text('item_search MATCH :query').bindparams(query=expression))
+    return source, conditions
+
+
+def search_items(executor, query, since=None, until=None, limit=50, after=None):
+    """
+    Return one page of items whose names match, most recently saved first.
+
+    Pages are keyed on the item id, so each page walks the index from where
+    the last one stopped instead of skipping over earlier results.
+
+    Args:
+        executor: A session or connection
+        query (str): Search text, see match_query
+        since, until (datetime): Optional bounds on the distribution's
+                                 created_at (until is exclusive)
+        limit (int): Page size
+        after (int): Item id of the previous page's last result
+
+    Returns:
+        tuple: (items, next_after) where items are dicts with their users'
+               shares and next_after is None on the last page
+
+    Raises:
+        ValueError: If the query has no search terms
+    """
+    matching = _matching(executor, query, since, until, with_distributions=True)
+    if matching is None:
+        return [], None
+    source, conditions = matching
+    items = DistributionItem.__table__
+    distributions = Distribution.__table__
+    if after is not None:
+        conditions.append(item_search.c.rowid < after)
+    rows = executor.execute(
+        select(items.c.id, items.c.name, items.c.price, distributions.c.distribution_id,
+               distributions.c.created_at, distributions.c.receipt_name)
+        .select_from(source)
+        .where(*conditions)
+        .order_by(item_search.c.rowid.desc())
+        .limit(limit + 1)
+    ).all()
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    rows = rows[:limit]
+
+    # The users' shares of just this page's items
+    shares = {}
+    if rows:
+        share_table = DistributionItemShare.__table__
+        users = DistributionUser.__table__
+        for item_pk, user_name, share in executor.execute(
+                select(share_table.c.item_id, users.c.user_name, share_table.c.share)
+                .join(users, users.c.id == share_table.c.distribution_user_id)
+                .where(share_table.c.item_id.in_([row.id for row in rows]))
+                .order_by(share_table.c.item_id, share_table.c.distribution_user_id)):
+            shares.setdefault(item_pk, []).append({'user_name': user_name, 'share': share})
+
+    return [{
+        'name': row.name,
+        'price': row.price,
+        'distribution_id': row.distribution_id,
+        'receipt_name': row.receipt_name,
+        'created_at': row.created_at.isoformat(),
+        'shares': shares.get(row.id, [])
+    } for row in rows], next_after
+
+
+def search_totals(executor, query, since=None, until=None):
+    """
+    Aggregate every matching item: how many, what they cost and each user's share.
+
+    Reads every match, so unlike a page its cost grows with the number of
+    matches; date bounds keep it small.
+
+    Args:
+        executor: A session or connection
+        query (str): Search text, see match_query
+        since, until (datetime): Optional bounds on the distribution's
+                                 created_at (until is exclusive)
+
+    Returns:
+        dict: {'items', 'amount', 'users': [{'user_name', 'amount', 'items'}]},
+              users ordered by amount, largest first
+
+    Raises:
+        ValueError: If the query has no search terms
+    """
+    matching = _matching(executor, query, since, until)
+    if matching is None:
+        return {'items': 0, 'amount': 0, 'users': []}
+    source, conditions = matching
+    items = DistributionItem.__table__
+    share_table = DistributionItemShare.__table__
+    users = DistributionUser.__table__
+    item_count, amount = executor.execute(
+        select(func.count(), func.coalesce(func.sum(items.c.price), 0)).select_from(source).where(*conditions)
+    ).one()
+    user_rows = executor.execute(
+        select(users.c.user_name, func.sum(share_table.c.share), func.count())
+        .select_from(source
+                     .join(share_table, share_table.c.item_id == items.c.id)
+                     .join(users, users.c.id == share_table.c.distribution_user_id))
+        .where(*conditions)
+        .group_by(users.c.user_name)
+    ).all()
+    return {
+        'items': item_count,
+        'amount': round(amount, 2),
+        'users': [{'user_name': user_name, 'amount': round(user_amount, 2), 'items': user_items}
+                  for user_name, user_amount, user_items
+                  in sorted(user_rows, key=lambda row: (-row[1], row[0]))]
+    }
@@ -0,0 +1,169 @@
+import math
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+from functools import lru_cache
+
+# Weights are scaled to integers per item; this bounds how precise they can be
+MAX_SCALED_WEIGHT = 10 ** 9
+
+
+def to_cents(amount):
+    """Convert a price to integer cents, rounding half up."""
+    if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+        raise ValueError(f"Invalid price: {amount!r}")
+    if isinstance(amount, int):
+        return amount * 100
+    if isinstance(amount, float) and math.isfinite(amount):
+        cents = amount * 100
+        nearest = round(cents)
+        if abs(cents - nearest) < 0.25:  # Not near a half cent, so float rounding cannot matter
+            return nearest
+    try:
+        cents = Decimal(str(amount)) * 100
+    except ArithmeticError:
+        raise ValueError(f"Invalid price: {amount!r}")
+    if not cents.is_finite():
+        raise ValueError(f"Invalid price: {amount!r}")
+    return int(cents.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+@lru_cache(maxsize=1024)
+def _weight_ratio(weight):
+    """Exact (numerator, denominator) of a weight as written, e.g. 0.1 -> (1, 10)."""
+    ratio = Fraction(str(weight))
+    return ratio.numerator, ratio.denominator
+
+
+def _item_weights(item, user_index, position):
+    """
+    Return (user indexes, integer weights) for an item's assignees, in user order.
+
+    Assignees that are not in the users list are ignored. Weights come from
+    the optional item['weights'] mapping of user id to a non-negative number
+    (default 1) and are scaled by a common factor so they are all integers.
+    Weights are None for an equal split.
+    """
+    assignees = item.get('users') or []
+    if not isinstance(assignees, list):
+        raise ValueError(f"Item {position}: users must be a list")
+    indexes = user_index.indexes(assignees)
+    weights = item.get('weights')
+    if not weights or not indexes:
+        return indexes, None
+    if not isinstance(weights, dict):
+        raise ValueError(f"Item {position}: weights must map user ids to numbers")
+
+    exact = []
+    for index in indexes:
+        # JSON object keys are always strings
+        weight = weights.get(str(user_index.ids[index]), 1)
+        if (isinstance(weight, bool) or not isinstance(weight, (int, float))
+                or not math.isfinite(weight) or weight < 0):
+            raise ValueError(f"Item {position}: invalid weight {weight!r}")
+        exact.append(weight)
+    if not any(exact):
+        raise ValueError(f"Item {position}: weights must not all be zero")
+
+    if all(isinstance(weight, int) for weight in exact):
+        scaled = exact
+    else:
+        ratios = [_weight_ratio(weight) for weight in exact]
+        scale = math.lcm(*(denominator for _, denominator in ratios))
+        scaled = [numerator * (scale // denominator) for numerator, denominator in ratios]
+    if max(scaled) > MAX_SCALED_WEIGHT:
+        raise ValueError(f"Item {position}: weights are too precise")
+    return indexes, scaled
+
+
+def _is_user_id(value):
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+class _UserIndex:
+    """Map user id to the positions it appears at in the users list."""
+
+    def __init__(self, users):
+        self.ids = []
+        self._positions = {}
+        for index, user in enumerate(users):
+            if not isinstance(user, dict) or not _is_user_id(user.get('id')):
+                raise ValueError(f"User {index}: id must be a string or an integer")
+            self.ids.append(user['id'])
+            self._positions.setdefault(user['id'], []).append(index)
+        # Usually every id appears once and lookups can skip the lists
+        self._unique = {user_id: positions[0] for user_id, positions in self._positions.items()
+                        if len(positions) == 1}
+        if len(self._unique) < len(self._positions):
+            self._unique = None
+
+    def indexes(self, user_ids):
+        """Sorted positions of the users with any of these ids; unknown ids are skipped."""
+        try:
+            if self._unique is not None:
+                unique = self._unique
+                return sorted({unique[user_id] for user_id in user_ids if user_id in unique})
+            return sorted({i for user_id in user_ids for i in self._positions.get(user_id, ())})
+        except TypeError:
+            raise ValueError("User ids must be strings or integers")
+
+
+def _allocate(prices, assignments):
+    """Largest-remainder allocation, one item at a time."""
+    shares = []
+    for item_index, (price, (indexes, weights)) in enumerate(zip(prices, assignments)):
+        if not indexes:
+            continue
+        if weights is None:
+            # Equal split: every remainder is the same, so the leftover
+            # cents go to the first users
+            floor, leftover = divmod(price, len(indexes))
+            shares += [(item_index, user_index, floor + (k < leftover)) for k, user_index in enumerate(indexes)]
+            continue
+        total_weight = sum(weights)
+        floors = [divmod(price * weight, total_weight) for weight in weights]
+        leftover = price - sum(floor for floor, _ in floors)
+        # Largest remainder first; ties go to the earlier user
+        bonus = set(sorted(range(len(weights)), key=lambda k: -floors[k][1])[:leftover])
+        shares += [(item_index, user_index, floors[k][0] + (k in bonus)) for k, user_index in enumerate(indexes)]
+    return shares
+
+
+def allocate_shares(users, items):
+    """
+    Split every item's price among its assigned users in whole cents.
+
+    Each item's price is divided in proportion to the users' weights (equal
+    by default). Cents left over after rounding down go one each to the
+    users with the largest remainders, earlier users first on ties, so an
+    item's shares always add up to its price.
+
+    Args:
+        users (list): [{'id': str, 'name': str, ...}]
+        items (list): [{'name', 'price', 'users': [user ids], 'weights': {user id: number}}]
+
+    Returns:
+        tuple: (shares, user_totals) where shares is a list of
+               (item_index, user_index, cents) in item order then user order,
+               and user_totals is the cents owed by each user
+
+    Raises:
+        ValueError: If a user, an assigned item or a weight is invalid
+    """
+    user_index = _UserIndex(users)
+    prices = []
+    assignments = []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {position}: must be an object")
+        assignment = _item_weights(item, user_index, position)
+        if assignment[0] and 'price' not in item:
+            raise ValueError(f"Item {position}: price is required")
+        prices.append(to_cents(item['price']) if assignment[0] else 0)
+        assignments.append(assignment)
+
+    shares = _allocate(prices, assignments)
+
+    user_totals = [0] * len(users)
+    for _, index, cents in shares:
+        user_totals[index] += cents
+    return shares, user_totals
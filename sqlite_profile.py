@@ -0,0 +1,81 @@
+import os
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Set to 0 to fall back to the driver's defaults (rollback journal, no pragmas)
+ENABLED = os.environ.get("SQLITE_TUNING", "1") != "0"
+# How long a connection waits for a lock before failing with "database is locked";
+# kept well under gunicorn's 30 second worker timeout
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+# Bytes of the database file read through mmap instead of read() calls
+MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection in KiB
+CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", str(32 * 1024)))
+# Pooled connections per process; request and job threads share them
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+POOL_OVERFLOW = int(os.environ.get("SQLITE_POOL_OVERFLOW", "8"))
+
+
+def is_file_database(uri):
+    """True for a SQLite database stored in a file (not :memory:)."""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(uri):
+    """
+    Engine options for the database at `uri`.
+
+    File-backed SQLite gets a pool of long-lived connections, since the
+    pragmas below are set once per connection; pool_recycle and
+    pool_pre_ping are only useful against network databases and are
+    dropped. Other databases keep the previous options.
+
+    Args:
+        uri (str): The SQLAlchemy database URI
+
+    Returns:
+        dict: Options for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    if not ENABLED or not is_file_database(uri):
+        return {"pool_recycle": 300, "pool_pre_ping": True}
+    return {
+        "poolclass": QueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_OVERFLOW,
+        # The driver's own busy handler, in seconds
+        "connect_args": {"timeout": BUSY_TIMEOUT_MS / 1000, "check_same_thread": False},
+    }
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers proceed while one writer commits; the mode is
+        # stored in the database file, so setting it again is a no-op
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints: a power loss can drop
+        # the last commits but cannot corrupt the database
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS:d}")
+        cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE:d}")
+        cursor.execute(f"PRAGMA cache_size={-CACHE_SIZE_KB:d}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def install(engine):
+    """
+    Apply the SQLite pragmas to every new connection of `engine`.
+
+    Must run before the engine's first connection. Does nothing for
+    databases that engine_options leaves untuned.
+    """
+    if not ENABLED or not is_file_database(str(engine.url)):
+        return
+    event.listen(engine, 'connect', _set_pragmas)
+    logging.info("SQLite tuning enabled: WAL, busy_timeout=%dms, mmap_size=%d, cache_size=%dKiB, pool_size=%d",
+                 BUSY_TIMEOUT_MS, MMAP_SIZE, CACHE_SIZE_KB, POOL_SIZE)
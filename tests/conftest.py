@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app reads its database at import, so point it at a scratch database before
+# any test imports it; the tests run offline, without the Gemini API
+_db_dir = tempfile.mkdtemp(prefix='receipts_tests_')
+os.environ['RECEIPTS_DATABASE_URI'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.pop('GEMINI_API_KEY', None)
+
+logging.disable(logging.CRITICAL)
+
+# Tables a test may have written to, emptied before each test that uses the app
+_DATA_TABLES = ('distribution_item_share', 'distribution_item', 'distribution_user', 'distribution',
+                'spending_rollup', 'balance', 'settlement', 'parse_cache', 'parse_job')
+
+# A short Walmart order page as pypdf extracts it
+WALMART_RECEIPT = (
+    "Apr 3, 2025 order\n"
+    "Order# 2000127-41188203\n"
+    "Bananas, Each Weight-adjusted Qty 1 $1.38\n"
+    "Great Value Large White Eggs, 18 Count Unavailable Qty 1 $4.27\n"
+    "Marketside Fresh Spinach, 10 oz Shopped Qty 1 $2.98\n"
+    "Subtotal $4.36\n"
+    "Tax $0.31\n"
+    "Driver tip $3.00\n"
+    "Total $7.67\n"
+    "Payment method\n"
+)
+
+GEMINI_API_KEY = 'test-key'
+
+NAMES = ['Alice', 'Bob', 'Carol', 'Dan', 'Erin', 'Frank']
+PRODUCTS = ['Great Value Large White Eggs, 18 Count', 'Fresh Banana, Each', 'Marketside Fresh Spinach',
+            'Great Value Whole Vitamin D Milk, Gallon', 'Tyson Chicken Patties, 23 oz (Frozen)', 'Tax']
+
+
+def distribution_payload(rng):
+    """A random save_distribution payload shaped like the frontend's."""
+    users = [{'id': f'user{i + 1}', 'name': name, 'active': True}
+             for i, name in enumerate(NAMES[:rng.randint(2, len(NAMES))])]
+    items = []
+    for i in range(rng.randint(3, 12)):
+        assigned = rng.sample(users, rng.randint(1, len(users)))
+        assigned.sort(key=users.index)
+        items.append({'id': i, 'name': rng.choice(PRODUCTS), 'price': round(rng.uniform(0.5, 30), 2),
+                      'users': [user['id'] for user in assigned]})
+    return {'items': items, 'users': users, 'total': round(sum(item['price'] for item in items), 2)}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--update-golden', action='store_true',
+                     help='Rewrite tests/golden/*/*.json from the current parsers instead of checking them')
+
+
+@pytest.fixture
+def app():
+    from sqlalchemy import text
+    from app import app as flask_app, parse_cache, response_cache
+    from models import db
+
+    with flask_app.app_context():
+        for table in _DATA_TABLES:
+            db.session.execute(text(f'DELETE FROM {table}'))
+        db.session.execute(text("INSERT INTO item_search (item_search) VALUES ('delete-all')"))
+        db.session.commit()
+    parse_cache.clear_memory()
+    response_cache.clear()
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def saved_distributions(client):
+    """Save `count` random distributions through the API; returns their distribution_ids."""
+    def save(count, seed=0):
+        rng = random.Random(seed)
+        return [client.post('/api/save_distribution', json=distribution_payload(rng)).json['distribution_id']
+                for _ in range(count)]
+    return save
+
+
+def legacy_save(session, data, distribution_id):
+    """save_distribution before items were normalized: the payload and per-user items as JSON."""
+    from models import Distribution, DistributionUser
+
+    distribution = Distribution(receipt_name=data.get('receipt_name', 'Walmart Receipt'),
+                                total_amount=float(data['total']), distribution_data=json.dumps(data),
+                                distribution_id=distribution_id)
+    for user in data['users']:
+        user_items = []
+        user_total = 0
+        for item in data['items']:
+            if user['id'] in item.get('users', []):
+                share = item['price'] / len(item['users'])
+                user_total += share
+                user_items.append({'name': item['name'], 'price': item['price'], 'share': share})
+        distribution.users.append(DistributionUser(user_name=user['name'], user_identifier=user['id'],
+                                                   amount=user_total, items_json=json.dumps(user_items)))
+    session.add(distribution)
+
+
+@pytest.fixture
+def legacy_database(tmp_path):
+    """
+    Write payloads to a new database in the layout from before items were normalized.
+
+    Returns a function taking the payloads and returning the database's engine.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from models import db
+
+    engines = []
+
+    def write(payloads):
+        engine = create_engine(f"sqlite:///{tmp_path / f'legacy{len(engines)}.db'}")
+        engines.append(engine)
+        db.metadata.create_all(engine)
+        with Session(engine) as session:
+            for i, payload in enumerate(payloads):
+                legacy_save(session, payload, f'd{i:09d}')
+            session.commit()
+        return engine
+
+    yield write
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def walmart_receipt():
+    return WALMART_RECEIPT
+
+
+class FakeGenerativeModel:
+    """
+    Stand-in for genai.GenerativeModel.
+
+    Args:
+        responder: Callable taking the prompt and returning the response text
+        delay (float): Seconds to sleep before answering
+        error (Exception): Raised instead of answering, if given
+    """
+
+    def __init__(self, responder=None, delay=0.0, error=None):
+        self.responder = responder or (lambda prompt: '{"items": []}')
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(text=self.responder(prompt), usage_metadata=None)
+
+
+@pytest.fixture
+def gemini():
+    """
+    Install a GeminiClient around a FakeGenerativeModel for GEMINI_API_KEY.
+
+    Returns a function taking the model and the client's timeout and
+    breaker, and returning the client; the client is removed afterwards.
+    """
+    import gemini_client
+
+    def install(model, timeout=5.0, breaker=None):
+        client = gemini_client.GeminiClient(GEMINI_API_KEY, timeout=timeout, breaker=breaker,
+                                            model=model, max_workers=2)
+        gemini_client.set_gemini_client(GEMINI_API_KEY, client)
+        return client
+
+    yield install
+    with gemini_client._clients_lock:
+        gemini_client._clients.pop(GEMINI_API_KEY, None)
@@ -0,0 +1,55 @@
+from balances import simplify
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}, {'id': 'user3', 'name': 'Carol'}]
+
+
+def settle(net, transfers):
+    """Apply transfers to net balances and return what is left."""
+    left = dict(net)
+    for from_user, to_user, cents in transfers:
+        left[from_user] += cents
+        left[to_user] -= cents
+    return {user_name: cents for user_name, cents in left.items() if cents}
+
+
+def test_simplify_settles_every_balance_in_at_most_n_minus_one_transfers():
+    net = {'Alice': 5000, 'Bob': -2000, 'Carol': -2500, 'Dan': -500, 'Erin': 0}
+    transfers = simplify(net)
+    assert settle(net, transfers) == {}
+    assert len(transfers) <= 3
+    assert all(cents > 0 for _, _, cents in transfers)
+    # The largest debtor pays the largest creditor first
+    assert transfers[0] == ('Carol', 'Alice', 2500)
+
+
+def test_simplify_with_nothing_owed():
+    assert simplify({}) == []
+    assert simplify({'Alice': 0}) == []
+
+
+def test_settle_up_nets_saved_distributions_and_settlements(client):
+    # Alice pays 30.00 split three ways, then Bob pays 12.00 split with Carol
+    client.post('/api/save_distribution', json={
+        'users': USERS, 'paid_by': 'user1', 'total': 30.00,
+        'items': [{'name': 'Groceries', 'price': 30.00, 'users': ['user1', 'user2', 'user3']}]})
+    client.post('/api/save_distribution', json={
+        'users': USERS[1:], 'paid_by': 'user2', 'total': 12.00,
+        'items': [{'name': 'Pizza', 'price': 12.00, 'users': ['user2', 'user3']}]})
+
+    response = client.get('/api/settle_up').json
+    assert response['balances'] == [{'user_name': 'Alice', 'net': 20.0}, {'user_name': 'Bob', 'net': -4.0},
+                                    {'user_name': 'Carol', 'net': -16.0}]
+    assert sorted(response['transfers'], key=lambda t: t['from']) == [
+        {'from': 'Bob', 'to': 'Alice', 'amount': 4.0}, {'from': 'Carol', 'to': 'Alice', 'amount': 16.0}]
+
+    assert client.post('/api/settle_up', json={'from': 'Carol', 'to': 'Alice', 'amount': 16}).status_code == 200
+    response = client.get('/api/settle_up').json
+    assert response['transfers'] == [{'from': 'Bob', 'to': 'Alice', 'amount': 4.0}]
+    # Between Alice and Carol alone, Carol owed 10.00 and has paid 16.00
+    assert client.get('/api/settle_up?users=Alice,Carol').json['transfers'] == [
+        {'from': 'Alice', 'to': 'Carol', 'amount': 6.0}]
+
+
+def test_settlement_must_be_positive(client):
+    response = client.post('/api/settle_up', json={'from': 'Bob', 'to': 'Alice', 'amount': 0})
+    assert response.status_code == 400
@@ -0,0 +1,63 @@
+import json
+
+import app as app_module
+from models import Distribution
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}]
+
+
+def payload(name='Eggs', **extra):
+    return {'users': USERS, 'total': 4.0, 'items': [{'name': name, 'price': 4.0, 'users': ['user1', 'user2']}],
+            **extra}
+
+
+def saved_count(app):
+    with app.app_context():
+        return Distribution.query.count()
+
+
+def test_valid_records_are_saved_and_invalid_ones_reported(app, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'BULK_CHUNK_SIZE', 2)
+    records = [payload('Eggs', created_at='2025-04-01T12:00:00Z'), {'users': USERS, 'total': 4.0},
+               payload('Milk'), 'not an object', payload('Bread', created_at=20250401), payload('Rice')]
+    response = client.post('/api/distributions/bulk', json=records)
+    assert response.status_code == 200
+    body = response.json
+    assert (body['inserted'], body['failed']) == (3, 3)
+    assert [result['status'] for result in body['results']] == ['ok', 'error', 'ok', 'error', 'error', 'ok']
+    assert body['results'][1]['error'] == 'No items found in distribution data'
+    assert body['results'][4]['error'] == 'created_at must be an ISO 8601 string'
+    assert saved_count(app) == 3
+
+    saved = client.get(f"/api/distribution/{body['results'][0]['distribution_id']}").json
+    assert saved['created_at'].startswith('2025-04-01T12:00:00')
+
+
+def test_atomic_import_writes_nothing_if_any_record_is_invalid(app, client):
+    response = client.post('/api/distributions/bulk?atomic=1', json=[payload(), {'users': USERS}, payload()])
+    assert response.status_code == 400
+    assert response.json['inserted'] == 0
+    assert [result['status'] for result in response.json['results']] == ['skipped', 'error', 'skipped']
+    assert saved_count(app) == 0
+
+    response = client.post('/api/distributions/bulk?atomic=1', json=[payload(), payload()])
+    assert response.json['inserted'] == 2
+    assert saved_count(app) == 2
+
+
+def test_ndjson_lines_that_are_not_json_fail_alone(app, client):
+    body = '\n'.join([json.dumps(payload()), '{"users": ', '', json.dumps(payload('Milk'))]) + '\n'
+    response = client.post('/api/distributions/bulk', data=body, content_type='application/x-ndjson')
+    results = response.json['results']
+    assert [result['status'] for result in results] == ['ok', 'error', 'ok']
+    assert results[1]['error'].startswith('Invalid JSON')
+    assert saved_count(app) == 2
+
+
+def test_malformed_and_oversized_requests_are_rejected(app, client, monkeypatch):
+    assert client.post('/api/distributions/bulk', json={'users': USERS}).status_code == 400
+    monkeypatch.setattr(app_module, 'BULK_MAX_RECORDS', 2)
+    response = client.post('/api/distributions/bulk', json=[payload()] * 3)
+    assert response.status_code == 400
+    assert response.json['error'] == 'At most 2 records per request'
+    assert saved_count(app) == 0
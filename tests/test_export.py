@@ -0,0 +1,84 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import export
+from distribution_store import prepare_distribution, save_distributions
+from models import db
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}]
+START = datetime(2025, 4, 1, 12, 0)
+
+
+def seed(app, days):
+    """Save one two-item distribution per day offset from START; returns their distribution_ids."""
+    records = []
+    for day in days:
+        payload = {'users': USERS, 'total': 6.0, 'receipt_name': f'Receipt {day}',
+                   'items': [{'name': 'Eggs', 'price': 4.0, 'users': ['user1', 'user2']},
+                             {'name': 'Milk', 'price': 2.0, 'users': ['user2']}]}
+        records.append((f'd{day:09d}', START + timedelta(days=day), prepare_distribution(payload)))
+    with app.app_context():
+        save_distributions(db.session, records)
+        db.session.commit()
+    return [distribution_id for distribution_id, _, _ in records]
+
+
+def test_ndjson_has_one_row_per_share_oldest_first(app, client):
+    newer, older = seed(app, [1, 0])
+    response = client.get('/api/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'Content-Encoding' not in response.headers
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['distribution_id'] for row in rows] == [older] * 3 + [newer] * 3
+    assert rows[0] == {'distribution_id': older, 'created_at': START.isoformat(), 'receipt_name': 'Receipt 0',
+                       'item_position': 0, 'item_name': 'Eggs', 'item_price': 4.0,
+                       'user_id': 'user1', 'user_name': 'Alice', 'share': 2.0}
+    assert [(row['item_name'], row['user_name'], row['share']) for row in rows[:3]] == [
+        ('Eggs', 'Alice', 2.0), ('Eggs', 'Bob', 2.0), ('Milk', 'Bob', 2.0)]
+
+
+def test_csv_items_export_has_a_header(app, client):
+    distribution_id, = seed(app, [0])
+    response = client.get('/api/export?format=csv&rows=items')
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=distributions-items.csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == export.export_fields('items')
+    assert rows[1:] == [[distribution_id, START.isoformat(), 'Receipt 0', '6.0', '0', 'Eggs', '4.0'],
+                        [distribution_id, START.isoformat(), 'Receipt 0', '6.0', '1', 'Milk', '2.0']]
+
+
+def test_gzip_body_decompresses_to_the_plain_export(app, client):
+    seed(app, range(3))
+    plain = client.get('/api/export?format=csv').data
+    response = client.get('/api/export?format=csv', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.data) == plain
+
+
+def test_since_is_inclusive_and_until_exclusive(app, client):
+    ids = seed(app, range(5))
+    response = client.get('/api/export?rows=items&since=2025-04-02T12:00:00&until=2025-04-04T12:00:00')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['distribution_id'] for row in rows] == [ids[1], ids[1], ids[2], ids[2]]
+
+
+def test_rows_are_the_same_across_cursor_batches(app):
+    seed(app, range(5))
+    with app.app_context():
+        with db.engine.connect() as connection:
+            whole = list(export.iter_rows(connection, 'shares'))
+            batched = list(export.iter_rows(connection, 'shares', batch_size=2))
+    assert len(whole) == 15
+    assert batched == whole
+
+
+def test_invalid_parameters_are_rejected(client):
+    assert client.get('/api/export?format=xml').status_code == 400
+    assert client.get('/api/export?rows=users').status_code == 400
+    assert client.get('/api/export?since=yesterday').status_code == 400
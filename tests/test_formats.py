@@ -0,0 +1,81 @@
+"""
+Format detection and the golden outputs of the receipt format registry.
+
+Every golden/<format>/<case>.txt must be detected as <format> ('unknown' for
+no registered format) and parse_receipt must return exactly
+golden/<format>/<case>.json. With `pytest --update-golden` the .json files
+are rewritten from the current parsers instead; review the diff before
+committing.
+"""
+import os
+import glob
+import json
+
+import pytest
+
+import receipt_formats
+from receipt_formats import ReceiptFormat, detect_format, receipt_head, register
+from receipt_parser import WALMART, parse_receipt
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+GOLDEN_CASES = sorted(glob.glob(os.path.join(GOLDEN_DIR, '*', '*.txt')))
+
+WALMART_TEXT = "Great Value Large White Eggs, 18 Count Shopped Qty 1 $4.27\nTax $0.31\n"
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A copy of the registry that tests can register formats into."""
+    monkeypatch.setattr(receipt_formats, '_formats', list(receipt_formats._formats))
+
+
+def test_walmart_receipt_is_detected():
+    assert detect_format(WALMART_TEXT) is WALMART
+    assert detect_format("Corner Grocer\nApples $1.00\n") is None
+
+
+def test_best_scoring_format_wins_and_earlier_wins_ties(registry):
+    first = register(ReceiptFormat('first', [r'Corner Grocer'], parse_receipt))
+    second = register(ReceiptFormat('second', [r'Corner Grocer', r'Store #\d+'], parse_receipt))
+    register(ReceiptFormat('tied', [r'Corner Grocer'], parse_receipt))
+    assert detect_format("Corner Grocer\nApples $1.00\n") is first
+    assert detect_format("Corner Grocer Store #12\nApples $1.00\n") is second
+
+
+def test_min_score_and_replacing_a_format(registry):
+    strict = register(ReceiptFormat('strict', [r'Corner Grocer', r'Store #\d+'], parse_receipt, min_score=2))
+    assert detect_format("Corner Grocer\n") is None
+    assert detect_format("Corner Grocer Store #12\n") is strict
+    replacement = register(ReceiptFormat('strict', [r'Corner Grocer'], parse_receipt))
+    assert receipt_formats.registered_formats().count(replacement) == 1
+    assert strict not in receipt_formats.registered_formats()
+    assert detect_format("Corner Grocer\n") is replacement
+
+
+def test_only_the_head_of_a_receipt_is_inspected():
+    text = "Corner Grocer\n" * 3 + WALMART_TEXT
+    assert receipt_head(text, 3) == "Corner Grocer\n" * 2 + "Corner Grocer"
+    assert detect_format(text, lines=3) is None
+    assert detect_format(text, lines=5) is WALMART
+
+
+@pytest.mark.parametrize('path', GOLDEN_CASES,
+                         ids=[os.path.relpath(path, GOLDEN_DIR)[:-len('.txt')] for path in GOLDEN_CASES])
+def test_golden_output(path, request, monkeypatch):
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    expected_format = os.path.basename(os.path.dirname(path))
+    with open(path) as f:
+        text = f.read()
+    detected = detect_format(text)
+    assert (detected.name if detected else 'unknown') == expected_format
+
+    result = parse_receipt(text)
+    output_path = path[:-len('.txt')] + '.json'
+    if request.config.getoption('--update-golden'):
+        with open(output_path, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        return
+    assert os.path.exists(output_path), 'missing golden output; run pytest --update-golden'
+    with open(output_path) as f:
+        assert result == json.load(f)
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from conftest import GEMINI_API_KEY, FakeGenerativeModel
+from gemini_client import CircuitBreaker, CircuitOpenError, GeminiTimeoutError
+from metrics import PARSER_BRANCHES
+from receipt_parser import parse_with_gemini, parse_with_regex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def branch_count(branch):
+    return PARSER_BRANCHES.labels(branch).value
+
+
+def test_breaker_opens_after_consecutive_failures_and_recloses_after_a_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    clock.now = 60
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    # Only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.now = 19
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_gemini_result_is_returned_when_on_time(gemini, walmart_receipt):
+    model = FakeGenerativeModel(responder=lambda prompt: json.dumps({'items': [{'name': 'Eggs', 'price': 4.27}]}))
+    gemini(model)
+    before = branch_count('gemini')
+    assert parse_with_gemini(walmart_receipt, GEMINI_API_KEY, hedged=True) == {
+        'items': [{'name': 'Eggs', 'price': 4.27}]}
+    assert model.calls == 1
+    assert branch_count('gemini') == before + 1
+
+
+def test_hedged_call_returns_the_regex_result_when_gemini_misses_the_deadline(gemini, walmart_receipt):
+    gemini(FakeGenerativeModel(delay=1.0), timeout=0.05)
+    before = {branch: branch_count(branch) for branch in ('hedged_regex', 'regex', 'alt')}
+    assert parse_with_gemini(walmart_receipt, GEMINI_API_KEY, hedged=True) == parse_with_regex(walmart_receipt)
+    # Only the result that was returned is counted, as hedged_regex
+    assert branch_count('hedged_regex') == before['hedged_regex'] + 1
+    assert branch_count('regex') == before['regex'] + 1  # The parse_with_regex call above
+    assert branch_count('alt') == before['alt']
+
+
+def test_unhedged_timeouts_open_the_breaker(gemini, walmart_receipt):
+    client = gemini(FakeGenerativeModel(delay=1.0), timeout=0.05,
+                    breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(GeminiTimeoutError):
+        parse_with_gemini(walmart_receipt, GEMINI_API_KEY)
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        parse_with_gemini(walmart_receipt, GEMINI_API_KEY)
@@ -0,0 +1,57 @@
+"""
+Import-time budget for cold starts. Imports the app in fresh interpreters
+under `python -X importtime` (against a scratch database), takes the fastest
+of several runs and fails if importing app exceeds the budget or pulls in
+any module of the parsing or LLM stacks, which must only load on first use.
+"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget for `import app`, in milliseconds
+BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "750"))
+RUNS = 3
+
+# Top-level packages that must not be imported at startup
+LAZY_PACKAGES = ('pypdf', 'google', 'grpc', 'proto', 'cryptography')
+
+
+def import_times(database_uri):
+    """
+    Import app once in a fresh interpreter.
+
+    Returns:
+        tuple: (app cumulative microseconds, [(module, cumulative_us, depth)]
+               for every module imported on behalf of app)
+    """
+    env = dict(os.environ, RECEIPTS_DATABASE_URI=database_uri)
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(cumulative_us), depth))
+    # A module's imports are listed just before it, one level deeper
+    end = next(i for i, (name, _, depth) in enumerate(entries) if name == 'app' and depth == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    return entries[end][1], entries[start:end]
+
+
+def test_import_app_is_fast_and_lazy(tmp_path):
+    database_uri = f"sqlite:///{tmp_path / 'import.db'}"
+    import_times(database_uri)  # Migrate the scratch database outside the measured runs
+    app_us, imported = min((import_times(database_uri) for _ in range(RUNS)), key=lambda result: result[0])
+
+    eager = sorted({name.split('.')[0] for name, _, _ in imported if name.split('.')[0] in LAZY_PACKAGES})
+    assert not eager, f"imported at startup: {', '.join(eager)}"
+    # Cost of each module imported directly by app, the place to look when the budget is exceeded
+    heaviest = sorted(((cumulative / 1000, name) for name, cumulative, depth in imported if depth == 1),
+                      reverse=True)[:10]
+    assert app_us / 1000 <= BUDGET_MS, ', '.join(f'{name} {ms:.1f} ms' for ms, name in heaviest)
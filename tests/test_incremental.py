@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import app as app_module
+from conftest import WALMART_RECEIPT
+from receipt_parser import IncrementalReceiptParser, incremental_parser, parse_with_regex
+
+# Only lines the strict rules reject, so the fallback rules apply
+FALLBACK_RECEIPT = "Corner Grocer\nPayment method $10.00\nApples  $2.50\n"
+
+
+def feed_all(parser, chunks):
+    """Feed every chunk, then close; returns the items in the order they were returned."""
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    return items + parser.close()
+
+
+def split_randomly(text, seed):
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, 8)))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize('receipt', [WALMART_RECEIPT, FALLBACK_RECEIPT, WALMART_RECEIPT * 3, ''],
+                         ids=['walmart', 'fallback', 'repeated', 'empty'])
+def test_incremental_parse_equals_a_full_parse(receipt):
+    expected = parse_with_regex(receipt)['items']
+    # Every single split point, including ones inside a line and inside a price
+    for cut in range(len(receipt) + 1):
+        parser = IncrementalReceiptParser()
+        assert feed_all(parser, [receipt[:cut], receipt[cut:]]) == expected
+        assert parser.items == expected
+    for seed in range(20):
+        if len(receipt) > 1:
+            assert feed_all(IncrementalReceiptParser(), split_randomly(receipt, seed)) == expected
+
+
+def test_strict_items_are_returned_as_soon_as_their_line_is_complete():
+    parser = incremental_parser(WALMART_RECEIPT)
+    assert parser.feed("Bananas, Each Weight-adjusted Qty 1 $1.") == []
+    assert parser.feed("38\nTax") == [{'name': 'Bananas, Each', 'price': 1.38}]
+    assert not parser.total_seen
+    assert parser.feed(" $0.31\nTotal $7.67\n") == [{'name': 'Tax', 'price': 0.31}]
+    assert parser.total_seen
+
+
+def test_streaming_stops_extracting_after_the_page_with_the_total(app, monkeypatch):
+    pages = WALMART_RECEIPT.split("Subtotal")
+    pages = [pages[0], "Subtotal" + pages[1], "Great Value Milk Shopped Qty 1 $3.00\n"]
+    extracted = []
+
+    def iter_pages(pdf_bytes):
+        return len(pages), (extracted.append(page) or page for page in pages)
+
+    monkeypatch.setattr(app_module, 'iter_pages', iter_pages)
+    with app.app_context():
+        events = list(app_module.stream_pdf_items(b'%PDF-1.4 not cached'))
+    assert len(extracted) == 2
+    items = [data for event, data in events if event == 'item']
+    assert items == parse_with_regex(pages[0] + "\n" + pages[1])['items']
+    assert events[-1] == ('done', {'items': len(items), 'pages_read': 2, 'page_count': 3, 'cached': False})
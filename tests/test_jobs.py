@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import app as app_module
+from models import db, ParseJob
+
+
+def add_job(app, job_id, status, **values):
+    with app.app_context():
+        db.session.execute(ParseJob.__table__.insert().values(
+            job_id=job_id, status=status, created_at=datetime.utcnow(), **values))
+        db.session.commit()
+
+
+def events(response):
+    """(event, data) pairs of a server-sent events body."""
+    pairs = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        pairs.append((fields['event'], fields['data']))
+    return pairs
+
+
+def test_events_of_a_finished_job_end_with_its_result(app, client):
+    add_job(app, 'finished01', 'done', result_json='{"items": []}', started_at=datetime.utcnow(),
+            finished_at=datetime.utcnow())
+    assert [event for event, _ in events(client.get('/api/jobs/finished01/events'))] == ['result']
+
+
+def test_event_stream_is_time_boxed_and_points_to_polling(app, client, monkeypatch):
+    # Claimed by a worker that is still running it, so nothing here finishes it
+    add_job(app, 'running001', 'running', started_at=datetime.utcnow())
+    monkeypatch.setattr(app_module, 'JOB_EVENTS_MAX_SECONDS', 0.2)
+    pairs = events(client.get('/api/jobs/running001/events'))
+    assert [event for event, _ in pairs] == ['status', 'poll']
+    assert '"status_url": "/api/jobs/running001"' in pairs[1][1]
+    assert client.get('/api/jobs/running001').json['status'] == 'running'
+
+
+def test_unknown_job_is_404(client):
+    assert client.get('/api/jobs/missing000/events').status_code == 404
+    assert client.get('/api/jobs/missing000').status_code == 404
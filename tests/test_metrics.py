@@ -0,0 +1,113 @@
+"""
+Multiprocess metrics: snapshots of worker processes, merged by /metrics and
+folded into the archive once their process exits. Workers run as separate
+interpreters, since exiting must release their lock the way a real one does.
+"""
+import os
+import sys
+import shutil
+import subprocess
+
+from metrics import ARCHIVE_FILE, Registry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Counts `amount` jobs in a fresh process, writes its snapshot and, if told
+# to, stays alive (holding its lock) until its stdin is closed
+WORKER = """
+import sys
+from metrics import Registry
+
+registry = Registry(sys.argv[1])
+jobs = registry.counter('jobs_total', 'Jobs run', ['kind'])
+jobs.labels('parse').inc(int(sys.argv[2]))
+registry.flush()
+print(registry.process_id(), flush=True)
+if sys.argv[3:] == ['wait']:
+    sys.stdin.read()
+"""
+
+
+def start_worker(multiproc_dir, amount, wait=False):
+    env = {key: value for key, value in os.environ.items() if key != 'PROMETHEUS_MULTIPROC_DIR'}
+    args = [sys.executable, '-c', WORKER, str(multiproc_dir), str(amount)] + (['wait'] if wait else [])
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+
+def run_worker(multiproc_dir, amount):
+    """Run a worker to completion; returns its process id."""
+    worker = start_worker(multiproc_dir, amount)
+    process_id, _ = worker.communicate(timeout=30)
+    assert worker.returncode == 0
+    return process_id.strip()
+
+
+def reader(multiproc_dir):
+    """The registry of the process serving /metrics."""
+    registry = Registry(str(multiproc_dir))
+    registry.counter('jobs_total', 'Jobs run', ['kind'])
+    return registry
+
+
+def jobs(registry):
+    return registry.collect()['jobs_total'].get(('parse',), 0)
+
+
+def test_counters_of_exited_workers_are_archived_and_kept(tmp_path):
+    registry = reader(tmp_path)
+    run_worker(tmp_path, 3)
+    run_worker(tmp_path, 4)
+    assert jobs(registry) == 7
+
+    assert registry.archive_exited() == 2
+    assert sorted(os.listdir(tmp_path)) == ['archive.json', 'archive.lock']
+    assert jobs(registry) == 7
+
+    run_worker(tmp_path, 5)
+    assert jobs(registry) == 12
+    assert registry.archive_exited() == 1
+    assert registry.archive_exited() == 0
+    assert jobs(registry) == 12
+
+
+def test_running_workers_are_merged_but_not_archived(tmp_path):
+    registry = reader(tmp_path)
+    worker = start_worker(tmp_path, 2, wait=True)
+    try:
+        process_id = worker.stdout.readline().strip()
+        assert jobs(registry) == 2
+        assert registry.archive_exited() == 0
+        assert os.path.exists(tmp_path / f'metrics_{process_id}.json')
+    finally:
+        worker.communicate(timeout=30)
+    assert registry.archive_exited() == 1
+    assert jobs(registry) == 2
+
+
+def test_snapshot_left_behind_by_an_interrupted_archive_is_not_counted_twice(tmp_path):
+    registry = reader(tmp_path)
+    process_id = run_worker(tmp_path, 3)
+    snapshot = tmp_path / f'metrics_{process_id}.json'
+    shutil.copy(snapshot, tmp_path / 'saved.json')
+    registry.archive_exited()
+    # As if the archiving process died after writing the archive but before
+    # deleting the snapshot
+    shutil.move(tmp_path / 'saved.json', snapshot)
+    assert jobs(registry) == 3
+    assert registry.archive_exited() == 1
+    assert not snapshot.exists()
+    assert jobs(registry) == 3
+    assert (tmp_path / ARCHIVE_FILE).exists()
+
+
+def test_own_live_values_are_merged_with_the_workers(tmp_path):
+    registry = Registry(str(tmp_path))
+    counter = registry.counter('jobs_total', 'Jobs run', ['kind'])
+    counter.labels('parse').inc(10)
+    registry.flush()
+    run_worker(tmp_path, 1)
+    counter.labels('parse').inc()
+    # Its own snapshot is stale; the live value is used instead
+    assert jobs(registry) == 12
+    assert registry.archive_exited() == 1
+    assert 'jobs_total{kind="parse"} 12' in registry.render()
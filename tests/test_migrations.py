@@ -0,0 +1,74 @@
+import json
+import random
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session, selectinload
+
+from conftest import distribution_payload
+from migrations import MIGRATIONS, pending_backfills, run_backfills, run_migrations
+from models import Distribution, DistributionItem, DistributionUser
+
+
+def dump(engine):
+    """to_dict output of every distribution, user row ids excluded."""
+    with Session(engine) as session:
+        distributions = session.scalars(
+            select(Distribution).options(selectinload(Distribution.users), selectinload(Distribution.items))
+            .order_by(Distribution.id)
+        ).all()
+        result = []
+        for distribution in distributions:
+            data = distribution.to_dict(['distribution_id', 'total_amount', 'distribution_data', 'users'])
+            for user in data['users']:
+                del user['id']
+            result.append(data)
+    return result
+
+
+def test_normalizing_items_keeps_to_dict_output(legacy_database):
+    rng = random.Random(0)
+    payloads = [distribution_payload(rng) for _ in range(25)]
+    # Integer prices must come back as integers, not as the price column's floats
+    payloads[0]['items'][0]['price'] = 3
+    engine = legacy_database(payloads)
+    before = dump(engine)
+
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+    with engine.connect() as connection:
+        assert pending_backfills(connection) == [4, 5, 8]
+    # Small batches, so the backfill resumes from its recorded progress
+    while run_backfills(engine, seconds=0, batch_size=10):
+        pass
+
+    with Session(engine) as session:
+        assert session.scalar(select(func.count()).select_from(DistributionItem)) > 0
+        # The JSON copies are dropped once the shares are in their own rows
+        assert session.scalar(select(func.count()).select_from(DistributionUser)
+                              .where(DistributionUser.items_json != '')) == 0
+        assert session.scalar(text("SELECT COUNT(*) FROM item_search WHERE item_search MATCH 'eggs'")) > 0
+    after = dump(engine)
+    assert after == before
+    assert json.dumps(after[0]['distribution_data']['items'][0]['price']) == '3'
+
+
+def test_integer_prices_keep_their_type_when_saved(client):
+    payload = {'users': [{'id': 'user1', 'name': 'Alice'}], 'total': 3,
+               'items': [{'name': 'Eggs', 'price': 3, 'users': ['user1']},
+                         {'name': 'Milk', 'price': 2.5, 'users': ['user1']}]}
+    distribution_id = client.post('/api/save_distribution', json=payload).json['distribution_id']
+    saved = client.get(f'/api/distribution/{distribution_id}').json
+    assert saved['distribution_data']['items'] == payload['items']
+    assert [item['price'] for item in saved['users'][0]['items']] == [3, 2.5]
+    assert isinstance(saved['users'][0]['items'][0]['price'], int)
+
+
+def test_migrations_are_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+    with engine.connect() as connection:
+        applied = connection.execute(text('SELECT version FROM schema_migrations ORDER BY version')).scalars().all()
+        assert applied == [version for version, _, _ in MIGRATIONS]
+        # Nothing to convert in an empty database
+        assert pending_backfills(connection) == []
+    engine.dispose()
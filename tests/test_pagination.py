@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import decode_cursor, encode_cursor
+from distribution_store import prepare_distribution, save_distributions
+from models import db
+import search
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}]
+START = datetime(2025, 4, 1, 12, 0)
+
+
+def seed(app, created_ats):
+    """Save one distribution per timestamp; returns their distribution_ids in save order."""
+    records = []
+    for i, created_at in enumerate(created_ats):
+        payload = {'users': USERS, 'total': 2.0,
+                   'items': [{'name': f'Eggs {i}', 'price': 2.0, 'users': ['user1', 'user2']}]}
+        records.append((f'd{i:09d}', created_at, prepare_distribution(payload)))
+    with app.app_context():
+        save_distributions(db.session, records)
+        db.session.commit()
+    return [distribution_id for distribution_id, _, _ in records]
+
+
+def all_pages(client, path, key, params):
+    """Every result of a paged endpoint, and the size of each page."""
+    results, sizes = [], []
+    cursor = ''
+    while cursor is not None:
+        page = client.get(path, query_string=dict(params, cursor=cursor)).json
+        results += page[key]
+        sizes.append(len(page[key]))
+        cursor = page['next_cursor']
+    return results, sizes
+
+
+def test_cursor_round_trip():
+    class Row:
+        created_at = START
+        id = 42
+    assert decode_cursor(encode_cursor(Row)) == (START, 42)
+    assert search.decode_cursor(search.encode_cursor(17)) == 17
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_ties_on_created_at_are_not_skipped_or_repeated_across_pages(app, client):
+    # Five share one timestamp, so pages of two end in the middle of the tie
+    ids = seed(app, [START] * 5 + [START + timedelta(minutes=1)])
+    results, sizes = all_pages(client, '/api/distributions', 'distributions',
+                               {'limit': 2, 'fields': 'distribution_id'})
+    assert [d['distribution_id'] for d in results] == [ids[5]] + ids[4::-1]
+    assert sizes == [2, 2, 2]
+
+
+def test_last_full_page_has_no_next_cursor(app, client):
+    seed(app, [START + timedelta(minutes=i) for i in range(4)])
+    page = client.get('/api/distributions?limit=4').json
+    assert len(page['distributions']) == 4
+    assert page['next_cursor'] is None
+    assert client.get('/api/distributions?limit=3').json['next_cursor'] is not None
+
+
+def test_date_bounds_apply_across_pages(app, client):
+    seed(app, [START + timedelta(days=i) for i in range(6)])
+    results, _ = all_pages(client, '/api/distributions', 'distributions',
+                           {'limit': 2, 'fields': 'created_at', 'since': '2025-04-02', 'until': '2025-04-05'})
+    assert [d['created_at'] for d in results] == [(START + timedelta(days=i)).isoformat() for i in (3, 2, 1)]
+
+
+def test_invalid_cursor_and_limit_are_rejected(client):
+    assert client.get('/api/distributions?cursor=bogus').status_code == 400
+    assert client.get('/api/distributions?limit=0').status_code == 400
+
+
+def test_search_pages_return_every_match_once(app, client):
+    seed(app, [START + timedelta(minutes=i) for i in range(5)])
+    results, sizes = all_pages(client, '/api/search', 'items', {'q': 'eggs', 'limit': 2})
+    assert [item['name'] for item in results] == [f'Eggs {i}' for i in range(4, -1, -1)]
+    assert sizes == [2, 2, 1]
@@ -0,0 +1,51 @@
+import io
+import json
+import zipfile
+
+import app as app_module
+from conftest import WALMART_RECEIPT
+from receipt_parser import parse_with_regex
+
+
+def results(response):
+    """The NDJSON lines of a batch response, in input order."""
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return sorted(lines, key=lambda result: result['index'])
+
+
+def test_failed_receipts_are_reported_at_their_index(client):
+    response = client.post('/api/parse_batch', json={'receipts': [WALMART_RECEIPT, '   ', 42, WALMART_RECEIPT]})
+    ok, blank, not_text, again = results(response)
+    assert ok['status'] == again['status'] == 'ok'
+    assert ok['items'] == parse_with_regex(WALMART_RECEIPT)['items']
+    assert ok['receipt_id'] != again['receipt_id']
+    for failed, index in ((blank, 1), (not_text, 2)):
+        assert failed['index'] == index
+        assert failed['status'] == 'error'
+        assert failed['error'] == 'Receipt text is empty or not a string'
+        assert 'items' not in failed
+
+
+def test_zip_members_are_named_and_unreadable_pdfs_fail_alone(client):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('notes.txt', 'not a receipt')
+        archive.writestr('first.pdf', b'not a pdf')
+        archive.writestr('second.pdf', b'%PDF-1.4 truncated')
+    response = client.post('/api/parse_batch', data=buffer.getvalue(), content_type='application/zip')
+    first, second = results(response)
+    assert (first['index'], first['name'], first['status']) == (0, 'first.pdf', 'error')
+    assert (second['index'], second['name'], second['status']) == (1, 'second.pdf', 'error')
+
+
+def test_invalid_batches_are_rejected_before_parsing(client, monkeypatch):
+    assert client.post('/api/parse_batch', json=[]).status_code == 400
+    assert client.post('/api/parse_batch', json={'receipts': 'one'}).status_code == 400
+    assert client.post('/api/parse_batch', data=b'', content_type='application/zip').status_code == 400
+    assert client.post('/api/parse_batch', data=b'not a zip', content_type='application/zip').status_code == 400
+    monkeypatch.setattr(app_module, 'BATCH_MAX_ITEMS', 2)
+    response = client.post('/api/parse_batch', json=[WALMART_RECEIPT] * 3)
+    assert response.status_code == 400
+    assert 'max 2' in response.json['error']
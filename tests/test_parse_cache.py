@@ -0,0 +1,46 @@
+import json
+
+from conftest import GEMINI_API_KEY, FakeGenerativeModel
+from gemini_client import CircuitBreaker
+from parse_cache import pdf_key, text_key
+
+GEMINI_ITEMS = [{'name': 'Eggs', 'price': 4.27}]
+
+
+def parse(client, receipt_text):
+    response = client.post('/api/parse', json={'receipt_text': receipt_text})
+    assert response.status_code == 200
+    return [{'name': item['name'], 'price': item['price']} for item in response.json['items']]
+
+
+def test_keys_depend_on_the_parser_version_and_not_on_whitespace():
+    assert text_key("Eggs $4.27\nTax $0.31", 1) == text_key("  Eggs $4.27\n\n Tax $0.31 \n", 1)
+    assert text_key("Eggs $4.27", 1) != text_key("Eggs $4.27", 2)
+    assert pdf_key(b'%PDF', 1) != pdf_key(b'%PDF', 2)
+
+
+def test_repeat_receipts_are_served_from_the_cache(client, walmart_receipt):
+    first = parse(client, walmart_receipt)
+    stats = client.get('/api/parse_cache/stats').json
+    assert parse(client, walmart_receipt) == first
+    assert client.get('/api/parse_cache/stats').json['memory_hits'] == stats['memory_hits'] + 1
+
+
+def test_fallback_results_are_not_cached(client, gemini, monkeypatch, walmart_receipt):
+    monkeypatch.setenv('GEMINI_API_KEY', GEMINI_API_KEY)
+    model = FakeGenerativeModel(responder=lambda prompt: json.dumps({'items': GEMINI_ITEMS}),
+                                error=RuntimeError('unavailable'))
+    gemini(model, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    # A Gemini error, then an open breaker: both fall back to the regex parser
+    assert parse(client, walmart_receipt) != GEMINI_ITEMS
+    assert parse(client, walmart_receipt) != GEMINI_ITEMS
+    assert parse(client, walmart_receipt) != GEMINI_ITEMS
+    assert model.calls == 2
+
+    # Once Gemini answers again its result is parsed, cached and served
+    gemini(model)
+    model.error = None
+    assert parse(client, walmart_receipt) == GEMINI_ITEMS
+    assert parse(client, walmart_receipt) == GEMINI_ITEMS
+    assert model.calls == 3
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import receipt_parser
+from conftest import GEMINI_API_KEY, WALMART_RECEIPT, FakeGenerativeModel
+from receipt_parser import (GEMINI_PROMPT, chunk_lines, merge_chunk_items, parse_with_gemini, parse_with_regex,
+                            prefilter_receipt)
+
+EGGS = {'name': 'Eggs', 'price': 4.27}
+MILK = {'name': 'Milk', 'price': 3.0}
+BREAD = {'name': 'Bread', 'price': 2.5}
+
+
+def test_prefilter_keeps_item_lines_only():
+    lines, flags = prefilter_receipt(WALMART_RECEIPT)
+    assert lines == ["Bananas, Each Weight-adjusted Qty 1 $1.38",
+                     "Great Value Large White Eggs, 18 Count Unavailable Qty 1 $4.27",
+                     "Marketside Fresh Spinach, 10 oz Shopped Qty 1 $2.98"]
+    assert flags == [True, True, True]
+
+
+def test_prefilter_keeps_the_start_of_a_wrapped_name_but_not_boilerplate():
+    receipt = ("Order# 2000127-41188203\n"
+               "Great Value Large White\n"
+               "Eggs, 18 Count Shopped Qty 1 $4.27\n"
+               "Payment method\n"
+               "Ending in 1018\n"
+               "Milk 1 Gal $3.00 Shopped Qty 1 x\n")
+    lines, flags = prefilter_receipt(receipt)
+    assert lines == ["Great Value Large White", "Eggs, 18 Count Shopped Qty 1 $4.27",
+                     "Milk 1 Gal $3.00 Shopped Qty 1 x"]
+    assert flags == [False, True, True]
+
+
+def test_receipt_without_item_lines_only_loses_blank_lines():
+    receipt = "Corner Grocer\n\n  Apples 2 @ 1.00  \nThank you\n"
+    assert prefilter_receipt(receipt) == (["Corner Grocer", "Apples 2 @ 1.00", "Thank you"], [False] * 3)
+
+
+def test_chunks_overlap_and_cover_every_line():
+    assert chunk_lines(list(range(5)), 10, 2) == [(0, 5)]
+    assert chunk_lines(list(range(10)), 4, 1) == [(0, 4), (3, 7), (6, 10)]
+    # An overlap of the whole chunk would never advance
+    assert chunk_lines(list(range(5)), 2, 5) == [(0, 2), (1, 3), (2, 4), (3, 5)]
+    assert chunk_lines(list(range(5)), 0, 1) == [(0, 5)]
+
+
+def test_merge_drops_items_read_twice_from_shared_lines():
+    assert merge_chunk_items([[EGGS, MILK], [MILK, BREAD]], [1]) == [EGGS, MILK, BREAD]
+    assert merge_chunk_items([[EGGS, MILK], [EGGS, MILK, BREAD]], [2]) == [EGGS, MILK, BREAD]
+    # No shared item lines: an equal item starting the next chunk is a second purchase
+    assert merge_chunk_items([[EGGS, MILK], [MILK, BREAD]], [0]) == [EGGS, MILK, MILK, BREAD]
+    # At most `shared` items are dropped, even if more match
+    assert merge_chunk_items([[MILK, MILK], [MILK, MILK, BREAD]], [1]) == [MILK, MILK, MILK, BREAD]
+    # The model may skip a shared line in one chunk
+    assert merge_chunk_items([[EGGS], [MILK, BREAD]], [1]) == [EGGS, MILK, BREAD]
+    assert merge_chunk_items([], []) == []
+
+
+@pytest.mark.parametrize('chunk_size, overlap', [(2, 1), (3, 2), (3, 0)])
+def test_chunked_gemini_parse_equals_one_call(gemini, monkeypatch, chunk_size, overlap):
+    monkeypatch.setattr(receipt_parser, 'CHUNK_LINES', chunk_size)
+    monkeypatch.setattr(receipt_parser, 'CHUNK_OVERLAP', overlap)
+    # A repeated purchase right at a chunk border must be kept
+    receipt = WALMART_RECEIPT.replace("Marketside", "Bananas, Each Weight-adjusted Qty 1 $1.38\nMarketside")
+    model = FakeGenerativeModel(lambda prompt: json.dumps(parse_with_regex(prompt[len(GEMINI_PROMPT):])))
+    gemini(model)
+    # The prompt asks for purchased items only, so the tax line is filtered out
+    expected = [item for item in parse_with_regex(receipt)['items'] if item['name'] != 'Tax']
+    assert parse_with_gemini(receipt, GEMINI_API_KEY) == {'items': expected}
+    assert model.calls == len(chunk_lines(prefilter_receipt(receipt)[0], chunk_size, overlap))
+    assert model.calls > 1
@@ -0,0 +1,69 @@
+"""
+Query-plan regression check. Records every SELECT the hot endpoints issue
+(/api/distributions with and without filters, cursors and field projection,
+/api/distribution/<id>, /share/<id>, /analytics, /api/search) against a
+seeded database and fails if EXPLAIN QUERY PLAN shows any of them falling
+back to a full table scan.
+"""
+from sqlalchemy import event
+
+from models import db
+
+DISTRIBUTIONS = 200
+
+
+def full_scans(plan_rows):
+    """Plan steps that read a whole table rather than an index range."""
+    # FTS5 reports a MATCH lookup as a virtual table scan with an M in its index string
+    return [detail for _, _, _, detail in plan_rows
+            if detail.startswith('SCAN ') and 'USING' not in detail and detail != 'SCAN CONSTANT ROW'
+            and not ('VIRTUAL TABLE INDEX' in detail and ':M' in detail)]
+
+
+def hot_requests(client, distribution_id):
+    cursor = client.get('/api/distributions?limit=5').json['next_cursor']
+    search_cursor = client.get('/api/search?q=egg*&limit=5').json['next_cursor']
+    return [
+        '/api/distributions?limit=5',
+        f'/api/distributions?limit=5&cursor={cursor}',
+        '/api/distributions?limit=5&fields=distribution_id,total_amount',
+        '/api/distributions?limit=5&fields=users&since=2020-01-01&until=2100-01-01',
+        f'/api/distribution/{distribution_id}',
+        f'/share/{distribution_id}',
+        '/analytics',
+        '/api/search?q=eggs&limit=5&totals=1',
+        f'/api/search?q=egg*&limit=5&cursor={search_cursor}',
+        '/api/search?q="white eggs"&limit=5&since=2020-01-01&until=2100-01-01',
+    ]
+
+
+def test_hot_endpoints_use_indexes(app, client, saved_distributions):
+    distribution_id = saved_distributions(DISTRIBUTIONS)[-1]
+
+    with app.app_context():
+        engine = db.engine
+    paths = hot_requests(client, distribution_id)
+    statements = []
+    request_path = None
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.append((request_path, statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for request_path in paths:
+            response = client.get(request_path)
+            assert response.status_code == 200, request_path
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert statements
+
+    scanned = []
+    with engine.connect() as connection:
+        raw = connection.connection.driver_connection
+        for path, statement, parameters in statements:
+            scans = full_scans(raw.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall())
+            if scans:
+                scanned.append(f"{path}: {'; '.join(scans)}\n    {' '.join(statement.split())}")
+    assert not scanned, '\n'.join(scanned)
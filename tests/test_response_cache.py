@@ -0,0 +1,62 @@
+from app import response_cache
+from models import Distribution, db
+from response_cache import ResponseCache
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def save(client):
+    return client.post('/api/save_distribution', json={
+        'users': USERS, 'total': 4.0,
+        'items': [{'name': 'Eggs', 'price': 4.0, 'users': ['user1', 'user2']}]}).json['distribution_id']
+
+
+def test_matching_if_none_match_gets_304(client):
+    distribution_id = save(client)
+    for path in (f'/api/distribution/{distribution_id}', f'/share/{distribution_id}'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.cache_control.no_cache and not response.cache_control.immutable
+        etag, _ = response.get_etag()
+        revalidated = client.get(path, headers={'If-None-Match': f'"{etag}"'})
+        assert revalidated.status_code == 304
+        assert revalidated.data == b''
+        assert client.get(path, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_committed_edit_invalidates_the_cached_body(app, client):
+    distribution_id = save(client)
+    path = f'/api/distribution/{distribution_id}'
+    etag, _ = client.get(path).get_etag()
+    assert response_cache.get('json', distribution_id) is not None
+
+    with app.app_context():
+        distribution = Distribution.query.filter_by(distribution_id=distribution_id).one()
+        distribution.receipt_name = 'Corner Grocer'
+        db.session.commit()
+    assert response_cache.get('json', distribution_id) is None
+
+    response = client.get(path, headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.json['receipt_name'] == 'Corner Grocer'
+    assert response.get_etag()[0] != etag
+
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=60, clock=clock)
+    cache.put('json', 'd1', b'{}')
+    clock.now = 59
+    assert cache.get('json', 'd1')[0] == b'{}'
+    clock.now = 60
+    assert cache.get('json', 'd1') is None
+    assert cache.get_stats()['expirations'] == 1
+    assert cache.get_stats()['bytes'] == 0
@@ -0,0 +1,46 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import rollups
+from distribution_store import prepare_distribution, save_distributions
+from models import db, SpendingRollup
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}]
+NOW = datetime(2025, 4, 16, 15, 30)
+
+
+def test_window_series_match_the_distributions_in_the_window(app):
+    # Every 17 hours for 40 days, so the window starts in the middle of a
+    # day, a week and a month
+    created_ats = [NOW - timedelta(hours=17 * i) for i in range(57)]
+    records = []
+    for i, created_at in enumerate(created_ats):
+        payload = {'users': USERS, 'total': 3.0,
+                   'items': [{'name': 'Eggs', 'price': 2.0, 'users': ['user1', 'user2']},
+                             {'name': 'Milk', 'price': 1.0, 'users': ['user2']}]}
+        records.append((f'd{i:09d}', created_at, prepare_distribution(payload)))
+
+    expected = defaultdict(float), defaultdict(lambda: defaultdict(float)), defaultdict(lambda: defaultdict(float))
+    for created_at in created_ats:
+        if created_at < NOW - timedelta(days=30):
+            continue
+        for user_name, amount in (('Alice', 1.0), ('Bob', 2.0)):
+            expected[0][user_name] += amount
+            expected[1][created_at.strftime('%Y-W%U')][user_name] += amount
+            expected[2][created_at.strftime('%Y-%m')][user_name] += amount
+
+    with app.app_context():
+        save_distributions(db.session, records)
+        db.session.commit()
+        user_data, weekly_data, monthly_data = rollups.load_window(db.session, NOW, days=30)
+        # Only day rows are stored
+        assert set(db.session.scalars(select(SpendingRollup.period_type))) == {'day'}
+
+    assert user_data == pytest.approx(dict(expected[0]))
+    for served, wanted in ((weekly_data, expected[1]), (monthly_data, expected[2])):
+        assert served.keys() == wanted.keys()
+        for period, amounts in wanted.items():
+            assert served[period] == pytest.approx(dict(amounts))
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+import search
+from distribution_store import prepare_distribution, save_distributions
+from models import db
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}]
+
+
+def seed(app, items):
+    """Save one distribution per (created_at, item name, price), each item split between both users."""
+    records = []
+    for i, (created_at, name, price) in enumerate(items):
+        payload = {'users': USERS, 'total': price, 'items': [{'name': name, 'price': price, 'users': ['user1', 'user2']}]}
+        records.append((f'd{i:09d}', created_at, prepare_distribution(payload)))
+    with app.app_context():
+        save_distributions(db.session, records)
+        db.session.commit()
+
+
+def names(client, **params):
+    response = client.get('/api/search', query_string=params)
+    assert response.status_code == 200, response.json
+    return [item['name'] for item in response.json['items']]
+
+
+@pytest.mark.parametrize('query, expression', [
+    ('egg', 'name : ("egg")'),
+    ('white  egg', 'name : ("white" "egg")'),
+    ('egg*', 'name : ("egg"*)'),
+    ('"white egg"*', 'name : ("white egg"*)'),
+    ('NOT egg OR milk', 'name : ("NOT" "egg" "OR" "milk")'),
+    ('a"b (c) -d ^e', 'name : ("ab" "(c)" "-d" "^e")'),
+    ('"unterminated phrase', 'name : ("unterminated" "phrase")'),
+])
+def test_search_text_is_quoted_into_a_match_expression(query, expression):
+    assert search.match_query(query) == expression
+
+
+@pytest.mark.parametrize('query', ['', '   ', '*', '""', '"" *'])
+def test_search_text_without_terms_is_rejected(query, client):
+    with pytest.raises(ValueError):
+        search.match_query(query)
+    assert client.get('/api/search', query_string={'q': query}).status_code == 400
+
+
+def test_operators_and_punctuation_in_names_are_searchable(app, client):
+    seed(app, [(datetime(2025, 4, 1), 'Tortilla Chips $ Saver Pack', 3.0),
+               (datetime(2025, 4, 2), 'NOT (AND) "Brand" Eggs', 4.0),
+               (datetime(2025, 4, 3), 'Great Value Eggs', 5.0)])
+    assert names(client, q='eggs') == ['Great Value Eggs', 'NOT (AND) "Brand" Eggs']
+    assert names(client, q='NOT (AND)') == ['NOT (AND) "Brand" Eggs']
+    assert names(client, q='$ saver') == ['Tortilla Chips $ Saver Pack']
+    assert names(client, q='tort*') == ['Tortilla Chips $ Saver Pack']
+    assert names(client, q='"value eggs"') == ['Great Value Eggs']
+    assert names(client, q='"eggs value"') == []
+
+
+def test_date_filters_cover_partial_months_and_years(app, client):
+    seed(app, [(datetime(2024, 11, 30, 23, 59), 'Eggs 1', 1.0),
+               (datetime(2024, 12, 1), 'Eggs 2', 2.0),
+               (datetime(2025, 1, 15), 'Eggs 3', 3.0),
+               (datetime(2025, 3, 31, 12), 'Eggs 4', 4.0),
+               (datetime(2025, 4, 1), 'Eggs 5', 5.0)])
+    assert names(client, q='eggs', since='2024-12-01') == ['Eggs 5', 'Eggs 4', 'Eggs 3', 'Eggs 2']
+    assert names(client, q='eggs', until='2024-12-01') == ['Eggs 1']
+    assert names(client, q='eggs', since='2024-12-01T00:00:01', until='2025-03-31T12:00:00') == ['Eggs 3']
+    assert names(client, q='eggs', since='2025-05-01') == []
+    assert names(client, q='eggs', since='2025-02-01', until='2025-01-01') == []
+
+    totals = client.get('/api/search', query_string={
+        'q': 'eggs', 'since': '2024-12-01', 'until': '2025-04-01', 'totals': 1}).json['totals']
+    assert totals == {'items': 3, 'amount': 9.0, 'users': [{'user_name': 'Alice', 'amount': 4.5, 'items': 3},
+                                                         {'user_name': 'Bob', 'amount': 4.5, 'items': 3}]}
+
+
+def test_invalid_dates_are_rejected(client):
+    assert client.get('/api/search', query_string={'q': 'eggs', 'since': 'last week'}).status_code == 400
+
+
+def test_period_tokens_collapse_whole_years():
+    assert search.period_tokens(datetime(2024, 11, 5), datetime(2025, 2, 1)) == [
+        'm202411', 'm202412', 'm202501', 'm202502']
+    assert search.period_tokens(datetime(2023, 12, 1), datetime(2025, 1, 1)) == ['m202312', 'y2024', 'm202501']
+    assert search.period_tokens(datetime(2024, 1, 1), datetime(2024, 12, 31)) == ['y2024']
@@ -0,0 +1,55 @@
+import pytest
+
+from shares import allocate_shares, to_cents
+
+USERS = [{'id': 'user1', 'name': 'Alice'}, {'id': 'user2', 'name': 'Bob'}, {'id': 'user3', 'name': 'Carol'}]
+
+
+def test_to_cents_rounds_half_up():
+    assert to_cents(1.005) == 101
+    assert to_cents('2.675') == 268
+    assert to_cents(3) == 300
+
+
+def test_equal_split_gives_leftover_cents_to_first_users():
+    shares, totals = allocate_shares(USERS, [{'name': 'Milk', 'price': 10.00,
+                                              'users': ['user1', 'user2', 'user3']}])
+    assert shares == [(0, 0, 334), (0, 1, 333), (0, 2, 333)]
+    assert totals == [334, 333, 333]
+
+
+def test_weighted_split_gives_leftover_cents_to_largest_remainders():
+    # 1.00 split 1:1:1 by weight leaves one cent, which goes to the earliest tie;
+    # 1.00 split 2:1 leaves 66.67 and 33.33, so the cent goes to the larger remainder
+    shares, totals = allocate_shares(USERS, [
+        {'name': 'Eggs', 'price': 1.00, 'users': ['user1', 'user2', 'user3'],
+         'weights': {'user1': 1, 'user2': 1, 'user3': 1}},
+        {'name': 'Bread', 'price': 1.00, 'users': ['user2', 'user3'], 'weights': {'user2': 2, 'user3': 1}},
+    ])
+    assert shares == [(0, 0, 34), (0, 1, 33), (0, 2, 33), (1, 1, 67), (1, 2, 33)]
+    assert totals == [34, 100, 66]
+
+
+def test_shares_always_add_up_to_the_item_price():
+    items = [{'name': f'Item {i}', 'price': price, 'users': users, 'weights': weights}
+             for i, (price, users, weights) in enumerate([
+                 (0.01, ['user1', 'user2', 'user3'], None),
+                 (7.77, ['user1', 'user3'], {'user1': 0.3, 'user3': 0.7}),
+                 (19.99, ['user1', 'user2', 'user3'], {'user1': 1.5, 'user2': 2.5, 'user3': 3}),
+             ])]
+    shares, totals = allocate_shares(USERS, items)
+    for index, item in enumerate(items):
+        assert sum(cents for item_index, _, cents in shares if item_index == index) == to_cents(item['price'])
+    assert sum(totals) == 1 + 777 + 1999
+
+
+def test_unassigned_items_and_unknown_users_are_skipped():
+    shares, totals = allocate_shares(USERS, [{'name': 'Tax', 'price': 0.31, 'users': []},
+                                             {'name': 'Gum', 'price': 1.00, 'users': ['user9', 'user2']}])
+    assert shares == [(1, 1, 100)]
+    assert totals == [0, 100, 0]
+
+
+def test_invalid_weight_is_rejected():
+    with pytest.raises(ValueError):
+        allocate_shares(USERS, [{'name': 'Eggs', 'price': 1.00, 'users': ['user1'], 'weights': {'user1': -1}}])